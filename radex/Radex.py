@@ -1,8 +1,13 @@
-import pandas as pd
-
-from radex.dfsearch import search_dataframe
-from radex.expression import Expression
-from radex.preprocessing import clean_dataframe
+from radex.cache import SentenceCache
+from radex.compiler import compile_searches
+from radex.dfsearch import SearchResultCache
+from radex.document import DocumentColumn
+from radex.formats import read_table, write_table
+from radex.incremental import run_incremental
+from radex.index import ReportIndex
+from radex.pipeline import run_pipeline
+from radex.preprocessing import clean_dataframe, get_negation_rules
+from radex.store import CorpusStore, corpus_fingerprint, preprocessing_settings
 
 
 class Radex:
@@ -22,41 +27,79 @@ class Radex:
     def __init__(self, data=None):
         self.data = data
         self.preprocessed_data = None
+        self.documents = {}
         self.output_data = None
         self.searches = None
+        self.report_index = None
+        self.search_cache = SearchResultCache()
+        self.negation_rules = None
+        self.match_spans = None
 
         # Define example searches
         self.example_searches = {
             "Thyroid_mention": "thyroid",
             "Normal_thyroid": "normal~2thyroid",
-            "Post-op": "*thyroidectomy | lobectomy | surg* | resect* | resection* | incomplete~~2thyroid | partial~~2thyroid | post?op",
+            "Post-op": (
+                "*thyroidectomy | lobectomy | surg* | resect* | resection* | "
+                "incomplete~~2thyroid | partial~~2thyroid | post?op"
+            ),
             "Nodule_mention": "nodul* | thyroid~~4node | thyroid~~2cyst*",
-            "Multinodule": "multi?nodul* | mng | nodules | thyroid~~2cysts | thyroid ~~2 nodes",
-            "Altered_echotexture": "thyroiditis | grav?s | heterogen* echotexture | inflamed* ~~2thyroid",
+            "Multinodule": (
+                "multi?nodul* | mng | nodules | thyroid~~2cysts | "
+                "thyroid ~~2 nodes"
+            ),
+            "Altered_echotexture": (
+                "thyroiditis | grav?s | heterogen* echotexture | "
+                "inflamed* ~~2thyroid"
+            ),
             "Goitre": "goit?r? | mng | enlarge*~~3thyroid",
         }
 
-    def read_data(self, file_path):
+    def read_data(self, file_path, columns=None):
         """
-        Read data from a csv file.
+        Read data from a csv, Parquet or Arrow file.
 
         Args:
-            file_path (str): The path to the csv file.
+            file_path (str): The path to the file.
+            columns (list, optional): Only read these columns e.g. ['report'].
+                Defaults to None (all columns).
         """
-        # Read data from a csv file
-        self.data = pd.read_csv(file_path)
+        self.data = read_table(file_path, columns=columns)
 
     def preprocess_data(self, columns="report", **kwargs):
         """
-        Preprocess the data by cleaning the dataframe.
+        Preprocess the data by cleaning the dataframe. The sentences of each
+        cleaned report are found at the same time and kept in self.documents,
+        so the searches do not split the reports again.
 
         Args:
-            columns (str or list): The columns to preprocess. Defaults to 'report'.
+            columns (str or list): The columns to preprocess. Defaults to
+                'report'.
             **kwargs: Additional keyword arguments.
-                drop_duplicates (bool, optional): Whether to drop duplicates. Defaults to True.
-                drop_nulls (bool, optional): Whether to drop nulls. Defaults to True.
-                drop_negatives (str, optional): How to handle negations. Defaults to 'negex'.
-                drop_stopwords (str, optional): How to handle stopwords. Defaults to 'nltk'.
+                drop_duplicates (bool, optional): Whether to drop duplicates.
+                    Defaults to True.
+                drop_nulls (bool, optional): Whether to drop nulls. Defaults to
+                    True.
+                drop_negatives (str, optional): How to handle negations.
+                    Defaults to 'negex'.
+                drop_stopwords (str, optional): How to handle stopwords.
+                    Defaults to 'nltk'.
+                workers (int, optional): Number of worker processes to clean
+                    the text with. Defaults to None (clean in the current
+                    process).
+                store (str or CorpusStore, optional): A directory to save the
+                    preprocessed data in. If the same data was already
+                    preprocessed with the same settings, it is loaded from the
+                    store instead. Defaults to None.
+                cache (str or PreprocessingCache, optional): A cache of cleaned
+                    reports, so reports cleaned before with the same settings
+                    are not cleaned again. Defaults to None.
+                deduplicate (bool, optional): Clean each distinct report once,
+                    keeping every row. Useful with drop_duplicates=False.
+                    Defaults to False.
+                sentence_cache_size (int, optional): The number of sentences
+                    cleaned of negated phrases to keep in memory, see
+                    cache_stats. Defaults to None (100000).
         """
 
         if self.data is None:
@@ -69,19 +112,85 @@ class Radex:
         drop_nulls = kwargs.get("drop_nulls", True)
         drop_negatives = kwargs.get("drop_negatives", "negex")
         drop_stopwords = kwargs.get("drop_stopwords", "nltk")
+        workers = kwargs.get("workers", None)
+        store = kwargs.get("store", None)
+        cache = kwargs.get("cache", None)
+        deduplicate = kwargs.get("deduplicate", False)
+        sentence_cache_size = kwargs.get("sentence_cache_size", None)
+
+        if isinstance(columns, str):
+            columns = [columns]
+
+        self.report_index = None
+        self.search_cache.clear()
+        self.match_spans = None
+        self.negation_rules = get_negation_rules(
+            drop_negatives, sentence_cache_size
+        )
+
+        if store is not None:
+            if not isinstance(store, CorpusStore):
+                store = CorpusStore(store)
+            settings = preprocessing_settings(
+                drop_duplicates, drop_nulls, drop_negatives, drop_stopwords
+            )
+            fingerprint = corpus_fingerprint(self.data, columns, settings)
+            if fingerprint in store:
+                self.preprocessed_data = store.load(fingerprint)
+                self.documents = store.documents(fingerprint)
+                return
 
         self.preprocessed_data = clean_dataframe(
             self.data,
             columns,
             drop_duplicates=drop_duplicates,  # drop duplicate entries
             drop_nulls=drop_nulls,  # drop empty reports
-            drop_negatives=drop_negatives,  # remove negated phrases
+            drop_negatives=self.negation_rules,  # remove negated phrases
             drop_stopwords=drop_stopwords,  # remove stopwords
+            workers=workers,  # clean in worker processes
+            cache=cache,  # reuse previously cleaned reports
+            deduplicate=deduplicate,  # clean each distinct report once
         )
+        self.documents = {
+            col: DocumentColumn.from_series(self.preprocessed_data[col])
+            for col in columns
+        }
 
-    def run_searches(self):
+        if store is not None:
+            store.save(
+                fingerprint,
+                self.preprocessed_data,
+                columns,
+                settings,
+                documents=self.documents,
+            )
+
+    def run_searches(
+        self,
+        workers=None,
+        deduplicate=False,
+        spans=False,
+        sentence_cache_size=None,
+    ):
         """
-        Run example searches on the preprocessed data.
+        Run the searches on the preprocessed data. The results of each search
+        are kept, so running again after editing self.searches only evaluates
+        the searches which were added or changed. The sentences of the reports
+        are taken from self.documents, found when the data was preprocessed.
+
+        Args:
+            workers (int, optional): Number of worker processes to search with.
+                Defaults to None (search in the current process).
+            deduplicate (bool, optional): Search each distinct report once and
+                copy the results to every row with that report. Defaults to
+                False.
+            spans (bool, optional): Record the position of every match of the
+                search terms while searching, in self.match_spans, e.g. to
+                highlight the matches. Every search is evaluated. Defaults to
+                False.
+            sentence_cache_size (int, optional): The number of reports whose
+                search terms are kept in memory between runs, see cache_stats.
+                Defaults to None (keep the current cache, of 100000 reports).
 
         Returns:
             pd.DataFrame: The output data.
@@ -94,19 +203,171 @@ class Radex:
         if self.searches is None:
             raise ValueError("Define searches or use run_example_searches().")
 
-        # Apply each example search
-        print(self.searches)
-        for filter_name, expression in self.searches.items():
-            expression = Expression().parse_string(expression)
-            self.output_data = search_dataframe(
-                self.preprocessed_data,
-                column="report",
-                expression=expression,
-                new_column_name=filter_name,
+        if (
+            sentence_cache_size is not None
+            and sentence_cache_size != self.search_cache.sentence_cache.maxsize
+        ):
+            self.search_cache.sentence_cache = SentenceCache(
+                sentence_cache_size
+            )
+
+        if "report" not in self.documents:
+            self.documents["report"] = DocumentColumn.from_series(
+                self.preprocessed_data["report"]
             )
 
+        # Only searches which are new or changed since the last run are
+        # evaluated
+        print(self.searches)
+        self.output_data = self.search_cache.search(
+            self.preprocessed_data,
+            column="report",
+            searches=self.searches,
+            workers=workers,
+            deduplicate=deduplicate,
+            spans=spans,
+            documents=self.documents["report"],
+        )
+        self.match_spans = self.search_cache.spans
+
         return self.output_data
 
+    @property
+    def cache_stats(self):
+        """
+        The hits, misses and evictions of the sentence caches: 'negation' for
+        the sentences cleaned of negated phrases by preprocess_data, and
+        'search' for the terms found in each report by run_searches. Lookups
+        made in worker processes are not counted.
+
+        Returns:
+            dict: The CacheStats of each cache
+        """
+        stats = {"search": self.search_cache.sentence_cache.stats}
+        if self.negation_rules is not None:
+            stats["negation"] = self.negation_rules.sentence_cache.stats
+        return stats
+
+    def process_file(self, input_path, output_path, chunksize=10000, **kwargs):
+        """
+        Preprocess and search a file chunk by chunk, appending the results to
+        the output file. Only a few chunks are held in memory at a time, so
+        files larger than memory can be processed. Uses the searches in
+        self.searches.
+
+        Args:
+            input_path (str): The path to the input csv, Parquet or Arrow file.
+            output_path (str): The path to the output csv, Parquet or Arrow
+                file.
+            chunksize (int): The number of rows read at a time. Defaults to
+                10000.
+            **kwargs: Additional keyword arguments, as for preprocess_data.
+                workers (int, optional): Number of worker processes. If set,
+                    reading, processing and writing chunks overlap. Defaults to
+                    None.
+                queue_size (int, optional): The maximum number of chunks read
+                    but not yet written, when using workers. Defaults to twice
+                    the workers.
+
+        Returns:
+            PipelineStats: Counters for each stage, including the number of
+                rows written.
+        """
+        if self.searches is None:
+            raise ValueError("Define searches or use run_example_searches().")
+
+        return run_pipeline(
+            input_path,
+            output_path,
+            searches=compile_searches(self.searches),
+            column="report",
+            chunksize=chunksize,
+            drop_duplicates=kwargs.get("drop_duplicates", True),
+            drop_nulls=kwargs.get("drop_nulls", True),
+            drop_negatives=kwargs.get("drop_negatives", "negex"),
+            drop_stopwords=kwargs.get("drop_stopwords", "nltk"),
+            deduplicate=kwargs.get("deduplicate", False),
+            workers=kwargs.get("workers", None),
+            queue_size=kwargs.get("queue_size", None),
+        )
+
+    def process_new_reports(
+        self, input_path, output_path, state_path, chunksize=10000, **kwargs
+    ):
+        """
+        Preprocess and search only the reports added to an append-only file
+        since the last call with the same state directory, appending the
+        results to the output csv file. The first call processes the whole
+        file. Uses the searches in self.searches, which must not change between
+        calls.
+
+        Args:
+            input_path (str): The path to the input csv, Parquet or Arrow file.
+            output_path (str): The path to the output csv file.
+            state_path (str): The directory in which the progress through the
+                input file is kept between calls.
+            chunksize (int): The number of rows read at a time. Defaults to
+                10000.
+            **kwargs: Additional keyword arguments, as for process_file.
+
+        Returns:
+            PipelineStats: Counters for each stage, including the number of
+                rows written.
+        """
+        if self.searches is None:
+            raise ValueError("Define searches or use run_example_searches().")
+
+        return run_incremental(
+            input_path,
+            output_path,
+            state_path,
+            searches=compile_searches(self.searches),
+            column="report",
+            chunksize=chunksize,
+            drop_duplicates=kwargs.get("drop_duplicates", True),
+            drop_nulls=kwargs.get("drop_nulls", True),
+            drop_negatives=kwargs.get("drop_negatives", "negex"),
+            drop_stopwords=kwargs.get("drop_stopwords", "nltk"),
+            deduplicate=kwargs.get("deduplicate", False),
+            workers=kwargs.get("workers", None),
+            queue_size=kwargs.get("queue_size", None),
+        )
+
+    def build_index(self, column="report"):
+        """
+        Build an inverted index over the preprocessed data, so that ad-hoc
+        queries do not need to scan the text of every report.
+
+        Args:
+            column (str): The column to index. Defaults to 'report'.
+
+        Returns:
+            ReportIndex: The index.
+        """
+        if self.preprocessed_data is None:
+            raise ValueError(
+                "Data has not been preprocessed. Call preprocess_data() first."
+            )
+
+        self.report_index = ReportIndex(self.preprocessed_data[column])
+        return self.report_index
+
+    def query(self, expression):
+        """
+        Run an ad-hoc search against the index of the preprocessed data.
+        The index is built on the first query.
+
+        Args:
+            expression (str): The search e.g. 'thyr* NEAR2 nodul*'.
+
+        Returns:
+            pd.Series: Boolean result for each report.
+        """
+        if self.report_index is None:
+            self.build_index()
+
+        return self.report_index.search(expression)
+
     def run_example_searches(self):
         """
         Run example searches on the preprocessed data.
@@ -122,12 +383,42 @@ class Radex:
 
     def save_output(self, file_path):
         """
-        Save the output data to a csv file.
+        Save the output data to a csv, Parquet or Arrow file.
 
         Args:
-            file_path (str): The path to the csv file.
+            file_path (str): The path to the file.
         """
         if self.output_data is None:
             raise ValueError("No output data. Run searches first.")
 
-        self.output_data.to_csv(file_path, index=False)
+        write_table(self.output_data, file_path)
+
+    def save_preprocessed_data(self, file_path):
+        """
+        Save the preprocessed data to a csv, Parquet or Arrow file, so it can
+        be loaded later without preprocessing again.
+
+        Args:
+            file_path (str): The path to the file.
+        """
+        if self.preprocessed_data is None:
+            raise ValueError(
+                "Data has not been preprocessed. Call preprocess_data() first."
+            )
+
+        write_table(self.preprocessed_data, file_path)
+
+    def load_preprocessed_data(self, file_path, columns=None):
+        """
+        Load preprocessed data saved by save_preprocessed_data.
+
+        Args:
+            file_path (str): The path to the file.
+            columns (list, optional): Only read these columns e.g. ['report'].
+                Defaults to None (all columns).
+        """
+        self.report_index = None
+        self.search_cache.clear()
+        self.match_spans = None
+        self.preprocessed_data = read_table(file_path, columns=columns)
+        self.documents = {}
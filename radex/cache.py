@@ -0,0 +1,337 @@
+"""
+Caches of cleaned reports and sentences.
+
+PreprocessingCache is a local cache of cleaned reports, so a report which was
+already cleaned with the same settings, e.g. in an overlapping cohort extract,
+is not cleaned again. Entries are keyed by a hash of the preprocessing settings
+and the raw text, and stored in a SQLite database. When the cleaned text in the
+cache exceeds max_bytes, the least recently used entries are evicted.
+
+e.g. cache = PreprocessingCache("preprocessing_cache.sqlite")
+     df_clean = clean_dataframe(df, "report", drop_negatives="negex",
+                                cache=cache)
+     cache.stats  => CacheStats(hits=9000, misses=1000, evictions=0)
+
+SentenceCache is an in-memory cache of the work done on each sentence, as
+reports which differ often share most of their sentences verbatim. It is used
+for the negation-cleaned sentences (see NegationRules.sentence_cache) and for
+the results of the search terms in each sentence, or in each report when not
+searching sentence by sentence (see SearchResultCache.sentence_cache). The
+caches used by Radex report their stats in Radex.cache_stats.
+"""
+
+import hashlib
+import sqlite3
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Hashable, Iterable, List, Union
+
+# Default limit on the size of the cached text, 1 GB
+MAX_BYTES = 1 << 30
+
+# Default number of sentences in a SentenceCache
+SENTENCE_CACHE_SIZE = 100000
+
+# Number of keys per SQL statement, below the SQLite limit on query parameters
+_BATCH_SIZE = 500
+
+
+@dataclass
+class CacheStats:
+    """
+    Counters of cache lookups and evictions since the cache was opened.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        The fraction of lookups found in the cache.
+
+        Returns:
+            float: The hit rate
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+
+def cache_key(settings: bytes, text: str) -> bytes:
+    """
+    Get the cache key of a text cleaned with some settings.
+
+    Args:
+        settings (bytes): A description of the preprocessing settings
+        text (str): The raw text
+
+    Returns:
+        bytes: The 16 byte key
+    """
+    hasher = hashlib.blake2b(settings, digest_size=16)
+    hasher.update(b"\0")
+    hasher.update(text.encode("utf-8", "surrogatepass"))
+    return hasher.digest()
+
+
+def _text_size(text: str) -> int:
+    return len(text.encode("utf-8", "surrogatepass"))
+
+
+def _batches(items: List, size: int = _BATCH_SIZE) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
+
+
+class PreprocessingCache:
+    """
+    A SQLite cache of cleaned text, with least recently used eviction.
+    """
+
+    def __init__(
+        self, file_path: Union[str, Path], max_bytes: int = MAX_BYTES
+    ):
+        """
+        Open or create a cache.
+
+        Args:
+            file_path (str, Path): The SQLite database file
+            max_bytes (int, optional): The maximum size of the cached text and
+                                       keys. Defaults to 1 GB.
+
+        Raises:
+            ValueError: If max_bytes is negative
+        """
+        if max_bytes < 0:
+            raise ValueError("max_bytes must not be negative")
+
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+
+        self._connection = sqlite3.connect(str(file_path))
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key BLOB PRIMARY KEY, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS entries_last_used "
+            "ON entries (last_used)"
+        )
+        self._connection.commit()
+
+        # Logical clock, increased by each lookup or insert, to order entries
+        # by use
+        (self._clock,) = self._connection.execute(
+            "SELECT COALESCE(MAX(last_used), 0) FROM entries"
+        ).fetchone()
+
+    def __len__(self) -> int:
+        (count,) = self._connection.execute(
+            "SELECT COUNT(*) FROM entries"
+        ).fetchone()
+        return count
+
+    @property
+    def size(self) -> int:
+        """
+        The total size of the cached entries.
+
+        Returns:
+            int: The size in bytes
+        """
+        (size,) = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        return size
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, str]:
+        """
+        Look up cleaned texts, marking the ones found as recently used.
+
+        Args:
+            keys (iterable): Keys from cache_key
+
+        Returns:
+            dict: The cleaned text of each key found in the cache
+        """
+        keys = list(dict.fromkeys(keys))
+        self._clock += 1
+
+        found = {}
+        with self._connection:
+            for batch in _batches(keys):
+                placeholders = ",".join("?" * len(batch))
+                found.update(
+                    self._connection.execute(
+                        "SELECT key, value FROM entries "
+                        f"WHERE key IN ({placeholders})",
+                        batch,
+                    ).fetchall()
+                )
+                self._connection.execute(
+                    "UPDATE entries SET last_used = ? "
+                    f"WHERE key IN ({placeholders})",
+                    [self._clock, *batch],
+                )
+
+        self.stats.hits += len(found)
+        self.stats.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, entries: Dict[bytes, str]):
+        """
+        Add cleaned texts, then evict the least recently used entries if the
+        cache is larger than max_bytes.
+
+        Args:
+            entries (dict): The cleaned text of each key from cache_key
+        """
+        self._clock += 1
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    (key, value, len(key) + _text_size(value), self._clock)
+                    for key, value in entries.items()
+                ),
+            )
+            self._evict()
+
+    def _evict(self):
+        """
+        Delete the least recently used entries until the cache fits in
+        max_bytes.
+        """
+        excess = self.size - self.max_bytes
+        if excess <= 0:
+            return
+
+        evicted = []
+        for key, size in self._connection.execute(
+            "SELECT key, size FROM entries ORDER BY last_used"
+        ):
+            if excess <= 0:
+                break
+            evicted.append(key)
+            excess -= size
+
+        for batch in _batches(evicted):
+            placeholders = ",".join("?" * len(batch))
+            self._connection.execute(
+                f"DELETE FROM entries WHERE key IN ({placeholders})",
+                batch,
+            )
+        self.stats.evictions += len(evicted)
+
+    def clear(self):
+        """
+        Delete every entry.
+        """
+        with self._connection:
+            self._connection.execute("DELETE FROM entries")
+
+    def close(self):
+        """
+        Close the database.
+        """
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SentenceCache:
+    """
+    A bounded least recently used cache, keyed by sentence.
+
+    The entries are not pickled, so a copy sent to a worker process starts
+    empty and its lookups are only counted in the worker.
+
+    e.g. cache = SentenceCache(maxsize=1000)
+         cache.put("normal thyroid", "normal thyroid")
+         cache.get("normal thyroid")  => 'normal thyroid'
+         cache.stats.hit_rate         => 1.0
+    """
+
+    def __init__(self, maxsize: int = SENTENCE_CACHE_SIZE):
+        """
+        Create an empty cache.
+
+        Args:
+            maxsize (int, optional): The maximum number of sentences, or 0 to
+                                     disable the cache. Defaults to 100000.
+
+        Raises:
+            ValueError: If maxsize is negative
+        """
+        if maxsize < 0:
+            raise ValueError("maxsize must not be negative")
+
+        self.maxsize = maxsize
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up a sentence, marking it as recently used.
+
+        Args:
+            key (hashable): The sentence
+            default (optional): Returned if the sentence is not cached.
+                Defaults to None.
+
+        Returns:
+            The cached value, or the default
+        """
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.stats.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Add a sentence, evicting the least recently used sentence if the cache
+        is full.
+
+        Args:
+            key (hashable): The sentence
+            value: The value to cache
+        """
+        if self.maxsize == 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def clear(self):
+        """
+        Delete every entry.
+        """
+        self._entries.clear()
+
+    def __getstate__(self):
+        return {"maxsize": self.maxsize, "stats": CacheStats()}
+
+    def __setstate__(self, state):
+        self.maxsize = state["maxsize"]
+        self.stats = state["stats"]
+        self._entries = OrderedDict()
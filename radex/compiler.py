@@ -0,0 +1,691 @@
+"""
+Compile a parsed logical expression into a reusable evaluation plan.
+
+The nested list returned by Expression.parse_string is converted once into an
+immutable tree of nodes. Leaf nodes hold a pre-compiled regex pattern, so a
+plan can be evaluated against every row of a corpus without rebuilding regexes
+or calling eval() on intermediate strings.
+
+e.g. [['thyroid ', '&', ['nodul* ', '|', 'thyroid~~4node']]]
+    -> AndNode(TermNode('thyroid'),
+               OrNode(TermNode('nodul*'), TermNode('thyroid~~4node')))
+
+AND/OR nodes are evaluated lazily, stopping as soon as the result is known, and
+their operands are ordered by estimated cost so cheap terms are tried first:
+plain literal < wildcard < proximity.
+
+A plan can also be evaluated over a whole column at once
+(Node.evaluate_column): each term produces a boolean array over all rows and
+the operators are applied to the arrays.
+
+A dictionary of searches is compiled together into a SearchSet, which scans
+each candidate once for all distinct terms (see radex.scanner) and evaluates
+every search over the resulting set of hits.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from radex.cache import SentenceCache
+from radex.document import Document, DocumentColumn, as_document
+from radex.expression import Expression
+from radex.radexpressions import (
+    get_regex,
+    get_required_literals,
+    parse_proximity,
+    proximity_match,
+)
+from radex.scanner import MultiPatternScanner
+
+# Estimated relative cost of evaluating each kind of search term
+TERM_COSTS = {
+    "literal": 1,
+    "wildcard": 2,
+    "proximity": 4,
+}
+
+_WORD = re.compile(r"\w+")
+
+# Words of a proximity search which always match a whole token, e.g. 'nodul*'
+_TOKEN_WORD = re.compile(r"(?:[^\W_]|\*)+")
+
+# Operator symbols accepted in a parsed expression and their boolean meaning
+OPERATORS = {
+    "&": "and",
+    "^": "and",
+    "|": "or",
+    "v": "or",
+    "¬": "not",
+    "!": "not",
+}
+
+
+class Node:
+    """
+    Base class for a node of a compiled expression.
+    """
+
+    def evaluate(self, candidate: str, memo: Optional[dict] = None) -> bool:
+        """
+        Evaluate the node against a candidate string.
+
+        Args:
+            candidate (str): The candidate string to match against
+            memo (dict, optional): Results of terms already evaluated against
+                                    this candidate, keyed by regex. Shared
+                                    between the searches of a SearchSet.
+                                    Defaults to None.
+
+        Returns:
+            bool: The result of the evaluation
+        """
+        raise NotImplementedError
+
+    def evaluate_column(
+        self,
+        candidates: Union[pd.Series, DocumentColumn],
+        memo: Optional[dict] = None,
+    ) -> np.ndarray:
+        """
+        Evaluate the node against a whole column of candidate strings at once.
+        Each term is computed once as a boolean array over all rows, and the
+        logical operators are applied to those arrays with np.logical_and/ or/
+        not.
+
+        Args:
+            candidates (pd.Series, DocumentColumn): The candidate strings, or
+                                    the reports with their sentences, see
+                                    radex.document.DocumentColumn
+            memo (dict, optional): Boolean arrays of the terms already
+                                    evaluated against the column, keyed by
+                                    regex. Defaults to None.
+
+        Returns:
+            np.ndarray: Boolean array with the result for each candidate
+        """
+        raise NotImplementedError
+
+    @property
+    def cost(self) -> int:
+        """
+        Estimated cost of evaluating the node, used to order the operands of
+        AND/OR nodes.
+
+        Returns:
+            int: The estimated cost
+        """
+        raise NotImplementedError
+
+    def terms(self) -> Iterator["TermNode"]:
+        """
+        Iterate over the leaf terms of the node in evaluation order.
+
+        Yields:
+            TermNode: The leaf terms
+        """
+        raise NotImplementedError
+
+
+@dataclass(frozen=True)
+class TermNode(Node):
+    """
+    A single search term (wildcard or proximity search) with its compiled
+    regex.
+
+    Two terms are equal if they compile to the same regex, regardless of the
+    spacing used in the original expression.
+
+    The literal fragments which any match must contain e.g. 'thyroid' and
+    'cyst' for 'thyroid~~2cyst*' are checked with a substring test before the
+    regex is run.
+
+    Proximity searches between two single words e.g. 'thyroid~~2cyst*' are
+    evaluated from token positions rather than with the backtracking proximity
+    regex: the positions of each word in a sentence are found and compared with
+    a linear merge.
+    """
+
+    regex: str
+    expression: str = field(compare=False)
+    pattern: re.Pattern = field(compare=False, repr=False)
+    literals: Tuple[str, ...] = field(default=(), compare=False)
+    proximity: Optional[Tuple["TermNode", "TermNode", int, str]] = field(
+        default=None, compare=False, repr=False
+    )
+
+    @classmethod
+    def from_expression(cls, expression: str) -> "TermNode":
+        """
+        Compile a search term such as 'thyr*' or 'thyroid~~2cyst*'.
+
+        Args:
+            expression (str): The search term
+
+        Returns:
+            TermNode: The compiled term
+        """
+        expression = expression.strip()
+        regex = get_regex(expression)
+
+        proximity = None
+        if "~" in expression:
+            word1, word2, max_distance, direction = parse_proximity(expression)
+            # '_' is a word boundary
+            word1, word2 = word1.strip("_"), word2.strip("_")
+            if _TOKEN_WORD.fullmatch(word1) and _TOKEN_WORD.fullmatch(word2):
+                proximity = (
+                    cls.from_expression(word1),
+                    cls.from_expression(word2),
+                    max_distance,
+                    direction,
+                )
+
+        return cls(
+            regex=regex,
+            expression=expression,
+            pattern=re.compile(regex),
+            literals=tuple(get_required_literals(expression)),
+            proximity=proximity,
+        )
+
+    @property
+    def kind(self) -> str:
+        """
+        The kind of search term: 'literal', 'wildcard' or 'proximity'.
+
+        Returns:
+            str: The kind of search term
+        """
+        if "~" in self.expression:
+            return "proximity"
+        if "*" in self.expression or "?" in self.expression:
+            return "wildcard"
+        return "literal"
+
+    @property
+    def cost(self) -> int:
+        return TERM_COSTS[self.kind]
+
+    def evaluate(self, candidate: str, memo: Optional[dict] = None) -> bool:
+        if memo is not None:
+            if self.regex not in memo:
+                memo[self.regex] = self.search(candidate)
+            return memo[self.regex]
+        return self.search(candidate)
+
+    @property
+    def sentence_safe(self) -> bool:
+        """
+        Whether searching the whole candidate gives the same result as
+        searching each sentence individually, i.e. no match can span a '.'.
+        True for literal and '*' wildcard terms, False for '?' wildcards (which
+        match any character) and proximity searches (whose regex allows any
+        non-word characters between the words).
+
+        Returns:
+            bool: True if the term can be searched without splitting sentences
+        """
+        return self.kind != "proximity" and not any(
+            c in self.expression for c in ".?"
+        )
+
+    def evaluate_column(
+        self,
+        candidates: Union[pd.Series, DocumentColumn],
+        memo: Optional[dict] = None,
+    ) -> np.ndarray:
+        if memo is not None:
+            if self.regex not in memo:
+                memo[self.regex] = self.search_column(candidates)
+            return memo[self.regex]
+        return self.search_column(candidates)
+
+    def search_column(
+        self, candidates: Union[pd.Series, DocumentColumn]
+    ) -> np.ndarray:
+        """
+        Vectorised version of search for a column of candidate strings. Only
+        the candidates passing the prefilter are searched. Sentence safe terms
+        are matched against the whole candidates with Series.str.contains,
+        other terms are searched sentence by sentence, taking the sentences of
+        a DocumentColumn rather than splitting the candidates.
+
+        Args:
+            candidates (pd.Series, DocumentColumn): The candidate strings, or
+                                                    the reports with their
+                                                    sentences
+
+        Returns:
+            np.ndarray: Boolean array, True for the candidates containing the
+                term
+        """
+        documents = None
+        if isinstance(candidates, DocumentColumn):
+            documents, candidates = candidates, candidates.texts()
+
+        result = self.prefilter(candidates)
+        rows = np.flatnonzero(result)
+        if len(rows) == 0:
+            return result
+
+        subset = candidates.iloc[rows].astype(object)  # python regex semantics
+        if self.sentence_safe:
+            result[rows] = subset.str.contains(self.pattern).to_numpy(
+                dtype=bool
+            )
+        elif documents is not None:
+            result[rows] = [self.search(documents.document(i)) for i in rows]
+        else:
+            result[rows] = [self.search(candidate) for candidate in subset]
+        return result
+
+    def search(self, candidate: Union[str, Document]) -> bool:
+        """
+        Search the candidate for the term. Sentences are searched individually,
+        as in radexpressions.evaluate_regex.
+
+        Args:
+            candidate (str, Document): The candidate string to match against,
+                                        or its Document to reuse its sentences
+                                        and tokens
+
+        Returns:
+            bool: True if the term is found in the candidate
+        """
+        text = candidate.text if isinstance(candidate, Document) else candidate
+        if not self.may_match(text):
+            return False
+
+        document = as_document(candidate)
+        for span in document.spans:
+            start, end = span
+            sentence = text[start:end]
+            if not self.may_match(sentence):
+                continue
+            if self.proximity is not None:
+                if self.match_tokens(document.tokens(span)):
+                    return True
+            elif self.pattern.search(sentence):
+                return True
+        return False
+
+    def search_positions(self, sentence: str) -> bool:
+        """
+        Evaluate a proximity search between two single words from the token
+        positions of each word in the sentence, see
+        radexpressions.proximity_match.
+
+        Args:
+            sentence (str): The sentence to match against
+
+        Returns:
+            bool: True if the words are found within the maximum distance of
+                each other
+        """
+        return self.match_tokens(_WORD.findall(sentence))
+
+    def match_tokens(self, tokens: List[str]) -> bool:
+        """
+        Evaluate a proximity search between two single words against the tokens
+        of a sentence, see search_positions.
+
+        Args:
+            tokens (list): The words of the sentence
+
+        Returns:
+            bool: True if the words are found within the maximum distance of
+                each other
+        """
+        word1, word2, max_distance, direction = self.proximity
+        positions1 = [
+            i
+            for i, token in enumerate(tokens)
+            if word1.pattern.fullmatch(token)
+        ]
+        if not positions1:
+            return False
+        positions2 = [
+            i
+            for i, token in enumerate(tokens)
+            if word2.pattern.fullmatch(token)
+        ]
+        return proximity_match(positions1, positions2, max_distance, direction)
+
+    def may_match(self, candidate: str) -> bool:
+        """
+        Cheap check that the candidate contains every literal fragment of the
+        term.
+
+        Args:
+            candidate (str): The candidate string to match against
+
+        Returns:
+            bool: False if the term cannot match the candidate
+        """
+        return all(literal in candidate for literal in self.literals)
+
+    def prefilter(self, candidates: pd.Series) -> np.ndarray:
+        """
+        Vectorised version of may_match for a column of candidate strings.
+
+        Args:
+            candidates (pd.Series): The candidate strings
+
+        Returns:
+            np.ndarray: Boolean array, False for the candidates the term cannot
+                match
+        """
+        mask = np.ones(len(candidates), dtype=bool)
+        for literal in self.literals:
+            mask &= candidates.str.contains(literal, regex=False).to_numpy(
+                dtype=bool
+            )
+        return mask
+
+    def terms(self) -> Iterator["TermNode"]:
+        yield self
+
+
+@dataclass(frozen=True)
+class NotNode(Node):
+    """
+    Logical negation of a node.
+    """
+
+    operand: Node
+
+    def evaluate(self, candidate: str, memo: Optional[dict] = None) -> bool:
+        return not self.operand.evaluate(candidate, memo)
+
+    def evaluate_column(
+        self,
+        candidates: Union[pd.Series, DocumentColumn],
+        memo: Optional[dict] = None,
+    ) -> np.ndarray:
+        return np.logical_not(self.operand.evaluate_column(candidates, memo))
+
+    @property
+    def cost(self) -> int:
+        return self.operand.cost
+
+    def terms(self) -> Iterator[TermNode]:
+        yield from self.operand.terms()
+
+
+@dataclass(frozen=True)
+class AndNode(Node):
+    """
+    Logical conjunction of two or more nodes, stopping at the first False
+    operand.
+    """
+
+    operands: Tuple[Node, ...]
+
+    def evaluate(self, candidate: str, memo: Optional[dict] = None) -> bool:
+        return all(
+            operand.evaluate(candidate, memo) for operand in self.operands
+        )
+
+    def evaluate_column(
+        self,
+        candidates: Union[pd.Series, DocumentColumn],
+        memo: Optional[dict] = None,
+    ) -> np.ndarray:
+        return np.logical_and.reduce(
+            [
+                operand.evaluate_column(candidates, memo)
+                for operand in self.operands
+            ]
+        )
+
+    @property
+    def cost(self) -> int:
+        return sum(operand.cost for operand in self.operands)
+
+    def terms(self) -> Iterator[TermNode]:
+        for operand in self.operands:
+            yield from operand.terms()
+
+
+@dataclass(frozen=True)
+class OrNode(Node):
+    """
+    Logical disjunction of two or more nodes, stopping at the first True
+    operand.
+    """
+
+    operands: Tuple[Node, ...]
+
+    def evaluate(self, candidate: str, memo: Optional[dict] = None) -> bool:
+        return any(
+            operand.evaluate(candidate, memo) for operand in self.operands
+        )
+
+    def evaluate_column(
+        self,
+        candidates: Union[pd.Series, DocumentColumn],
+        memo: Optional[dict] = None,
+    ) -> np.ndarray:
+        return np.logical_or.reduce(
+            [
+                operand.evaluate_column(candidates, memo)
+                for operand in self.operands
+            ]
+        )
+
+    @property
+    def cost(self) -> int:
+        return sum(operand.cost for operand in self.operands)
+
+    def terms(self) -> Iterator[TermNode]:
+        for operand in self.operands:
+            yield from operand.terms()
+
+
+def _order_by_cost(operands: List[Node]) -> Tuple[Node, ...]:
+    """
+    Order the operands of an AND/OR node so the cheapest are evaluated first.
+    The sort is stable, so operands of equal cost keep their original order.
+    """
+    return tuple(sorted(operands, key=lambda operand: operand.cost))
+
+
+class _TokenParser:
+    """
+    Parse a flat list of operands and operator symbols, using the same
+    precedence as the python expression built by evaluate_logical_statement:
+    not > and > or.
+    """
+
+    def __init__(self, tokens: List[Union[list, str]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def parse(self) -> Node:
+        node = self._parse_or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Invalid logical statement: {self.tokens}")
+        return node
+
+    def _peek(self) -> str:
+        if self.position < len(self.tokens):
+            token = self.tokens[self.position]
+            if isinstance(token, str):
+                return OPERATORS.get(token, "")
+        return ""
+
+    def _parse_or(self) -> Node:
+        operands = [self._parse_and()]
+        while self._peek() == "or":
+            self.position += 1
+            operands.append(self._parse_and())
+        return (
+            operands[0]
+            if len(operands) == 1
+            else OrNode(_order_by_cost(operands))
+        )
+
+    def _parse_and(self) -> Node:
+        operands = [self._parse_not()]
+        while self._peek() == "and":
+            self.position += 1
+            operands.append(self._parse_not())
+        return (
+            operands[0]
+            if len(operands) == 1
+            else AndNode(_order_by_cost(operands))
+        )
+
+    def _parse_not(self) -> Node:
+        if self._peek() == "not":
+            self.position += 1
+            return NotNode(self._parse_not())
+
+        if self.position >= len(self.tokens) or self._peek():
+            raise ValueError(f"Invalid logical statement: {self.tokens}")
+
+        token = self.tokens[self.position]
+        self.position += 1
+        return compile_expression(token)
+
+
+def compile_expression(expression: Union[list, str]) -> Node:
+    """
+    Compile a logical expression into an evaluation plan. Accepts the nested
+    list returned by Expression.parse_string or a single search term.
+
+    e.g. plan = compile_expression(
+             Expression().parse_string("thyr* & ¬nodul*")
+         )
+         plan.evaluate("normal thyroid")
+         => True
+
+    Args:
+        expression (list, str): The logical expression to compile
+
+    Raises:
+        ValueError: If the expression is not a valid logical expression
+
+    Returns:
+        Node: The compiled expression
+    """
+    if isinstance(expression, str):
+        if expression in OPERATORS:
+            raise ValueError(f"Invalid logical statement: {expression}")
+        return TermNode.from_expression(expression)
+
+    if isinstance(expression, list):
+        tokens = [
+            i for i in expression if i not in ["(", ")"]
+        ]  # Remove excess brackets
+        return _TokenParser(tokens).parse()
+
+    raise ValueError("Invalid logical statement")
+
+
+class SearchSet:
+    """
+    A dictionary of searches compiled together so that identical terms are
+    shared.
+
+    Terms are identified by their regex, so 'thyroid ~~2 nodes' and
+    'thyroid~~2nodes' are the same term. When the set is evaluated against a
+    candidate, the candidate is scanned once for all distinct terms and each
+    search is evaluated over the terms found. Proximity searches between single
+    words are evaluated from token positions as needed.
+
+    e.g. search_set = compile_searches({"Nodule": "nodul* | thyroid~~2cyst*",
+                                        "Cyst": "thyroid~~2cyst*"})
+         search_set.evaluate("thyroid cysts")
+         => {'Nodule': True, 'Cyst': True}
+    """
+
+    def __init__(self, plans: Dict[str, Node]):
+        self.plans = plans
+
+        # Distinct terms across all searches, in order of first appearance
+        terms = {}
+        for plan in plans.values():
+            for term in plan.terms():
+                terms.setdefault(term.regex, term)
+        self.terms = list(terms.values())
+
+        # Proximity searches evaluated from token positions are not scanned
+        # for, they are searched lazily by the searches which need them.
+        scanned = [term for term in self.terms if term.proximity is None]
+        self.scanner = MultiPatternScanner(
+            (term.regex for term in scanned),
+            literals={term.regex: term.literals for term in scanned},
+        )
+
+    def scan(
+        self, candidate: Union[str, Document]
+    ) -> Dict[str, Tuple[int, int]]:
+        """
+        Find the terms of all searches in a candidate string in a single pass.
+        Proximity searches evaluated from token positions are not included.
+
+        Args:
+            candidate (str, Document): The candidate string to match against
+
+        Returns:
+            dict: The regex of each term found, mapped to the start/ end
+                indices of its first match
+        """
+        return self.scanner.scan(candidate)
+
+    def evaluate(
+        self,
+        candidate: Union[str, Document],
+        cache: Optional[SentenceCache] = None,
+    ) -> Dict[str, bool]:
+        """
+        Evaluate every search against a candidate string. The candidate is
+        split into sentences once, for the scan and every term searched
+        afterwards.
+
+        Args:
+            candidate (str, Document): The candidate string to match against
+            cache (SentenceCache, optional): The results of the terms in
+                                            candidates already evaluated, keyed
+                                            by candidate. Defaults to None.
+
+        Returns:
+            dict: The result of each search, keyed by search name
+        """
+        document = as_document(candidate)
+        memo = None if cache is None else cache.get(document.text)
+        if memo is None:
+            memo = dict.fromkeys(self.scanner.regexes, False)
+            memo.update(dict.fromkeys(self.scan(document), True))
+            if cache is not None:
+                cache.put(document.text, memo)
+        return {
+            name: plan.evaluate(document, memo)
+            for name, plan in self.plans.items()
+        }
+
+
+def compile_searches(searches: Dict[str, Union[list, str]]) -> SearchSet:
+    """
+    Compile a dictionary of searches e.g. Radex.searches into a SearchSet.
+
+    Args:
+        searches (dict): Search names mapped to a search string, or to the
+                            nested list returned by Expression.parse_string.
+
+    Returns:
+        SearchSet: The compiled searches
+    """
+    expression = Expression()
+    plans = {}
+    for name, search in searches.items():
+        if isinstance(search, str):
+            search = expression.parse_string(search)
+        plans[name] = compile_expression(search)
+
+    return SearchSet(plans)
@@ -1,15 +1,33 @@
 """
 Search a string or dataframe based on a logical expression.
-- Wildcards: * for multiple characters, ? for single character, _ for word boundary
+- Wildcards: * for multiple characters, ? for single character, _ for word
+boundary
 - Proximity: ~X where X is the maximum distance between two words
 - Operators: & for AND, | for OR, ¬ for NOT
 """
 
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
+from radex.cache import SENTENCE_CACHE_SIZE, SentenceCache
+from radex.compiler import (
+    OPERATORS,
+    Node,
+    SearchSet,
+    compile_expression,
+    compile_searches,
+)
+from radex.document import (
+    Document,
+    DocumentColumn,
+    SentenceTable,
+    as_document,
+)
+from radex.parallel import map_chunks
 from radex.radexpressions import string_search
+from radex.spans import MatchSpans, record_matches
 
 
 def flatten_list(list_in: list) -> list:
@@ -49,7 +67,7 @@ def list_to_string(input_list: Union[list, str]) -> str:
 
 
 def check_all_matches(
-    candidate: str,
+    candidate: Union[str, Document],
     expression: list,
 ) -> dict:
     """
@@ -63,27 +81,36 @@ def check_all_matches(
 
 
     Args:
-        candidate (str): The string to match against
+        candidate (str, Document): The string to match against
         expression (list): A list of logical expressions to match against
 
     Returns:
         dict: Dictionary of all the statements with matches found
     """
 
+    # Split the candidate into sentences once for every statement
+    document = as_document(candidate)
+
+    return {
+        part.strip(): string_search(document, part.strip())
+        for part in _statements(expression)
+    }
+
+
+def _statements(expression: list) -> list:
+    """
+    Get the statements of a logical expression, as matched by
+    check_all_matches.
+    """
     # Flatten the expression
     expression = flatten_list(expression)
-    expression = [
+    return [
         i for i in expression if i not in ["&", "|", "¬", "(", ")"]
     ]  # Remove operators
 
-    return {
-        part.strip(): string_search(candidate, part.strip())
-        for part in expression
-    }
-
 
 def evaluate_sentences(
-    candidate: str,
+    candidate: Union[str, Document],
     expression: Union[list, str],
     verbose: Optional[bool] = False,
 ) -> Union[bool, str]:
@@ -91,14 +118,14 @@ def evaluate_sentences(
     evaluate_sentences is a wrapper for evaluate_logical_statement
 
     Args:
-        candidate (str): The candidate string to match against
+        candidate (str, Document): The candidate string to match against
         expression (list): The logical expression to evaluate
         verbose (bool, optional): Verbose. Defaults to False.
 
     Returns:
         bool: The result of the logical expression evaluation
     """
-    for sentence in candidate.split("."):
+    for sentence in as_document(candidate).sentences:
         if verbose:
             print("\nSentence:", sentence)
         if evaluate_logical_statement(sentence, expression, verbose=verbose):
@@ -107,7 +134,7 @@ def evaluate_sentences(
 
 
 def evaluate_logical_statement(
-    candidate: str,
+    candidate: Union[str, Document],
     expression: Union[list, str],
     verbose: Optional[bool] = False,
 ) -> Union[str, bool]:
@@ -116,7 +143,7 @@ def evaluate_logical_statement(
 
 
     Args:
-        candidate (str): The candidate string to match against
+        candidate (str, Document): The candidate string to match against
         expression (str): The logical expression to evluate
         verbose (bool, optional): Verbose ouput. Defaults to False.
 
@@ -152,9 +179,12 @@ def evaluate_logical_statement(
             result = string_search(candidate, expression.strip())
             if verbose:
                 print(list_to_string(expression), "=>", result[0], result[1])
-            return string_search(candidate, expression.strip())[0]
+            return result[0]
 
     if isinstance(expression, list):  # Evaluate sub-statements recursively
+        # Split the candidate into sentences once for every statement
+        candidate = as_document(candidate)
+
         expression = [
             i for i in expression if i not in ["(", ")"]
         ]  # Remove excess brackets
@@ -178,13 +208,183 @@ def evaluate_logical_statement(
     raise ValueError("Invalid logical statement")
 
 
+def evaluate_plan(
+    candidate: Union[str, Document],
+    plan: Node,
+    sentencizer: Optional[bool] = False,
+    sentence_cache: Optional[SentenceCache] = None,
+) -> bool:
+    """
+    Evaluate a compiled expression against a candidate string.
+
+    Args:
+        candidate (str, Document): The candidate string to match against
+        plan (Node): The compiled expression, see
+            radex.compiler.compile_expression
+        sentencizer (bool, optional): If True, search each sentence
+                                        independently. Defaults to False.
+        sentence_cache (SentenceCache, optional): The results of the terms in
+                                        each sentence, or each candidate
+                                        without the sentencizer, already
+                                        searched, so a text repeated across
+                                        candidates is only searched once.
+                                        Defaults to None.
+
+    Returns:
+        bool: The result of the logical expression evaluation
+    """
+    document = as_document(candidate)
+    if sentencizer:
+        return any(
+            plan.evaluate(sentence, _sentence_memo(sentence, sentence_cache))
+            for sentence in document.sentences
+        )
+    return plan.evaluate(
+        document, _sentence_memo(document.text, sentence_cache)
+    )
+
+
+def _sentence_memo(
+    sentence: str, cache: Optional[SentenceCache]
+) -> Optional[dict]:
+    """
+    Get the results of the terms already evaluated against a sentence, or a
+    whole candidate, adding an empty memo to the cache for a new text. Terms
+    are keyed by regex, so the memo can be shared between expressions.
+    """
+    if cache is None:
+        return None
+    memo = cache.get(sentence)
+    if memo is None:
+        memo = {}
+        cache.put(sentence, memo)
+    return memo
+
+
+def _distinct_candidates(
+    candidates: pd.Series, deduplicate: bool
+) -> Tuple[pd.Series, Optional[np.ndarray]]:
+    """
+    Get the distinct values of a column and the position of each row's value
+    among them, or the column itself if not deduplicating. Missing values are
+    kept as a distinct value.
+    """
+    if not deduplicate:
+        return candidates, None
+    codes, uniques = pd.factorize(candidates, use_na_sentinel=False)
+    return pd.Series(uniques, name=candidates.name), codes
+
+
+def _search_candidates(
+    column: pd.Series,
+    documents: Optional[DocumentColumn],
+    deduplicate: bool,
+) -> Tuple[Union[pd.Series, DocumentColumn], Optional[np.ndarray]]:
+    """
+    Get the candidates to search for a column, distinct as in
+    _distinct_candidates if deduplicating: the reports with their sentences if
+    given, otherwise the text of each row.
+    """
+    if documents is None:
+        candidates, codes = _distinct_candidates(column, deduplicate)
+        return candidates.map(str), codes
+
+    if len(documents) != len(column):
+        raise ValueError("documents must have a report for each row")
+    if not deduplicate:
+        return documents, None
+    codes, _ = pd.factorize(column, use_na_sentinel=False)
+    _, first = np.unique(codes, return_index=True)
+    return documents.take(first), codes
+
+
+def _candidate(
+    candidates: Union[pd.Series, DocumentColumn], i: int
+) -> Union[str, Document]:
+    """
+    Get a single candidate, with its sentences for a DocumentColumn.
+    """
+    if isinstance(candidates, DocumentColumn):
+        return candidates.document(i)
+    return candidates.iat[i]
+
+
+def _search_sentence_table(
+    candidates: Union[pd.Series, DocumentColumn], plans: Dict[str, Node]
+) -> Dict[str, np.ndarray]:
+    """
+    Evaluate compiled expressions against every sentence of a column of
+    candidate strings, or of reports with their sentences, at once, see
+    radex.document.SentenceTable, and reduce to a result per candidate. Each
+    distinct sentence is evaluated once, and terms are shared between
+    expressions.
+    """
+    table = SentenceTable(candidates)
+    sentences, codes = _distinct_candidates(table.sentences, deduplicate=True)
+    memo = {}
+    return {
+        name: table.any(plan.evaluate_column(sentences, memo)[codes])
+        for name, plan in plans.items()
+    }
+
+
+def _search_column(
+    candidates: Union[pd.Series, DocumentColumn],
+    plan: Node,
+    sentencizer: bool,
+    engine: str,
+    sentence_cache: Optional[SentenceCache] = None,
+) -> np.ndarray:
+    """
+    Evaluate a compiled expression against a column of candidate strings, or
+    of reports with their sentences. The terms found in each distinct sentence,
+    or each distinct candidate without the sentencizer, are kept in a
+    SentenceCache for the column unless one is given.
+    """
+    if engine == "bitmap":
+        if sentencizer:
+            return _search_sentence_table(candidates, {"": plan})[""]
+        return plan.evaluate_column(candidates, memo={})
+
+    if sentence_cache is None:
+        sentence_cache = SentenceCache()
+
+    # Discard rows which do not contain the literal fragments of any term.
+    # With no term present, every row has the same result as an empty string.
+    texts = (
+        candidates.texts()
+        if isinstance(candidates, DocumentColumn)
+        else candidates
+    )
+    may_match = np.zeros(len(candidates), dtype=bool)
+    for term in plan.terms():
+        may_match |= term.prefilter(texts)
+
+    results = np.full(
+        len(candidates), evaluate_plan("", plan, sentencizer=sentencizer)
+    )
+    for i in np.flatnonzero(may_match):
+        results[i] = evaluate_plan(
+            _candidate(candidates, i),
+            plan,
+            sentencizer=sentencizer,
+            sentence_cache=sentence_cache,
+        )
+    return results
+
+
 def search_dataframe(
     df: pd.DataFrame,
     column: str,
-    expression: List,
+    expression: Union[List, Node],
     new_column_name: Optional[str] = None,
     debug_column: Optional[bool] = False,
     sentencizer: Optional[bool] = False,
+    engine: Optional[str] = "rowwise",
+    workers: Optional[int] = None,
+    deduplicate: Optional[bool] = False,
+    sentence_cache: Optional[SentenceCache] = None,
+    documents: Optional[DocumentColumn] = None,
 ) -> pd.DataFrame:
     """
     Search a column of a dataframe based on a logical expression.
@@ -192,33 +392,518 @@ def search_dataframe(
     Args:
         df (pd.DataFrame): The dataframe to search
         column (str): The column to search
-        expression (str): The logical expression to search for
-        new_column_name (str, optional): The new column name to store the results of the search.
-                                        Defaults to None.
-        debug_column (bool, optional): Return matching strings for regex search to enable debugging.
-                                        Defaults to False.
-        sentencizer (bool, optional): If True, search each sentence independently.
-                                        Defaults to False.
+        expression (list, Node): The logical expression to search for, either
+                                as parsed by Expression.parse_string or
+                                compiled by compile_expression.
+        new_column_name (str, optional): The new column name to store the
+                                        results of the search. Defaults to
+                                        None.
+        debug_column (bool, optional): Return matching strings for regex search
+                                        to enable debugging, as
+                                        check_all_matches. The matches are
+                                        recorded while searching row by row,
+                                        see radex.spans, and the engine is not
+                                        used. Defaults to False.
+        sentencizer (bool, optional): If True, search each sentence
+                                        independently. Defaults to False.
+        engine (str, optional): 'rowwise' to evaluate the expression row by
+                                row, or 'bitmap' to evaluate each term over the
+                                whole column as a boolean array and combine the
+                                arrays, see Node.evaluate_column. With the
+                                sentencizer, the bitmap engine evaluates the
+                                sentences of all rows as one column and
+                                combines the sentences of each row with any().
+                                Defaults to 'rowwise'.
+        workers (int, optional): Number of worker processes to search with,
+                                each searching chunks of rows balanced by
+                                length, see radex.parallel. Defaults to None
+                                (search in the current process).
+        deduplicate (bool, optional): If True, search each distinct text once
+                                    and copy the result to every row with that
+                                    text. Defaults to False.
+        sentence_cache (SentenceCache, optional): A cache of the terms found
+                                    in each sentence, or each report without
+                                    the sentencizer, to share between calls.
+                                    Only used by the 'rowwise' engine. Workers
+                                    start with an empty copy. Defaults to None
+                                    (a new cache for each call).
+        documents (DocumentColumn, optional): The reports of the column with
+                                    their sentences, one for each row of df,
+                                    e.g. from Radex.documents. The sentences
+                                    are taken from it rather than splitting
+                                    the reports again, and a missing report is
+                                    searched as empty text. Defaults to None.
+
+    Raises:
+        ValueError: If the engine is not 'rowwise' or 'bitmap', workers is
+            less than 1, or documents does not have a report for each row
 
     Returns:
         pd.DataFrame: Results of the search
     """
-    if sentencizer:  # Split the column into sentences and search each sentence
-        func = evaluate_sentences
-    else:  # Search the column as a whole
-        func = evaluate_logical_statement
+    if engine not in ["rowwise", "bitmap"]:
+        raise ValueError("engine must be 'rowwise' or 'bitmap'")
+
+    # Compile the expression once for the whole column
+    if isinstance(expression, Node):
+        plan = expression
+        expression = [term.expression for term in plan.terms()]
+    else:
+        plan = compile_expression(expression)
 
     if new_column_name is None:
         new_column_name = column + "_matches"
 
+    if debug_column:
+        # Record the matches in the same pass as the search
+        results, spans = _record_multiple(
+            df[column],
+            SearchSet({new_column_name: plan}),
+            sentencizer,
+            workers,
+            deduplicate,
+            documents,
+        )
+        results = results[new_column_name]
+    else:
+        candidates, codes = _search_candidates(
+            df[column], documents, deduplicate
+        )
+        chunks = map_chunks(
+            _search_column,
+            candidates,
+            workers=workers,
+            plan=plan,
+            sentencizer=sentencizer,
+            engine=engine,
+            sentence_cache=sentence_cache,
+        )
+        results = np.concatenate(chunks)
+        if codes is not None:
+            results = results[
+                codes
+            ]  # copy the result of each distinct text to its rows
+
     # Filter a column based on a logical expression
-    df[new_column_name] = df[column].apply(
-        lambda x: func(str(x), expression=expression, verbose=False)
-    )
+    df[new_column_name] = pd.Series(results, index=df.index)
 
     if debug_column:
-        df[new_column_name + "_matches"] = df[column].apply(
-            lambda x: check_all_matches(str(x), expression)
+        parts = [
+            part for part in _statements(expression) if part not in OPERATORS
+        ]
+        df[new_column_name + "_matches"] = pd.Series(
+            [
+                spans.matches(i, str(text), parts)
+                for i, text in enumerate(df[column])
+            ],
+            index=df.index,
+            dtype=object,
         )
 
     return df
+
+
+def _search_column_multiple(
+    candidates: Union[pd.Series, DocumentColumn],
+    searches: SearchSet,
+    sentencizer: bool,
+    sentence_cache: Optional[SentenceCache] = None,
+    engine: str = "rowwise",
+) -> Dict[str, np.ndarray]:
+    """
+    Evaluate a set of compiled searches against a column of candidate strings,
+    or of reports with their sentences. The terms found in each distinct
+    sentence, or each distinct candidate without the sentencizer, are kept in a
+    SentenceCache for the column unless one is given.
+    """
+    if engine == "bitmap":
+        if sentencizer:
+            return _search_sentence_table(candidates, searches.plans)
+        memo = {}
+        return {
+            name: plan.evaluate_column(candidates, memo)
+            for name, plan in searches.plans.items()
+        }
+
+    if sentence_cache is None:
+        sentence_cache = SentenceCache()
+
+    results = {
+        name: np.zeros(len(candidates), dtype=bool) for name in searches.plans
+    }
+    for i, candidate in enumerate(candidates):
+        if sentencizer:
+            row = dict.fromkeys(searches.plans, False)
+            for sentence in as_document(candidate).sentences:
+                for name, value in searches.evaluate(
+                    sentence, sentence_cache
+                ).items():
+                    row[name] = row[name] or value
+        else:
+            row = searches.evaluate(candidate, sentence_cache)
+
+        for name, value in row.items():
+            results[name][i] = value
+
+    return results
+
+
+def search_dataframe_multiple(
+    df: pd.DataFrame,
+    column: str,
+    searches: Union[Dict, SearchSet],
+    sentencizer: Optional[bool] = False,
+    workers: Optional[int] = None,
+    deduplicate: Optional[bool] = False,
+    sentence_cache: Optional[SentenceCache] = None,
+    engine: Optional[str] = "rowwise",
+    documents: Optional[DocumentColumn] = None,
+) -> pd.DataFrame:
+    """
+    Search a column of a dataframe with several logical expressions at once.
+    Terms shared between searches are evaluated once per row, see
+    radex.compiler.SearchSet.
+
+    Args:
+        df (pd.DataFrame): The dataframe to search
+        column (str): The column to search
+        searches (dict, SearchSet): Search names mapped to search strings or
+                                    parsed expressions, or a SearchSet from
+                                    compile_searches. A new column is created
+                                    for each search.
+        sentencizer (bool, optional): If True, search each sentence
+                                        independently. Defaults to False.
+        workers (int, optional): Number of worker processes to search with,
+                                each searching chunks of rows balanced by
+                                length, see radex.parallel. Defaults to None
+                                (search in the current process).
+        deduplicate (bool, optional): If True, search each distinct text once
+                                    and copy the results to every row with that
+                                    text. Defaults to False.
+        sentence_cache (SentenceCache, optional): A cache of the terms found
+                                    in each sentence, or each report without
+                                    the sentencizer, to share between calls.
+                                    Only used by the 'rowwise' engine. Workers
+                                    start with an empty copy. Defaults to None
+                                    (a new cache for each call).
+        engine (str, optional): 'rowwise' to scan each row once for the terms
+                                of all searches, or 'bitmap' to evaluate each
+                                search over the whole column, see
+                                search_dataframe. Defaults to 'rowwise'.
+        documents (DocumentColumn, optional): The reports of the column with
+                                    their sentences, one for each row of df,
+                                    e.g. from Radex.documents. The sentences
+                                    are taken from it rather than splitting
+                                    the reports again, and a missing report is
+                                    searched as empty text. Defaults to None.
+
+    Raises:
+        ValueError: If the engine is not 'rowwise' or 'bitmap', workers is
+            less than 1, or documents does not have a report for each row
+
+    Returns:
+        pd.DataFrame: Results of the searches
+    """
+    if engine not in ["rowwise", "bitmap"]:
+        raise ValueError("engine must be 'rowwise' or 'bitmap'")
+
+    if not isinstance(searches, SearchSet):
+        searches = compile_searches(searches)
+
+    results = _search_multiple(
+        df[column],
+        searches,
+        sentencizer,
+        workers,
+        deduplicate,
+        sentence_cache,
+        engine,
+        documents,
+    )
+    for name, values in results.items():
+        df[name] = pd.Series(values, index=df.index, dtype=bool)
+
+    return df
+
+
+def _search_multiple(
+    candidates: pd.Series,
+    searches: SearchSet,
+    sentencizer: bool = False,
+    workers: Optional[int] = None,
+    deduplicate: bool = False,
+    sentence_cache: Optional[SentenceCache] = None,
+    engine: str = "rowwise",
+    documents: Optional[DocumentColumn] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Evaluate a set of compiled searches against a column, or the reports of
+    the column with their sentences if given, in worker processes if
+    requested.
+    """
+    candidates, codes = _search_candidates(candidates, documents, deduplicate)
+    chunks = map_chunks(
+        _search_column_multiple,
+        candidates,
+        workers=workers,
+        searches=searches,
+        sentencizer=sentencizer,
+        sentence_cache=sentence_cache,
+        engine=engine,
+    )
+
+    results = {}
+    for name in searches.plans:
+        results[name] = np.concatenate([chunk[name] for chunk in chunks])
+        if codes is not None:
+            results[name] = results[name][codes]
+    return results
+
+
+def _record_multiple(
+    candidates: pd.Series,
+    searches: SearchSet,
+    sentencizer: bool = False,
+    workers: Optional[int] = None,
+    deduplicate: bool = False,
+    documents: Optional[DocumentColumn] = None,
+) -> Tuple[Dict[str, np.ndarray], MatchSpans]:
+    """
+    Evaluate a set of compiled searches against a column, or the reports of
+    the column with their sentences if given, recording every match of their
+    terms, see radex.spans.record_matches, in worker processes if requested.
+    """
+    candidates, codes = _search_candidates(candidates, documents, deduplicate)
+    chunks = map_chunks(
+        record_matches,
+        candidates,
+        workers=workers,
+        searches=searches,
+        sentencizer=sentencizer,
+    )
+
+    results = {}
+    for name in searches.plans:
+        results[name] = np.concatenate([chunk[0][name] for chunk in chunks])
+        if codes is not None:
+            results[name] = results[name][codes]
+
+    spans = MatchSpans.concat([chunk[1] for chunk in chunks])
+    if codes is not None:
+        spans = spans.take(codes)
+    return results, spans
+
+
+class SearchResultCache:
+    """
+    Keep the compiled form and result column of each search between runs
+    against the same dataframe, so that when the searches are edited only new
+    or changed searches are evaluated.
+
+    Searches are compiled once per search string, and a result is reused for
+    any search with an identical compiled plan, e.g. a renamed search. Changed
+    searches are evaluated column by column (see Node.evaluate_column), keeping
+    the boolean array of every term, so a term shared with an earlier search is
+    not searched for again. The first run, or a run with workers, evaluates the
+    searches together with search_dataframe_multiple, keeping the terms found
+    in each report in a SentenceCache across runs. A run which records the
+    matches of the terms evaluates every search in one pass, see radex.spans.
+
+    e.g. cache = SearchResultCache()
+         cache.search(df, "report", {"Nodule": "nodul*", "Goitre": "goitre"})
+         cache.search(
+             df,
+             "report",
+             {"Nodule": "nodul* | thyroid~~2cyst*", "Goitre": "goitre"},
+         )
+         cache.evaluated  => ['Nodule']
+    """
+
+    def __init__(self, sentence_cache_size: int = SENTENCE_CACHE_SIZE):
+        """
+        Create an empty cache.
+
+        Args:
+            sentence_cache_size (int, optional): The maximum number of reports
+                                    in self.sentence_cache, or 0 to disable
+                                    it. Defaults to 100000.
+
+        Raises:
+            ValueError: If sentence_cache_size is negative
+        """
+        self.plans: Dict[str, Node] = {}
+        self.results: Dict[str, np.ndarray] = {}
+        self.terms: Dict[str, np.ndarray] = {}
+        self.evaluated: List[str] = []
+        self.spans: Optional[MatchSpans] = None
+        self.sentence_cache = SentenceCache(sentence_cache_size)
+        self._source = None
+        self._documents = None
+        self._columns: List[str] = []
+        self._distinct = None
+
+    def clear(self):
+        """
+        Forget all results, e.g. when the data has changed. Compiled searches
+        are kept, and so is the sentence cache, as it is keyed by the text
+        searched.
+        """
+        self.results = {}
+        self.terms = {}
+        self.evaluated = []
+        self.spans = None
+        self._source = None
+        self._documents = None
+        self._columns = []
+        self._distinct = None
+
+    def compile(
+        self, searches: Dict[str, Union[list, str]]
+    ) -> Dict[str, Node]:
+        """
+        Compile searches, reusing the plans of search strings compiled before.
+
+        Args:
+            searches (dict): Search names mapped to a search string or parsed
+                list
+
+        Returns:
+            dict: Search names mapped to compiled plans
+        """
+        plans = {}
+        for name, search in searches.items():
+            key = search if isinstance(search, str) else repr(search)
+            if key not in self.plans:
+                self.plans[key] = compile_searches({name: search}).plans[name]
+            plans[name] = self.plans[key]
+        return plans
+
+    def search(
+        self,
+        df: pd.DataFrame,
+        column: str,
+        searches: Dict[str, Union[list, str]],
+        workers: Optional[int] = None,
+        deduplicate: bool = False,
+        spans: bool = False,
+        documents: Optional[DocumentColumn] = None,
+    ) -> pd.DataFrame:
+        """
+        Add a column of results for each search to a dataframe, as
+        search_dataframe_multiple, only evaluating the searches whose results
+        are not cached. Columns added by an earlier run for searches which have
+        since been removed are dropped.
+
+        The cache is cleared if a different dataframe is searched. Call clear()
+        if the column of the same dataframe is changed in place.
+
+        Args:
+            df (pd.DataFrame): Dataframe to search, modified in place
+            column (str): Column of the dataframe to search
+            searches (dict): Search names mapped to a search string or parsed
+                list
+            workers (int, optional): Number of worker processes. Defaults to
+                None.
+            deduplicate (bool, optional): If True, evaluate each distinct text
+                                        once. Defaults to False.
+            spans (bool, optional): If True, evaluate every search, recording
+                                    the matches of their terms in self.spans,
+                                    see radex.spans.MatchSpans. Defaults to
+                                    False.
+            documents (DocumentColumn, optional): The reports of the column
+                                    with their sentences, see
+                                    search_dataframe. Defaults to None.
+
+        Raises:
+            ValueError: If documents does not have a report for each row
+
+        Returns:
+            pd.DataFrame: The dataframe with a column for each search
+        """
+        if df is not self._source or documents is not self._documents:
+            self.clear()
+            self._source = df
+            self._documents = documents
+
+        plans = self.compile(searches)
+        keys = {name: repr(plan) for name, plan in plans.items()}
+
+        changed = {}
+        for name, plan in plans.items():
+            if spans or (
+                keys[name] not in self.results
+                and keys[name] not in changed.values()
+            ):
+                changed[name] = keys[name]
+        self.evaluated = list(changed)
+        self.spans = None
+
+        if spans:
+            results, self.spans = _record_multiple(
+                df[column],
+                SearchSet(plans),
+                workers=workers,
+                deduplicate=deduplicate,
+                documents=documents,
+            )
+            for name, values in results.items():
+                self.results[changed[name]] = values
+        elif changed and (not self.results or workers is not None):
+            search_set = SearchSet({name: plans[name] for name in changed})
+            for name, values in _search_multiple(
+                df[column],
+                search_set,
+                workers=workers,
+                deduplicate=deduplicate,
+                sentence_cache=self.sentence_cache,
+                documents=documents,
+            ).items():
+                self.results[changed[name]] = values
+        elif changed:
+            candidates, codes = self._candidates(
+                df[column], deduplicate, documents
+            )
+            for name in changed:
+                values = plans[name].evaluate_column(
+                    candidates, memo=self.terms
+                )
+                self.results[changed[name]] = (
+                    values if codes is None else values[codes]
+                )
+
+        # Only keep the results of the current searches
+        self.results = {key: self.results[key] for key in keys.values()}
+
+        df.drop(
+            columns=[
+                col for col in self._columns if col not in plans and col in df
+            ],
+            inplace=True,
+        )
+        for name, key in keys.items():
+            df[name] = pd.Series(self.results[key], index=df.index, dtype=bool)
+        self._columns = list(plans)
+
+        return df
+
+    def _candidates(
+        self,
+        column: pd.Series,
+        deduplicate: bool,
+        documents: Optional[DocumentColumn],
+    ) -> Tuple[Union[pd.Series, DocumentColumn], Optional[np.ndarray]]:
+        """
+        Get the candidates which the term arrays are evaluated against: the
+        distinct texts of the column if deduplicating, otherwise every row, or
+        the same of the documents if given. The term arrays are cleared when
+        switching between the two.
+        """
+        if not deduplicate:
+            if self._distinct is not None:
+                self.terms, self._distinct = {}, None
+            return _search_candidates(column, documents, False)
+
+        if self._distinct is None:
+            self.terms = {}
+            self._distinct = _search_candidates(column, documents, True)
+        return self._distinct
@@ -0,0 +1,453 @@
+"""
+A report segmented into sentences once, and shared by every stage which works
+sentence by sentence: the negation step, the search of each term (wildcard and
+proximity) and the sentencizer.
+
+Sentences end at each full stop, as split by str.split("."), so a decimal such
+as '1.4 cm' is also split. Every stage uses the same sentences, so a term is
+found in a sentence by search_dataframe exactly when the sentencizer finds it
+there.
+
+The sentences, the spans of the non-empty sentences without surrounding
+whitespace, and the tokens of each sentence are computed when first needed and
+then kept, so terms searched against the same document do not split it again.
+
+e.g. document = Document("normal thyroid.  no nodules. ")
+     document.sentences         => ['normal thyroid', '  no nodules', ' ']
+     document.spans             => [(0, 14), (17, 27)]
+     document.tokens((17, 27))  => ['no', 'nodules']
+
+A DocumentColumn finds the full stops of a whole column of reports at once,
+when the reports are cleaned, so the negation step and the searches slice the
+sentences of each report out of it rather than splitting the report again. It
+is saved, and memory-mapped when loaded, by radex.store.
+
+A SentenceTable holds the sentences of a whole column of reports as one flat
+column, so a search can be evaluated over every sentence at once (see
+Node.evaluate_column) and reduced back to one result per report.
+"""
+
+import re
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# The character which ends a sentence
+SENTENCE_END = "."
+
+_FULL_STOP = ord(SENTENCE_END)
+
+_WORD = re.compile(r"\w+")
+
+
+class Document:
+    """
+    The text of a report with its sentences, spans and tokens.
+    """
+
+    __slots__ = ("text", "_sentences", "_spans", "_tokens")
+
+    def __init__(self, text: str, sentences: Optional[List[str]] = None):
+        """
+        Wrap a text. The sentences are split when first needed.
+
+        Args:
+            text (str): The text
+            sentences (list, optional): The sentences of the text if already
+                                        split, e.g. by
+                                        DocumentColumn.sentences. Defaults to
+                                        None.
+        """
+        self.text = text
+        self._sentences = sentences
+        self._spans: Optional[List[Tuple[int, int]]] = None
+        self._tokens: Dict[Tuple[int, int], List[str]] = {}
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __repr__(self) -> str:
+        return f"Document({self.text!r})"
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    @property
+    def sentences(self) -> List[str]:
+        """
+        The sentences, including empty ones, i.e. the text split on full stops.
+
+        Returns:
+            list: The sentences
+        """
+        if self._sentences is None:
+            self._sentences = self.text.split(SENTENCE_END)
+        return self._sentences
+
+    @property
+    def spans(self) -> List[Tuple[int, int]]:
+        """
+        The start/ end indices of the non-empty sentences in the text,
+        excluding surrounding whitespace.
+
+        Returns:
+            list: The span of each non-empty sentence
+        """
+        if self._spans is None:
+            spans = []
+            offset = 0
+            for sentence in self.sentences:
+                stripped = sentence.strip()
+                if stripped:
+                    start = offset + len(sentence) - len(sentence.lstrip())
+                    spans.append((start, start + len(stripped)))
+                offset += len(sentence) + 1
+            self._spans = spans
+        return self._spans
+
+    def tokens(self, span: Tuple[int, int]) -> List[str]:
+        """
+        The words of a sentence, as used by proximity searches.
+
+        Args:
+            span (tuple): The span of the sentence, from spans
+
+        Returns:
+            list: The words of the sentence
+        """
+        tokens = self._tokens.get(span)
+        if tokens is None:
+            tokens = _WORD.findall(self.text, *span)
+            self._tokens[span] = tokens
+        return tokens
+
+
+def as_document(candidate: Union[str, Document]) -> Document:
+    """
+    Wrap a text in a Document, unless already wrapped.
+
+    Args:
+        candidate (str, Document): The text
+
+    Returns:
+        Document: The document
+    """
+    if isinstance(candidate, Document):
+        return candidate
+    return Document(candidate)
+
+
+class DocumentColumn:
+    """
+    A column of reports with the positions of their sentences, found once for
+    the whole column.
+
+    The reports are kept as their concatenated UTF-8 bytes, with the byte
+    offset of each report and of every full stop. A full stop is never part of
+    a multi-byte character, so these are also the sentence boundaries of the
+    decoded reports, and the sentences are the same as from str.split(".").
+
+    e.g. documents = DocumentColumn.from_series(
+             pd.Series(["thyroid. no nodules", np.nan])
+         )
+         documents[0]            => 'thyroid. no nodules'
+         documents.sentences(0)  => ['thyroid', ' no nodules']
+         documents.document(0)   => Document('thyroid. no nodules')
+         documents.document(1)   => Document('')
+    """
+
+    def __init__(
+        self,
+        text: np.ndarray,
+        offsets: np.ndarray,
+        missing: np.ndarray,
+        stops: np.ndarray,
+        values: Optional[np.ndarray] = None,
+    ):
+        """
+        Wrap the arrays of a column, e.g. as saved by radex.store.
+
+        Args:
+            text (np.ndarray): The UTF-8 bytes of the reports, concatenated
+            offsets (np.ndarray): The byte offset of each report in the text,
+                                  plus the end offset
+            missing (np.ndarray): Whether each report is missing e.g. NaN
+            stops (np.ndarray): The byte offset of every full stop in the text
+            values (np.ndarray, optional): The reports as strings, with NaN
+                                           for missing reports, if already
+                                           decoded. Defaults to None (decoded
+                                           when accessed).
+        """
+        self.text = text
+        self.offsets = offsets
+        self.missing = missing
+        self.stops = stops
+        self._values = values
+        self._texts: Optional[pd.Series] = None
+
+    @classmethod
+    def from_series(cls, column: pd.Series) -> "DocumentColumn":
+        """
+        Find the sentences of a column of reports. Values which are not
+        strings are missing reports.
+
+        Args:
+            column (pd.Series): The reports
+
+        Returns:
+            DocumentColumn: The reports with their sentences
+        """
+        values = np.empty(len(column), dtype=object)
+        values[:] = [x if isinstance(x, str) else np.nan for x in column]
+        missing = np.fromiter(
+            (not isinstance(x, str) for x in values),
+            dtype=bool,
+            count=len(values),
+        )
+        encoded = [
+            b"" if miss else x.encode("utf-8")
+            for x, miss in zip(values, missing)
+        ]
+
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(x) for x in encoded], out=offsets[1:])
+        text = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        stops = np.flatnonzero(text == _FULL_STOP).astype(np.int64)
+        return cls(text, offsets, missing, stops, values)
+
+    def __len__(self) -> int:
+        return len(self.missing)
+
+    def __getitem__(
+        self, key: Union[int, slice]
+    ) -> Union[str, float, "DocumentColumn"]:
+        if isinstance(key, slice):
+            return self._slice(key)
+        if self.missing[key]:
+            return np.nan
+        if self._values is not None:
+            return self._values[key]
+        return self._report(key).decode("utf-8")
+
+    def __iter__(self) -> Iterator[Document]:
+        return map(self.document, range(len(self)))
+
+    def _report(self, i: int) -> bytes:
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.text[start:end].tobytes()
+
+    def _slice(self, key: slice) -> "DocumentColumn":
+        """
+        Get a contiguous range of the reports, sharing the arrays.
+        """
+        start, stop, step = key.indices(len(self))
+        if step != 1:
+            return self.take(np.arange(start, stop, step))
+        stop = max(start, stop)
+
+        first, last = int(self.offsets[start]), int(self.offsets[stop])
+        stop_first, stop_last = np.searchsorted(self.stops, [first, last])
+        end = stop + 1
+        return DocumentColumn(
+            self.text[first:last],
+            self.offsets[start:end] - first,
+            self.missing[start:stop],
+            self.stops[stop_first:stop_last] - first,
+            None if self._values is None else self._values[start:stop],
+        )
+
+    def take(self, positions: np.ndarray) -> "DocumentColumn":
+        """
+        Get the reports at the given positions, e.g. the first row of each
+        distinct report.
+
+        Args:
+            positions (np.ndarray): The positions of the reports
+
+        Returns:
+            DocumentColumn: The reports, in the order of the positions
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = np.asarray(self.offsets)[positions]
+        lengths = np.asarray(self.offsets)[positions + 1] - starts
+
+        offsets = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        gather = np.repeat(starts - offsets[:-1], lengths) + np.arange(
+            offsets[-1]
+        )
+        text = np.asarray(self.text)[gather]
+        return DocumentColumn(
+            text,
+            offsets,
+            np.asarray(self.missing)[positions],
+            np.flatnonzero(text == _FULL_STOP).astype(np.int64),
+            None if self._values is None else self._values[positions],
+        )
+
+    def lengths(self) -> np.ndarray:
+        """
+        The length of each report in bytes, e.g. to balance chunks of the
+        column between worker processes.
+
+        Returns:
+            np.ndarray: The length of each report
+        """
+        return np.diff(self.offsets)
+
+    def sentence_offsets(self, i: int) -> np.ndarray:
+        """
+        Get the byte offsets of the sentences of a report, relative to its
+        start.
+
+        Args:
+            i (int): The position of the report
+
+        Returns:
+            np.ndarray: The start of each sentence and the end of the report,
+                        so sentence j spans offsets[j] to offsets[j + 1] - 1
+                        (excluding the full stop)
+        """
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        first, last = np.searchsorted(self.stops, [start, end])
+        return np.concatenate(
+            [[0], self.stops[first:last] + 1 - start, [end - start + 1]]
+        )
+
+    def sentences(self, i: int) -> List[str]:
+        """
+        Get the sentences of a report, as split on full stops by the
+        sentencizer.
+
+        Args:
+            i (int): The position of the report
+
+        Returns:
+            list: The sentences, or an empty list if the report is missing
+        """
+        if self.missing[i]:
+            return []
+        report = self[i]
+        bounds = self.sentence_offsets(i).tolist()
+        starts, ends = bounds[:-1], [bound - 1 for bound in bounds[1:]]
+        if len(report) != ends[-1]:
+            # Not ASCII, so the byte offsets are not character offsets
+            report = self._report(i)
+            return [
+                report[start:end].decode("utf-8")
+                for start, end in zip(starts, ends)
+            ]
+        return [report[start:end] for start, end in zip(starts, ends)]
+
+    def document(self, i: int) -> Document:
+        """
+        Get a report with its sentences, so it is not split again when
+        searched.
+
+        Args:
+            i (int): The position of the report
+
+        Returns:
+            Document: The report, with empty text if the report is missing
+        """
+        if self.missing[i]:
+            return Document("", [""])
+        return Document(self[i], self.sentences(i))
+
+    def texts(self) -> pd.Series:
+        """
+        The reports as searched, with an empty string for a missing report as
+        in document. Decoded once and then kept.
+
+        Returns:
+            pd.Series: The reports
+        """
+        if self._texts is None:
+            self._texts = self.to_series().fillna("")
+        return self._texts
+
+    def to_series(self, index: Optional[pd.Index] = None) -> pd.Series:
+        """
+        Get the whole column as a series.
+
+        Args:
+            index (pd.Index, optional): The index of the series. Defaults to
+                None.
+
+        Returns:
+            pd.Series: The reports, with NaN for missing reports
+        """
+        if self._values is not None:
+            return pd.Series(self._values, index=index, dtype=object)
+
+        text = self.text.tobytes()
+        offsets = self.offsets.tolist()
+        missing = self.missing.tolist()
+        values = [
+            np.nan if miss else text[start:end].decode("utf-8")
+            for start, end, miss in zip(offsets[:-1], offsets[1:], missing)
+        ]
+        return pd.Series(values, index=index, dtype=object)
+
+
+class SentenceTable:
+    """
+    The sentences of a column of reports, one row per sentence, with the
+    position of the report and of the sentence within the report.
+
+    e.g. table = SentenceTable(pd.Series(["thyroid. no nodules", "cyst"]))
+         table.sentences.tolist()  => ['thyroid', ' no nodules', 'cyst']
+         table.report_ids          => array([0, 0, 1])
+         table.sentence_ids        => array([0, 1, 0])
+         table.any(np.array([False, True, False]))  => array([ True, False])
+    """
+
+    def __init__(self, reports: Union[pd.Series, DocumentColumn]):
+        """
+        Split every report into sentences, or take the sentences found for a
+        DocumentColumn.
+
+        Args:
+            reports (pd.Series, DocumentColumn): The reports, as strings or
+                                                with their sentences
+        """
+        if not isinstance(reports, DocumentColumn):
+            reports = map(Document, reports)
+        sentences = [document.sentences for document in reports]
+        counts = np.fromiter(
+            map(len, sentences), dtype=np.int64, count=len(sentences)
+        )
+
+        self.sentences = pd.Series(
+            list(chain.from_iterable(sentences)), dtype=object
+        )
+        self.report_ids = np.repeat(np.arange(len(counts)), counts)
+
+        # Position of the first sentence of each report. Every report has at
+        # least one sentence, possibly empty, as with str.split.
+        self.starts = np.zeros(len(counts), dtype=np.int64)
+        np.cumsum(counts[:-1], out=self.starts[1:])
+        self.sentence_ids = (
+            np.arange(len(self.sentences)) - self.starts[self.report_ids]
+        )
+
+    def __len__(self) -> int:
+        return len(self.sentences)
+
+    def any(self, values: np.ndarray) -> np.ndarray:
+        """
+        Reduce a boolean array over the sentences to the reports.
+
+        Args:
+            values (np.ndarray): A boolean for each sentence
+
+        Returns:
+            np.ndarray: True for the reports with any sentence True
+        """
+        if len(self.starts) == 0:
+            return np.zeros(0, dtype=bool)
+        return np.logical_or.reduceat(
+            np.asarray(values, dtype=bool), self.starts
+        )
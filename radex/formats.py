@@ -0,0 +1,392 @@
+"""
+Read and write tables of reports as csv, Parquet or Arrow IPC (Feather) files.
+
+The format is chosen from the file extension: .csv, .parquet/ .pq, or .arrow/
+.feather/ .ipc. Parquet and Arrow need the optional pyarrow package (pip
+install radex[parquet]), which is only imported when one of these formats is
+used.
+
+Parquet and Arrow files keep the dtype of each column, e.g. search results are
+stored as booleans rather than text, and only the requested columns are read
+from them. They can also be read in chunks, one batch of rows at a time.
+"""
+
+from pathlib import Path
+from typing import Iterator, List, Optional, Union
+
+import pandas as pd
+
+CSV_SUFFIXES = (".csv",)
+PARQUET_SUFFIXES = (".parquet", ".pq")
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+
+
+def file_format(file_path: Union[str, Path]) -> str:
+    """
+    Get the format of a file from its extension.
+
+    Args:
+        file_path (str, Path): The path to the file
+
+    Raises:
+        ValueError: If the extension is not a supported format
+
+    Returns:
+        str: 'csv', 'parquet' or 'arrow'
+    """
+    suffix = Path(file_path).suffix.lower()
+    if suffix in CSV_SUFFIXES:
+        return "csv"
+    if suffix in PARQUET_SUFFIXES:
+        return "parquet"
+    if suffix in ARROW_SUFFIXES:
+        return "arrow"
+    raise ValueError(
+        f"Unsupported file format: {suffix}. "
+        "Use .csv, .parquet or .arrow/ .feather"
+    )
+
+
+def import_pyarrow():
+    """
+    Import pyarrow, which is only needed for Parquet and Arrow files.
+
+    Raises:
+        ImportError: If pyarrow is not installed
+
+    Returns:
+        module: The pyarrow module
+    """
+    try:
+        # pylint: disable=import-outside-toplevel,unused-import
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError(
+            "Reading and writing Parquet or Arrow files requires pyarrow. "
+            "Install it with: pip install pyarrow"
+        ) from error
+    return pyarrow
+
+
+def read_table(
+    file_path: Union[str, Path], columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Read a csv, Parquet or Arrow file into a dataframe.
+
+    Args:
+        file_path (str, Path): The path to the file
+        columns (list, optional): Only read these columns. Defaults to None
+            (all columns).
+
+    Returns:
+        pd.DataFrame: The table
+    """
+    fmt = file_format(file_path)
+    if fmt == "csv":
+        return pd.read_csv(file_path, usecols=columns)
+
+    import_pyarrow()
+    if fmt == "parquet":
+        return pd.read_parquet(file_path, columns=columns)
+    return pd.read_feather(file_path, columns=columns)
+
+
+def write_table(df: pd.DataFrame, file_path: Union[str, Path]):
+    """
+    Write a dataframe to a csv, Parquet or Arrow file, without the index.
+
+    Args:
+        df (pd.DataFrame): The table
+        file_path (str, Path): The path to the file
+    """
+    fmt = file_format(file_path)
+    if fmt == "csv":
+        df.to_csv(file_path, index=False)
+        return
+
+    import_pyarrow()
+    if fmt == "parquet":
+        df.to_parquet(file_path, index=False)
+    else:
+        df.reset_index(drop=True).to_feather(file_path)
+
+
+def iter_table_chunks(
+    file_path: Union[str, Path],
+    chunksize: int,
+    columns: Optional[List[str]] = None,
+    text_column: Optional[str] = None,
+    start: int = 0,
+    schema=None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Read a csv, Parquet or Arrow file in chunks of at most chunksize rows. The
+    index of each chunk continues from the previous chunk, as if the whole file
+    had been read.
+
+    Args:
+        file_path (str, Path): The path to the file
+        chunksize (int): The maximum number of rows per chunk
+        columns (list, optional): Only read these columns. Defaults to None
+            (all columns).
+        text_column (str, optional): A text column of a csv file, read as
+                                    strings even in chunks where every value is
+                                    missing. Defaults to None.
+        start (int, optional): Skip this many rows at the start of the file.
+                               Parquet row groups before the start are not
+                               read. Defaults to 0.
+        schema (pyarrow.Schema, optional): Read the columns of a csv file as
+                                          these types, e.g. the types of the
+                                          first chunk from read_schema, so a
+                                          column has the same type in every
+                                          chunk. Defaults to None (the types
+                                          are guessed for each chunk).
+
+    Yields:
+        pd.DataFrame: The chunks of the file
+    """
+    fmt = file_format(file_path)
+    if fmt == "csv":
+        dtype = {} if schema is None else _csv_dtypes(schema)
+        if text_column is not None:
+            dtype[text_column] = str
+        with pd.read_csv(
+            file_path,
+            chunksize=chunksize,
+            usecols=columns,
+            dtype=dtype or None,
+            skiprows=range(1, start + 1) if start else None,
+        ) as reader:
+            for chunk in reader:
+                chunk.index += start
+                yield chunk
+        return
+
+    pyarrow = import_pyarrow()
+    skipped = 0
+    if fmt == "parquet":
+        parquet_file = pyarrow.parquet.ParquetFile(file_path)
+        row_groups = []
+        for i in range(parquet_file.num_row_groups):
+            rows = parquet_file.metadata.row_group(i).num_rows
+            if not row_groups and skipped + rows <= start:
+                skipped += rows
+            else:
+                row_groups.append(i)
+        batches = parquet_file.iter_batches(
+            batch_size=chunksize, columns=columns, row_groups=row_groups
+        )
+    else:
+        batches = _iter_arrow_batches(pyarrow, file_path, chunksize, columns)
+
+    position = start
+    for batch in batches:
+        if skipped < start:
+            skip = min(start - skipped, batch.num_rows)
+            skipped += skip
+            batch = batch.slice(skip)
+            if batch.num_rows == 0:
+                continue
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(position, position + len(chunk))
+        position += len(chunk)
+        yield chunk
+
+
+def _iter_arrow_batches(
+    pyarrow, file_path, chunksize: int, columns: Optional[List[str]]
+):
+    """
+    Iterate over the record batches of an Arrow IPC file, split into at most
+    chunksize rows.
+    """
+    with pyarrow.memory_map(str(file_path)) as source:
+        reader = pyarrow.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(columns)
+            for offset in range(0, batch.num_rows, chunksize):
+                yield batch.slice(offset, chunksize)
+
+
+def read_schema(
+    file_path: Union[str, Path],
+    columns: Optional[List[str]] = None,
+    chunksize: int = 10000,
+    text_column: Optional[str] = None,
+):
+    """
+    Get the types of the columns of a file. Parquet and Arrow files store the
+    type of each column. The types of a csv file are those of its first chunk
+    as read by pandas, e.g. integers, floats or strings, and a column whose
+    values are all missing in the first chunk is taken to be strings. Reading
+    the csv file with iter_table_chunks(..., schema=schema) gives every
+    chunk these types. Requires pyarrow.
+
+    Args:
+        file_path (str, Path): The path to the file
+        columns (list, optional): Only include these columns. Defaults to None
+            (all columns).
+        chunksize (int, optional): The number of rows of the first chunk of a
+            csv file. Defaults to 10000.
+        text_column (str, optional): A text column of a csv file, taken to be
+            strings. Defaults to None.
+
+    Returns:
+        pyarrow.Schema: The name and type of each column
+    """
+    pyarrow = import_pyarrow()
+    fmt = file_format(file_path)
+    if fmt == "csv":
+        first = pd.read_csv(
+            file_path,
+            nrows=chunksize,
+            usecols=columns,
+            dtype=None if text_column is None else {text_column: str},
+        )
+        schema = pyarrow.Schema.from_pandas(first, preserve_index=False)
+        for col in first.columns[first.isna().all()]:
+            i = schema.get_field_index(col)
+            schema = schema.set(i, pyarrow.field(col, pyarrow.string()))
+    elif fmt == "parquet":
+        schema = pyarrow.parquet.read_schema(file_path)
+    else:
+        with pyarrow.memory_map(str(file_path)) as source:
+            schema = pyarrow.ipc.open_file(source).schema
+    if columns is not None:
+        schema = pyarrow.schema([schema.field(col) for col in columns])
+    return schema.remove_metadata()
+
+
+def _csv_dtypes(schema) -> dict:
+    """
+    Get the pandas dtype to read each column of a schema from a csv file.
+    Integers and booleans are read as the nullable pandas types, so that a
+    chunk with missing values keeps the type.
+    """
+    pyarrow = import_pyarrow()
+    dtypes = {}
+    for field in schema:
+        name = str(field.type)
+        if pyarrow.types.is_unsigned_integer(field.type):
+            dtypes[field.name] = name.replace("uint", "UInt")
+        elif pyarrow.types.is_integer(field.type):
+            dtypes[field.name] = name.capitalize()
+        elif pyarrow.types.is_boolean(field.type):
+            dtypes[field.name] = "boolean"
+        elif pyarrow.types.is_floating(field.type):
+            dtypes[field.name] = field.type.to_pandas_dtype()
+        else:
+            dtypes[field.name] = str
+    return dtypes
+
+
+class TableWriter:
+    """
+    Write a table chunk by chunk to a csv, Parquet or Arrow file. The csv
+    header is written once, and each chunk becomes a row group of the Parquet
+    file or a record batch of the Arrow file. The columns of every chunk are
+    converted to the types of the first chunk, or to the types given in
+    schema, e.g. the schema of the input file from read_schema. A column
+    whose values are all missing in the first chunk, such as an optional note,
+    is then written with the type of the input column rather than a type
+    guessed from the missing values.
+
+    With append=True, chunks are added to the end of an existing csv file
+    without writing the header again. Parquet and Arrow files cannot be
+    appended to.
+    """
+
+    def __init__(
+        self, file_path: Union[str, Path], append: bool = False, schema=None
+    ):
+        """
+        Open a file for writing. The file is created by the first chunk.
+
+        Args:
+            file_path (str, Path): The path to the file
+            append (bool, optional): Append to an existing csv file. Defaults
+                to False.
+            schema (pyarrow.Schema, optional): The types of some or all of the
+                columns of a Parquet or Arrow file, other columns take the
+                types of the first chunk. Defaults to None.
+
+        Raises:
+            ValueError: If appending to a Parquet or Arrow file
+        """
+        self.file_path = file_path
+        self.format = file_format(file_path)
+        self.rows = 0
+        self._started = False
+        self._writer = None
+        self._schema = None
+        self._types = schema
+        if append:
+            if self.format != "csv":
+                raise ValueError("Only csv files can be appended to")
+            path = Path(file_path)
+            self._started = path.exists() and path.stat().st_size > 0
+        if self.format != "csv":
+            import_pyarrow()
+
+    def write(self, chunk: pd.DataFrame):
+        """
+        Append a chunk to the file, overwriting any existing file on the first
+        chunk unless appending.
+
+        Args:
+            chunk (pd.DataFrame): The chunk to write
+        """
+        if self.format == "csv":
+            chunk.to_csv(
+                self.file_path,
+                index=False,
+                mode="a" if self._started else "w",
+                header=not self._started,
+            )
+        else:
+            pyarrow = import_pyarrow()
+            if self._schema is None:
+                self._schema = self._first_schema(pyarrow, chunk)
+            table = pyarrow.Table.from_pandas(
+                chunk, schema=self._schema, preserve_index=False
+            )
+            if self._writer is None:
+                if self.format == "parquet":
+                    self._writer = pyarrow.parquet.ParquetWriter(
+                        self.file_path, table.schema
+                    )
+                else:
+                    self._writer = pyarrow.ipc.new_file(
+                        str(self.file_path), table.schema
+                    )
+            self._writer.write_table(table)
+
+        self._started = True
+        self.rows += len(chunk)
+
+    def _first_schema(self, pyarrow, chunk: pd.DataFrame):
+        """
+        The types of the columns of the first chunk, replaced by the types
+        given to the writer.
+        """
+        schema = pyarrow.Schema.from_pandas(chunk, preserve_index=False)
+        if self._types is None:
+            return schema
+        for field in self._types:
+            i = schema.get_field_index(field.name)
+            if i >= 0:
+                schema = schema.set(i, field)
+        return schema
+
+    def close(self):
+        """
+        Finish writing the file.
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
@@ -0,0 +1,370 @@
+"""
+Process an append-only file of reports incrementally: each run only reads,
+preprocesses and searches the rows added since the previous run, and appends
+the results to the output file.
+
+The state of a feed is kept in a directory:
+    watermark.json      how far the input file was processed (rows, and bytes
+                        of a csv file), a hash of the last bytes read, the size
+                        of the output file, and a hash of the searches and
+                        preprocessing settings
+    seen.npy            the hashes of the reports seen so far, to drop
+                        duplicates of reports from earlier runs
+
+New rows of a csv file are read from the byte offset where the last run
+stopped, so a run costs the same whatever the size of the file. Only rows
+ending with a new line outside a quoted value are processed, so a row being
+written when a run starts is processed by the next run, even if it is a
+multi-line report. Parquet and Arrow files are read from the first
+new row, skipping earlier row groups.
+
+The output is written before the state, and an output file which is longer than
+recorded in the state (i.e. from an interrupted run) is truncated, so every row
+is written once.
+
+e.g. # The first run processes every report
+     run_incremental("feed.csv", "output.csv", "feed_state", searches)
+     # Later runs only process the new reports
+     run_incremental("feed.csv", "output.csv", "feed_state", searches)
+"""
+
+import hashlib
+import io
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from radex.compiler import SearchSet, compile_searches
+from radex.formats import TableWriter, file_format, iter_table_chunks
+from radex.pipeline import DuplicateFilter, PipelineStats, process_chunks
+from radex.store import preprocessing_settings
+
+# Increase when the state or the output of a run changes, so old states are not
+# used
+INCREMENTAL_VERSION = 1
+
+# Number of bytes before the watermark which are hashed, to check that the file
+# was only appended to since the last run
+_TAIL_BYTES = 4096
+
+# Number of bytes read at a time when looking for the end of the last row
+_SCAN_BYTES = 1 << 20
+
+_QUOTE = ord('"')
+_NEWLINE = ord("\n")
+
+_KEY_SIZE = 16
+
+
+@dataclass
+class Watermark:
+    """
+    How far an input file has been processed.
+    """
+
+    rows: int = 0
+    input_bytes: int = 0
+    tail: str = ""
+    output_bytes: int = 0
+    settings: str = ""
+
+
+class IncrementalState:
+    """
+    The watermark and the hashes of the reports seen so far, saved in a
+    directory.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.watermark = Watermark()
+        self.seen = set()
+
+        if (self.directory / "watermark.json").exists():
+            with open(
+                self.directory / "watermark.json", encoding="utf-8"
+            ) as rfile:
+                saved = json.load(rfile)
+            seen_missing = saved.pop("seen_missing")
+            self.watermark = Watermark(**saved)
+
+            keys = np.load(self.directory / "seen.npy")
+            self.seen = {key.tobytes() for key in keys}
+            if seen_missing:
+                self.seen.add(None)
+
+    def save(self):
+        """
+        Save the state, replacing the previous state only once it is completely
+        written.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        keys = [key for key in self.seen if key is not None]
+        keys = np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(
+            -1, _KEY_SIZE
+        )
+        with open(self.directory / "seen.tmp.npy", "wb") as wfile:
+            np.save(wfile, keys)
+
+        saved = {**asdict(self.watermark), "seen_missing": None in self.seen}
+        with open(
+            self.directory / "watermark.tmp.json", "w", encoding="utf-8"
+        ) as wfile:
+            json.dump(saved, wfile, indent=2)
+
+        os.replace(
+            self.directory / "seen.tmp.npy", self.directory / "seen.npy"
+        )
+        os.replace(
+            self.directory / "watermark.tmp.json",
+            self.directory / "watermark.json",
+        )
+
+
+def _hash_bytes(file_path: Union[str, Path], start: int, end: int) -> str:
+    with open(file_path, "rb") as rfile:
+        rfile.seek(start)
+        return hashlib.blake2b(
+            rfile.read(end - start), digest_size=16
+        ).hexdigest()
+
+
+def _complete_rows_end(file_path: Union[str, Path], start: int = 0) -> int:
+    """
+    Get the byte offset after the last complete row of a csv file, i.e. after
+    the last new line which is not inside a quoted value. The file is scanned
+    from start, which must be the end of a row, counting quotes: a new line
+    ends a row when an even number of quotes precede it, as an escaped quote
+    ('""') counts twice. Returns the size of the file if it is shorter than
+    start.
+    """
+    size = os.path.getsize(file_path)
+    if size <= start:
+        return size
+
+    end = start
+    quoted = 0
+    with open(file_path, "rb") as rfile:
+        rfile.seek(start)
+        position = start
+        while True:
+            block = np.frombuffer(rfile.read(_SCAN_BYTES), dtype=np.uint8)
+            if len(block) == 0:
+                return end
+            quotes = np.cumsum(block == _QUOTE) + quoted
+            row_ends = np.flatnonzero((block == _NEWLINE) & (quotes % 2 == 0))
+            if len(row_ends):
+                end = position + int(row_ends[-1]) + 1
+            quoted = int(quotes[-1])
+            position += len(block)
+
+
+class _BoundedReader(io.RawIOBase):
+    """
+    Read a binary file from its current position up to a fixed number of bytes.
+    """
+
+    def __init__(self, handle, size: int):
+        self.handle = handle
+        self.remaining = size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.handle.read(min(len(buffer), self.remaining))
+        buffer[: len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+
+def _read_csv_rows(
+    file_path: Union[str, Path],
+    start: int,
+    end: int,
+    chunksize: int,
+    column: str,
+    first_row: int,
+) -> Iterator[pd.DataFrame]:
+    """
+    Read the rows of a csv file between two byte offsets in chunks. The header
+    is read from the start of the file, unless the rows start there.
+    """
+    if start == 0:
+        names, header = None, "infer"
+    else:
+        names, header = pd.read_csv(file_path, nrows=0).columns, None
+
+    if end == start:
+        return
+
+    with open(file_path, "rb") as rfile:
+        rfile.seek(start)
+        stream = io.BufferedReader(_BoundedReader(rfile, end - start))
+        with pd.read_csv(
+            stream,
+            chunksize=chunksize,
+            header=header,
+            names=names,
+            dtype={column: str},
+        ) as reader:
+            for chunk in reader:
+                chunk.index += first_row
+                yield chunk
+
+
+def _count_rows(
+    chunks: Iterator[pd.DataFrame], counter: List[int]
+) -> Iterator[pd.DataFrame]:
+    for chunk in chunks:
+        counter[0] += len(chunk)
+        yield chunk
+
+
+def run_incremental(
+    input_path: Union[str, Path],
+    output_path: Union[str, Path],
+    state_path: Union[str, Path],
+    searches: Union[Dict, SearchSet],
+    column: str = "report",
+    chunksize: int = 10000,
+    workers: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    **kwargs,
+) -> PipelineStats:
+    """
+    Preprocess and search the rows added to a file since the last run,
+    appending the results to the output csv file. The first run processes the
+    whole file.
+
+    Args:
+        input_path (str, Path): The path to the append-only csv, Parquet or
+            Arrow file.
+        output_path (str, Path): The path to the output csv file.
+        state_path (str, Path): The directory of the state of the feed.
+        searches (dict, SearchSet): The searches, as for Radex.searches.
+        column (str, optional): The column of the reports. Defaults to
+            'report'.
+        chunksize (int, optional): The number of rows read at a time. Defaults
+            to 10000.
+        workers (int, optional): Number of worker processes, see run_pipeline.
+                                Defaults to None.
+        queue_size (int, optional): The maximum number of chunks read but not
+                                    yet written, when using workers. Defaults
+                                    to twice the workers.
+        **kwargs: Keyword arguments of clean_dataframe.
+            drop_duplicates (bool, optional): Whether to drop duplicates of
+                reports from this and all earlier runs. Defaults to False.
+
+    Raises:
+        ValueError: If the output is not a csv file, the searches or settings
+                    differ from earlier runs, or the input or output files were
+                    changed other than by appending rows
+
+    Returns:
+        PipelineStats: The counters of the run, including the number of rows
+            written
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+    if file_format(output_path) != "csv":
+        raise ValueError("Incremental output must be a csv file")
+
+    if not isinstance(searches, SearchSet):
+        searches = compile_searches(searches)
+
+    drop_duplicates = kwargs.pop("drop_duplicates", False)
+    settings = {
+        "version": INCREMENTAL_VERSION,
+        "column": column,
+        "searches": repr(list(searches.plans.items())),
+        "preprocessing": preprocessing_settings(
+            drop_duplicates,
+            kwargs.get("drop_nulls", False),
+            kwargs.get("drop_negatives", None),
+            kwargs.get("drop_stopwords", None),
+        ),
+    }
+    settings = hashlib.blake2b(
+        json.dumps(settings, sort_keys=True).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+    state = IncrementalState(state_path)
+    watermark = state.watermark
+    if watermark.settings and watermark.settings != settings:
+        raise ValueError(
+            "The searches or preprocessing settings have changed since the "
+            "last run. Use a new output file and state directory."
+        )
+
+    # Drop the rows written by an interrupted run
+    output_path = Path(output_path)
+    output_bytes = output_path.stat().st_size if output_path.exists() else 0
+    if output_bytes < watermark.output_bytes:
+        raise ValueError(f"{output_path} is shorter than after the last run")
+    if output_bytes > watermark.output_bytes:
+        with open(output_path, "r+b") as wfile:
+            wfile.truncate(watermark.output_bytes)
+
+    # Read the new rows
+    if file_format(input_path) == "csv":
+        start = watermark.input_bytes
+        end = _complete_rows_end(input_path, start)
+        if start > 0 and (
+            end < start
+            or watermark.tail
+            != _hash_bytes(input_path, max(0, start - _TAIL_BYTES), start)
+        ):
+            raise ValueError(
+                f"{input_path} has changed other than by appending rows"
+            )
+        chunks = _read_csv_rows(
+            input_path,
+            watermark.input_bytes,
+            end,
+            chunksize,
+            column,
+            watermark.rows,
+        )
+    else:
+        end = 0
+        chunks = iter_table_chunks(
+            input_path, chunksize, text_column=column, start=watermark.rows
+        )
+
+    duplicates = False
+    if drop_duplicates:
+        duplicates = DuplicateFilter(column)
+        duplicates.seen = state.seen
+
+    rows_read = [0]
+    stats = process_chunks(
+        _count_rows(chunks, rows_read),
+        TableWriter(output_path, append=watermark.rows > 0),
+        searches,
+        column=column,
+        workers=workers,
+        queue_size=queue_size,
+        drop_duplicates=duplicates,
+        **kwargs,
+    )
+
+    state.watermark = Watermark(
+        rows=watermark.rows + rows_read[0],
+        input_bytes=end,
+        tail=(
+            _hash_bytes(input_path, max(0, end - _TAIL_BYTES), end)
+            if end
+            else ""
+        ),
+        output_bytes=output_path.stat().st_size if output_path.exists() else 0,
+        settings=settings,
+    )
+    state.save()
+    return stats
@@ -0,0 +1,242 @@
+"""
+In-memory inverted index over a column of reports.
+
+Each report is tokenised once into words, and the index stores a posting list
+for every word (report id -> token positions) plus a sorted vocabulary.
+Compiled searches are then answered with set operations on the posting lists
+instead of scanning text: & -> intersection, | -> union, ¬ -> complement.
+Wildcard terms are resolved against the vocabulary, and proximity searches by
+comparing the token positions of both words.
+"""
+
+import re
+from bisect import bisect_left
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+from radex.compiler import (
+    AndNode,
+    Node,
+    NotNode,
+    OrNode,
+    TermNode,
+    compile_expression,
+)
+from radex.document import Document
+from radex.expression import Expression
+from radex.radexpressions import proximity_match
+
+_WORD = re.compile(r"\w+")
+
+# Terms made of a single word, optionally with '*' wildcards, match whole
+# tokens
+_SINGLE_TOKEN_TERM = re.compile(r"[\w*]+")
+
+# Gap between the token positions of consecutive sentences of a report
+SENTENCE_GAP = 1 << 32
+
+
+class ReportIndex:
+    """
+    Inverted index over a column of reports, e.g. the cleaned 'report' column
+    of Radex.preprocessed_data.
+
+    Reports are identified by their position in the column. Token positions are
+    numbered within each sentence (sentences being split on '.'), and offset by
+    SENTENCE_GAP for each sentence so tokens of different sentences are never
+    adjacent.
+
+    e.g. index = ReportIndex(radex.preprocessed_data["report"])
+         index.search("thyr* & ¬nodul*")
+         => pd.Series of bool with the index of the column
+    """
+
+    def __init__(self, reports: pd.Series):
+        self.index = reports.index
+        self.reports = [str(report) for report in reports]
+        self.postings: Dict[str, Dict[int, List[int]]] = {}
+
+        for report_id, report in enumerate(self.reports):
+            for sentence_no, sentence in enumerate(Document(report).sentences):
+                offset = sentence_no * SENTENCE_GAP
+                for token_no, token in enumerate(_WORD.findall(sentence)):
+                    positions = self.postings.setdefault(token, {})
+                    positions.setdefault(report_id, []).append(
+                        offset + token_no
+                    )
+
+        self.vocabulary = sorted(self.postings)
+        self._all_reports = np.arange(len(self.reports))
+        self._term_cache: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.reports)
+
+    def tokens_matching(self, term: TermNode) -> List[str]:
+        """
+        Find the tokens of the vocabulary matched by a single word term e.g.
+        'nodul*'.
+
+        Args:
+            term (TermNode): The compiled term
+
+        Returns:
+            list: The matching tokens
+        """
+        if term.kind == "literal":
+            return (
+                [term.expression] if term.expression in self.postings else []
+            )
+
+        # Only the tokens starting with the literal prefix of the term can
+        # match
+        prefix = re.split(r"\*", term.expression, maxsplit=1)[0]
+        start = bisect_left(self.vocabulary, prefix)
+        tokens = []
+        for token in self.vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            if term.pattern.fullmatch(token):
+                tokens.append(token)
+        return tokens
+
+    def reports_containing(self, tokens: List[str]) -> np.ndarray:
+        """
+        Get the ids of the reports containing any of the tokens.
+
+        Args:
+            tokens (list): The tokens
+
+        Returns:
+            np.ndarray: Sorted report ids
+        """
+        report_ids = set()
+        for token in tokens:
+            report_ids.update(self.postings[token])
+        return np.array(sorted(report_ids), dtype=np.int64)
+
+    def _search_term(self, term: TermNode) -> np.ndarray:
+        """
+        Get the ids of the reports matched by a term.
+        """
+        if term.regex in self._term_cache:
+            return self._term_cache[term.regex]
+
+        if term.kind != "proximity" and _SINGLE_TOKEN_TERM.fullmatch(
+            term.expression
+        ):
+            report_ids = self.reports_containing(self.tokens_matching(term))
+        elif term.proximity is not None:
+            report_ids = self._search_proximity(term)
+        else:
+            # Narrow down to the reports with a token containing the longest
+            # literal fragment of the term, then verify each with the regex.
+            if term.literals:
+                tokens = [
+                    token
+                    for token in self.vocabulary
+                    if term.literals[0] in token
+                ]
+                candidates = self.reports_containing(tokens)
+            else:
+                candidates = self._all_reports
+            report_ids = np.array(
+                [i for i in candidates if term.search(self.reports[i])],
+                dtype=np.int64,
+            )
+
+        self._term_cache[term.regex] = report_ids
+        return report_ids
+
+    def _search_proximity(self, term: TermNode) -> np.ndarray:
+        """
+        Get the ids of the reports matched by a proximity search between two
+        single words, comparing the token positions of both words in each
+        report containing them.
+        """
+        word1, word2, max_distance, direction = term.proximity
+        tokens1 = self.tokens_matching(word1)
+        tokens2 = self.tokens_matching(word2)
+        candidates = np.intersect1d(
+            self.reports_containing(tokens1), self.reports_containing(tokens2)
+        )
+
+        report_ids = []
+        for report_id in candidates:
+            positions1 = self.positions(tokens1, report_id)
+            positions2 = self.positions(tokens2, report_id)
+            if proximity_match(
+                positions1, positions2, max_distance, direction
+            ):
+                report_ids.append(report_id)
+        return np.array(report_ids, dtype=np.int64)
+
+    def positions(self, tokens: List[str], report_id: int) -> List[int]:
+        """
+        Get the sorted positions of any of the tokens in a report.
+
+        Args:
+            tokens (list): The tokens
+            report_id (int): The id of the report
+
+        Returns:
+            list: Sorted token positions
+        """
+        positions = []
+        for token in tokens:
+            positions.extend(self.postings[token].get(report_id, ()))
+        return sorted(positions)
+
+    def _search_node(self, node: Node) -> np.ndarray:
+        """
+        Get the ids of the reports matched by a compiled expression.
+        """
+        if isinstance(node, TermNode):
+            return self._search_term(node)
+
+        if isinstance(node, NotNode):
+            return np.setdiff1d(
+                self._all_reports, self._search_node(node.operand)
+            )
+
+        if isinstance(node, AndNode):
+            report_ids = self._search_node(node.operands[0])
+            for operand in node.operands[1:]:
+                if len(report_ids) == 0:
+                    break
+                report_ids = np.intersect1d(
+                    report_ids, self._search_node(operand)
+                )
+            return report_ids
+
+        if isinstance(node, OrNode):
+            report_ids = self._search_node(node.operands[0])
+            for operand in node.operands[1:]:
+                report_ids = np.union1d(report_ids, self._search_node(operand))
+            return report_ids
+
+        raise ValueError(f"Cannot search the index for {node}")
+
+    def search(self, expression: Union[str, list, Node]) -> pd.Series:
+        """
+        Search the indexed reports.
+
+        Args:
+            expression (str, list, Node): A search string, the nested list
+                                        returned by Expression.parse_string or
+                                        a compiled expression.
+
+        Returns:
+            pd.Series: Boolean result for each report, with the index of the
+                indexed column
+        """
+        if isinstance(expression, str):
+            expression = Expression().parse_string(expression)
+        if not isinstance(expression, Node):
+            expression = compile_expression(expression)
+
+        result = np.zeros(len(self.reports), dtype=bool)
+        result[self._search_node(expression)] = True
+        return pd.Series(result, index=self.index)
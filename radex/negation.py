@@ -0,0 +1,297 @@
+"""
+Tag the negex triggers of a sentence in one pass.
+
+negex.negTagger substitutes every trigger regex of the rule set into the
+sentence in turn, so tagging a sentence costs one regex pass per rule (283
+rules for the default triggers), and the tagger is constructed again for every
+sentence. NegationRules instead compiles the triggers once into a trie of their
+words. The words of a sentence are matched against the trie in one pass, and
+the matches are applied in the order of the rules, as negTagger would apply
+them:
+
+- a trigger only matches words which were not already tagged by an earlier
+  rule, as a substitution joins the words of its trigger with '_' and encloses
+  them in its tag e.g. '[PREN]no_evidence[PREN]'
+- a single word which was already tagged is tagged again by a later rule with
+  the same word, inside the earlier tags
+
+The scopes of the PREN and POST triggers are then found from the tagged
+sentence exactly as negTagger finds them.
+
+Triggers which are not plain words e.g. 'r/o', or which contain the words of a
+tag e.g. 'post', can match across the tags of earlier substitutions. Sentences
+which such a trigger can match, and sentences with non ASCII characters, whose
+case insensitive matching goes beyond lower(), are tagged with negTagger.
+
+The rules also hold a SentenceCache of the sentences already cleaned with them,
+as the same sentences recur across many reports.
+"""
+
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from negex.negexPython.negex import negTagger, sortRules
+from radex.cache import SENTENCE_CACHE_SIZE, SentenceCache
+
+# The words and the punctuation of a sentence, as the regex \b sees them
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+_WORD = re.compile(r"\w+")
+
+# Trigger words which can be matched against the lowercase words of a sentence
+_PLAIN_WORD = re.compile(r"[a-z0-9]+")
+
+# Joins the words of a tagged trigger, see negTagger
+_FILLER = "_"
+
+# Tags which open (and close the scope of) a negated phrase, see negTagger
+_PREN = "[PREN]"
+_POST = "[POST]"
+_CONJ = "[CONJ]"
+_PSEU = "[PSEU]"
+_PREP = "[PREP]"
+_POSP = "[POSP]"
+
+
+class NegationRules:
+    """
+    A sorted negex rule set, compiled into a trie of the words of each trigger.
+
+    e.g. triggers = open("data/negex_triggers.txt").readlines()
+         rules = NegationRules(sortRules(triggers))
+         rules.tag("no evidence of thyroid nodules")
+         => ("[PREN]no evidence[PREN] of thyroid nodules",
+             ["of thyroid nodules"])
+    """
+
+    def __init__(self, rules: List, cache_size: int = SENTENCE_CACHE_SIZE):
+        self.rules = list(rules)
+
+        # Sentences with their negated phrases removed, see
+        # remove_negated_phrases
+        self.sentence_cache = SentenceCache(cache_size)
+
+        tag_words = {
+            word
+            for rule in self.rules
+            for word in _WORD.findall(rule[2].lower())
+        }
+
+        # Each node maps the next word of a trigger to the following node, and
+        # None to the indices of the rules whose trigger ends at the node
+        self._trie: Dict = {}
+        self._replacements: List[str] = []
+        irregular = []
+        for i, rule in enumerate(self.rules):
+            trigger = rule[0].strip()
+            tag = rule[2].strip()
+            self._replacements.append(
+                tag + re.sub(r"\s+", _FILLER, trigger) + tag
+            )
+
+            words = trigger.lower().split()
+            if tag_words.intersection(words):
+                # Can match the tags substituted into any sentence
+                irregular.append(re.compile(""))
+                continue
+            if not words or not all(
+                _PLAIN_WORD.fullmatch(word) for word in words
+            ):
+                irregular.append(rule[3])
+                continue
+
+            node = self._trie
+            for word in words:
+                node = node.setdefault(word, {})
+            node.setdefault(None, []).append(i)
+
+        # Matches any sentence which an irregular trigger can match, as these
+        # sentences are tagged with negTagger
+        self._irregular: Optional[re.Pattern] = (
+            re.compile(
+                "|".join(pattern.pattern for pattern in irregular), re.I
+            )
+            if irregular
+            else None
+        )
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def tag(self, sentence: str) -> Tuple[str, List[str]]:
+        """
+        Tag the negex triggers of a sentence and find the negated phrases.
+
+        Args:
+            sentence (str): The sentence to tag
+
+        Returns:
+            tuple: The tagged sentence and the negated phrases, as returned by
+                negTagger.getNegTaggedSentence and negTagger.getScopes
+        """
+        if not sentence.isascii() or (
+            self._irregular is not None
+            and self._irregular.search(sentence) is not None
+        ):
+            tagger = negTagger(
+                sentence=sentence, phrases=[], rules=self.rules, negP=False
+            )
+            return tagger.getNegTaggedSentence(), tagger.getScopes()
+
+        tokens = self._tag_tokens(sentence)
+        return (
+            " ".join(tokens).replace(_FILLER, " "),
+            [
+                " ".join(
+                    token
+                    for token in scope.split()
+                    if token[:6] not in (_PREP, _POSP)
+                )
+                for scope in _scopes(tokens)
+            ],
+        )
+
+    def _tag_tokens(self, sentence: str) -> List[str]:
+        """
+        Substitute the tagged triggers into a sentence, see tag, and split it
+        into tokens as negTagger does.
+        """
+        matches = list(_TOKEN.finditer(sentence))
+        words = [match.group().lower() for match in matches]
+
+        # The occurrences of every trigger as (rule, first token, end token)
+        found = []
+        for start in range(len(words)):
+            node = self._trie
+            for end in range(start, len(words)):
+                node = node.get(words[end])
+                if node is None:
+                    break
+                for i in node.get(None, ()):
+                    found.append((i, start, end + 1))
+        found.sort()
+
+        # Apply the occurrences in the order of the rules, and left to right
+        # for each rule as re.sub does. Every accepted occurrence holds the
+        # rules which tagged it, from the outermost tags inwards.
+        accepted: Dict[int, Tuple[int, List[int]]] = {}
+        tagged = [False] * len(words)
+        for i, start, end in found:
+            if not any(tagged[start:end]):
+                accepted[start] = (end, [i])
+                tagged[start:end] = [True] * (end - start)
+            elif end - start == 1 and accepted.get(start, (0,))[0] == end:
+                accepted[start][1].append(i)
+
+        pieces = []
+        position = 0
+        for start in sorted(accepted):
+            end, rules = accepted[start]
+            before = matches[start].start()
+            pieces.append(sentence[position:before])
+            text = self._replacements[rules[-1]]
+            for i in reversed(rules[:-1]):
+                tag = self.rules[i][2].strip()
+                text = tag + " " + text + " " + tag
+            pieces.append(" " + text + " ")
+            position = matches[end - 1].end()
+        pieces.append(sentence[position:])
+
+        return "".join(pieces).split()
+
+
+def _scopes(tokens: List[str]) -> List[str]:
+    """
+    Find the phrases negated by the PREN and POST triggers of a tagged
+    sentence, as negTagger does: a PREN trigger negates the tokens up to the
+    next trigger, and a POST trigger the tokens back to the previous trigger.
+    """
+    scopes = []
+    overlap = False
+    pren = False
+    portion = ""
+    for i, token in enumerate(tokens):
+        tag = token[:6]
+        if tag == _PREN:
+            pren = True
+            overlap = False
+        if tag in (_CONJ, _PSEU, _POST, _PREP, _POSP):
+            overlap = True
+        if i + 1 < len(tokens) and tokens[i + 1][:6] == _PREN:
+            overlap = True
+            if portion.strip():
+                scopes.append(portion.strip())
+            portion = ""
+        if pren and not overlap and tag != _PREN:
+            portion = portion + " " + token
+    if portion.strip():
+        scopes.append(portion.strip())
+
+    portion = ""
+    post = False
+    tokens = tokens[::-1]
+    for i, token in enumerate(tokens):
+        tag = token[:6]
+        if tag == _POST:
+            post = True
+            overlap = False
+        if tag in (_CONJ, _PSEU, _PREN, _PREP, _POSP):
+            overlap = True
+        if i + 1 < len(tokens) and tokens[i + 1][:6] == _POST:
+            overlap = True
+            if portion.strip():
+                scopes.append(portion.strip())
+            portion = ""
+        if post and not overlap and tag != _POST:
+            portion = token + " " + portion
+    if portion.strip():
+        scopes.append(portion.strip())
+
+    return scopes
+
+
+def as_negation_rules(
+    rules: Union[List, NegationRules], cache_size: Optional[int] = None
+) -> NegationRules:
+    """
+    Compile a list of sorted negex rules, unless already compiled with a
+    sentence cache of the requested size.
+
+    Args:
+        rules (list, NegationRules): Rules sorted by negex.sortRules
+        cache_size (int, optional): The number of sentences in the sentence
+            cache of the rules. Defaults to None (the size of the cache of
+            compiled rules, or 100000).
+
+    Returns:
+        NegationRules: The compiled rules
+    """
+    if isinstance(rules, NegationRules):
+        if cache_size is None or cache_size == rules.sentence_cache.maxsize:
+            return rules
+        rules = rules.rules
+    if cache_size is None:
+        cache_size = SENTENCE_CACHE_SIZE
+    return NegationRules(rules, cache_size)
+
+
+@lru_cache(maxsize=None)
+def load_negation_rules(
+    file_path: Union[str, Path], cache_size: int = SENTENCE_CACHE_SIZE
+) -> NegationRules:
+    """
+    Read, sort and compile a negex triggers file. The file is only read once
+    for each size of the sentence cache.
+
+    Args:
+        file_path (str, Path): The triggers file e.g. data/negex_triggers.txt
+        cache_size (int, optional): The number of sentences in the sentence
+            cache of the rules. Defaults to 100000.
+
+    Returns:
+        NegationRules: The compiled rules
+    """
+    with open(file_path, encoding="utf-8") as rfile:
+        return NegationRules(sortRules(rfile.readlines()), cache_size)
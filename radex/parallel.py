@@ -0,0 +1,122 @@
+"""
+Run CPU-bound work over a column of reports in a pool of worker processes.
+
+The column is split into contiguous chunks of roughly equal total length in
+characters (report lengths vary widely, so equal row counts would leave some
+workers idle), each chunk is processed in a worker process, and the results are
+returned in the original order.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Number of chunks per worker, so a slow chunk does not hold up the whole pool
+CHUNKS_PER_WORKER = 4
+
+
+def balanced_chunks(
+    lengths: np.ndarray, n_chunks: int
+) -> List[Tuple[int, int]]:
+    """
+    Split a sequence of rows into contiguous chunks with roughly equal total
+    length.
+    e.g. lengths=[10, 10, 100, 10, 10, 60], n_chunks=2 => [(0, 3), (3, 6)]
+
+    Args:
+        lengths (np.ndarray): The length of each row e.g. number of characters
+        n_chunks (int): The number of chunks
+
+    Returns:
+        list: The start/ end positions of each non-empty chunk
+    """
+    if len(lengths) == 0:
+        return []
+
+    # Total length before each row boundary, and the ideal totals at the chunk
+    # boundaries
+    cumulative = np.concatenate([[0], np.cumsum(lengths)])
+    targets = cumulative[-1] * np.arange(1, n_chunks) / n_chunks
+
+    # Place each boundary on whichever side of its target row is closest to the
+    # target
+    after = np.searchsorted(cumulative, targets, side="left")
+    before = np.maximum(after - 1, 0)
+    closer = cumulative[after] - targets < targets - cumulative[before]
+    boundaries = np.where(closer, after, before)
+    boundaries = np.unique(np.concatenate([[0], boundaries, [len(lengths)]]))
+
+    return [
+        (int(start), int(end))
+        for start, end in zip(boundaries[:-1], boundaries[1:])
+        if end > start
+    ]
+
+
+def map_chunks(
+    func: Callable[..., Any],
+    candidates: pd.Series,
+    workers: Optional[int] = None,
+    initializer: Optional[Callable[..., None]] = None,
+    initargs: Tuple = (),
+    **kwargs,
+) -> List[Any]:
+    """
+    Apply a function to chunks of a column of strings, balanced by total
+    characters. The functions must be defined at the top level of a module so
+    they can be sent to the worker processes.
+
+    Args:
+        func (callable): Function called as func(chunk, **kwargs) with a
+            chunk of the candidates
+        candidates (pd.Series, DocumentColumn): The column of strings, missing
+            values count as empty strings, or of reports with their sentences
+            (see radex.document.DocumentColumn), balanced by length in bytes
+        workers (int, optional): Number of worker processes. If None or 1, the
+                                function is applied to the whole column in the
+                                current process. Defaults to None.
+        initializer (callable, optional): Function called once as
+                                initializer(*initargs) in each worker process
+                                (or in the current process) before any chunk is
+                                processed, e.g. to load large settings once.
+                                Defaults to None.
+        initargs (tuple, optional): Arguments passed to the initializer.
+                                Defaults to ().
+        **kwargs: Additional keyword arguments passed to func.
+
+    Raises:
+        ValueError: If workers is less than 1
+
+    Returns:
+        list: The result of each chunk, in the order of the column
+    """
+    if workers is not None and workers < 1:
+        raise ValueError("workers must be at least 1")
+
+    if workers is None or workers == 1 or len(candidates) <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [func(candidates, **kwargs)]
+
+    if isinstance(candidates, pd.Series):
+        lengths = np.fromiter(
+            (len(x) if isinstance(x, str) else 0 for x in candidates),
+            dtype=np.int64,
+            count=len(candidates),
+        )
+        rows = candidates.iloc
+    else:
+        lengths = candidates.lengths()
+        rows = candidates
+    chunks = [
+        rows[start:end]
+        for start, end in balanced_chunks(lengths, workers * CHUNKS_PER_WORKER)
+    ]
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=initializer, initargs=initargs
+    ) as executor:
+        futures = [executor.submit(func, chunk, **kwargs) for chunk in chunks]
+        return [future.result() for future in futures]
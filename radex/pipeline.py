@@ -0,0 +1,642 @@
+"""
+Stream a file of reports through preprocessing and searching in chunks.
+
+The input file (csv, Parquet or Arrow, see radex.formats) is read chunksize
+rows at a time, and each chunk is preprocessed, searched and appended to the
+output file before the next chunk is read, so memory use depends on the chunk
+size rather than the size of the file. Duplicate reports are dropped across
+chunks by keeping a hash of every report seen so far.
+
+With workers, the stages overlap: a reader thread reads chunks ahead and
+submits them to a pool of worker processes which preprocess and search them,
+and a writer thread writes the results in the original order. The reader blocks
+once queue_size chunks are waiting to be written, which bounds memory use.
+Counters for each stage (PipelineStats) show which stage is the bottleneck.
+
+The output is the same as reading the whole file with Radex.read_data, then
+running Radex.preprocess_data, Radex.run_searches and Radex.save_output, except
+that pd.read_csv infers the dtype of each column per chunk (e.g. a column of
+integers with missing values is only read as floats in the chunks with missing
+values). A Parquet or Arrow output file keeps the types of the input file in
+every chunk, so the columns of a csv input file are written as strings.
+"""
+
+import hashlib
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import pandas as pd
+
+from radex.compiler import SearchSet, compile_searches
+from radex.dfsearch import search_dataframe_multiple
+from radex.formats import (
+    TableWriter,
+    file_format,
+    iter_table_chunks,
+    read_schema,
+)
+from radex.preprocessing import clean_dataframe
+
+
+def read_chunks(
+    file_path: Union[str, Path],
+    chunksize: int,
+    column: Optional[str] = None,
+    schema=None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Read a csv, Parquet or Arrow file in chunks of rows, see
+    formats.iter_table_chunks. The index of each chunk continues from the
+    previous chunk, as if the whole file had been read.
+
+    Args:
+        file_path (str, Path): The path to the file.
+        chunksize (int): The number of rows per chunk.
+        column (str, optional): A text column, read as strings even in chunks
+                                where every value is missing. Defaults to None.
+        schema (pyarrow.Schema, optional): The types to read the columns of a
+                                          csv file as. Defaults to None.
+
+    Yields:
+        pd.DataFrame: The chunks of the file
+    """
+    yield from iter_table_chunks(
+        file_path, chunksize, text_column=column, schema=schema
+    )
+
+
+def open_files(
+    input_path: Union[str, Path],
+    output_path: Union[str, Path],
+    chunksize: int,
+    column: Optional[str] = None,
+) -> Tuple[Iterator[pd.DataFrame], TableWriter]:
+    """
+    Open the input file in chunks and a writer of the output file. A Parquet or
+    Arrow output file takes the types of its columns from the input file (see
+    formats.read_schema), so a column which is empty in the first chunk has the
+    same type as in the following chunks. The chunks of a csv input file are
+    read with the types of its first chunk, so each column keeps one type.
+
+    Args:
+        input_path (str, Path): The path to the input file.
+        output_path (str, Path): The path to the output file.
+        chunksize (int): The number of rows per chunk.
+        column (str, optional): The text column. Defaults to None.
+
+    Returns:
+        tuple: The chunks of the input file, and the writer
+    """
+    if file_format(output_path) == "csv":
+        chunks = read_chunks(input_path, chunksize, column)
+        return chunks, TableWriter(output_path)
+    schema = read_schema(input_path, chunksize=chunksize, text_column=column)
+    chunks = read_chunks(
+        input_path,
+        chunksize,
+        column,
+        schema=schema if file_format(input_path) == "csv" else None,
+    )
+    return chunks, TableWriter(output_path, schema=schema)
+
+
+class DuplicateFilter:
+    """
+    Drop rows whose text was already seen in this or an earlier chunk, keeping
+    the first, as DataFrame.drop_duplicates does for a whole dataframe. Only a
+    16 byte hash of each distinct text is kept.
+    """
+
+    def __init__(self, column: str):
+        self.column = column
+        self.seen: Set[Optional[bytes]] = set()
+
+    @staticmethod
+    def key(value) -> Optional[bytes]:
+        """
+        Hash a value of the text column. Missing values are all equal.
+
+        Args:
+            value: The value to hash
+
+        Returns:
+            bytes: The hash, or None for a missing value
+        """
+        if not isinstance(value, str):
+            if pd.isna(value):
+                return None
+            value = repr(value)
+        return hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+
+    def filter(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Drop the rows of a chunk whose text was already seen.
+
+        Args:
+            chunk (pd.DataFrame): The next chunk of the file
+
+        Returns:
+            pd.DataFrame: The chunk without duplicates
+        """
+        keep = []
+        for value in chunk[self.column]:
+            key = self.key(value)
+            keep.append(key not in self.seen)
+            self.seen.add(key)
+        return chunk[keep]
+
+
+@dataclass
+class StageStats:
+    """
+    Counters for one stage of the pipeline.
+
+    busy is the time spent doing the work of the stage, and waiting the time
+    spent blocked on the queue: for the reader, waiting for space in the
+    queue; for the writer, waiting for the next chunk to be processed. The
+    busy time of the compute stage is summed over the worker processes.
+    """
+
+    chunks: int = 0
+    rows: int = 0
+    busy: float = 0.0
+    waiting: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """
+        Rows per second of busy time.
+
+        Returns:
+            float: The throughput of the stage
+        """
+        return self.rows / self.busy if self.busy > 0 else 0.0
+
+
+@dataclass
+class PipelineStats:
+    """
+    Counters for each stage of a pipeline run, and the depth of the queue of
+    chunks between the reader and the writer, sampled each time a chunk is
+    queued.
+    """
+
+    read: StageStats = field(default_factory=StageStats)
+    compute: StageStats = field(default_factory=StageStats)
+    write: StageStats = field(default_factory=StageStats)
+    queue_depths: List[int] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def rows(self) -> int:
+        """
+        The number of rows written.
+
+        Returns:
+            int: The number of rows written
+        """
+        return self.write.rows
+
+    @property
+    def max_queue_depth(self) -> int:
+        """
+        The largest number of chunks waiting to be written.
+
+        Returns:
+            int: The maximum queue depth
+        """
+        return max(self.queue_depths, default=0)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Summarise the counters of each stage in a dataframe.
+
+        Returns:
+            pd.DataFrame: One row per stage
+        """
+        return pd.DataFrame(
+            {
+                name: {
+                    "chunks": stage.chunks,
+                    "rows": stage.rows,
+                    "busy": stage.busy,
+                    "waiting": stage.waiting,
+                    "throughput": stage.throughput,
+                }
+                for name, stage in [
+                    ("read", self.read),
+                    ("compute", self.compute),
+                    ("write", self.write),
+                ]
+            }
+        ).T
+
+
+def process_chunk(
+    chunk: pd.DataFrame,
+    column: str,
+    searches: SearchSet,
+    **kwargs,
+) -> pd.DataFrame:
+    """
+    Preprocess and search a chunk of reports.
+
+    Args:
+        chunk (pd.DataFrame): The chunk of reports, without duplicates.
+        column (str): The column of the reports.
+        searches (SearchSet): The compiled searches.
+        **kwargs: Keyword arguments of clean_dataframe e.g. drop_negatives.
+            deduplicate (bool, optional): Clean and search each distinct text
+                of the chunk once. Defaults to False.
+
+    Returns:
+        pd.DataFrame: The preprocessed chunk with a column for each search
+    """
+    chunk = clean_dataframe(chunk, column, **kwargs)
+    return search_dataframe_multiple(
+        chunk,
+        column=column,
+        searches=searches,
+        deduplicate=kwargs.get("deduplicate", False),
+    )
+
+
+# Settings of the process_chunk calls in a worker process, set once by
+# _init_pipeline_worker
+_worker_settings = {}
+
+
+def _init_pipeline_worker(column: str, searches: SearchSet, kwargs: dict):
+    """
+    Store the column, compiled searches and preprocessing settings in a worker
+    process.
+    """
+    _worker_settings.update(column=column, searches=searches, kwargs=kwargs)
+
+
+def _process_chunk_timed(chunk: pd.DataFrame) -> Tuple[pd.DataFrame, float]:
+    """
+    Process a chunk in a worker process, returning the result and the time
+    taken.
+    """
+    start = time.perf_counter()
+    result = process_chunk(
+        chunk,
+        _worker_settings["column"],
+        _worker_settings["searches"],
+        **_worker_settings["kwargs"],
+    )
+    return result, time.perf_counter() - start
+
+
+class PipelineRunner:
+    """
+    Run the read, compute and write stages of the pipeline concurrently: a
+    reader thread submits chunks to a pool of worker processes, and a writer
+    thread writes the processed chunks in order. The queue between them holds
+    at most queue_size chunks, so the reader waits when the workers or the
+    writer fall behind.
+
+    e.g. runner = PipelineRunner(
+             "report", compile_searches(searches), workers=8
+         )
+         runner.run("reports.csv", "output.csv", chunksize=10000)
+         runner.stats.summary()
+    """
+
+    def __init__(
+        self,
+        column: str,
+        searches: SearchSet,
+        workers: int,
+        queue_size: Optional[int] = None,
+        drop_duplicates: Union[bool, DuplicateFilter] = False,
+        **kwargs,
+    ):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        self.column = column
+        self.searches = searches
+        self.workers = workers
+        self.queue_size = queue_size or 2 * workers
+        self.drop_duplicates = drop_duplicates
+        self.kwargs = kwargs
+        self.stats = PipelineStats()
+
+    def run(
+        self,
+        input_path: Union[str, Path],
+        output_path: Union[str, Path],
+        chunksize: int = 10000,
+    ) -> PipelineStats:
+        """
+        Process a file, see run_pipeline.
+
+        Args:
+            input_path (str, Path): The path to the input csv, Parquet or Arrow
+                file.
+            output_path (str, Path): The path to the output csv, Parquet or
+                Arrow file.
+            chunksize (int, optional): The number of rows read at a time.
+                Defaults to 10000.
+
+        Returns:
+            PipelineStats: The counters of the run
+        """
+        return self.run_chunks(
+            *open_files(input_path, output_path, chunksize, self.column)
+        )
+
+    def run_chunks(
+        self, chunks: Iterator[pd.DataFrame], table_writer: TableWriter
+    ) -> PipelineStats:
+        """
+        Process chunks of reports from any source, writing the results with a
+        TableWriter. The writer is closed at the end of the run.
+
+        Args:
+            chunks (iterator): The chunks of reports
+            table_writer (TableWriter): The writer of the output file
+
+        Returns:
+            PipelineStats: The counters of the run
+        """
+        self.stats = PipelineStats()
+        chunks = iter(chunks)
+        pending: "queue.Queue[Optional[Future]]" = queue.Queue(
+            maxsize=self.queue_size
+        )
+        stop = threading.Event()
+        errors: List[BaseException] = []
+        start = time.perf_counter()
+
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_pipeline_worker,
+            initargs=(self.column, self.searches, self.kwargs),
+        )
+        reader = threading.Thread(
+            target=self._read, args=(chunks, executor, pending, stop, errors)
+        )
+        writer = threading.Thread(
+            target=self._write, args=(table_writer, pending, stop, errors)
+        )
+        try:
+            reader.start()
+            writer.start()
+            reader.join()
+            writer.join()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            table_writer.close()
+
+        self.stats.seconds = time.perf_counter() - start
+        if errors:
+            raise errors[0]
+        return self.stats
+
+    def _put(
+        self,
+        pending: queue.Queue,
+        item: Optional[Future],
+        stop: threading.Event,
+    ):
+        """
+        Queue an item, waiting for space unless the pipeline is stopped.
+        """
+        start = time.perf_counter()
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.stats.read.waiting += time.perf_counter() - start
+
+    def _read(
+        self,
+        chunks: Iterator[pd.DataFrame],
+        executor: ProcessPoolExecutor,
+        pending: queue.Queue,
+        stop: threading.Event,
+        errors: List[BaseException],
+    ):
+        """
+        Reader thread: read and deduplicate chunks, and submit them to the
+            workers.
+        """
+        stats = self.stats.read
+        duplicates = _duplicate_filter(self.drop_duplicates, self.column)
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                if duplicates is not None:
+                    chunk = duplicates.filter(chunk)
+                future = executor.submit(_process_chunk_timed, chunk)
+                stats.busy += time.perf_counter() - start
+                stats.chunks += 1
+                stats.rows += len(chunk)
+
+                self._put(pending, future, stop)
+                self.stats.queue_depths.append(pending.qsize())
+        except BaseException as error:  # pylint: disable=broad-except
+            errors.append(error)
+            stop.set()
+        finally:
+            # always tell the writer to finish
+            self._put(pending, None, threading.Event())
+
+    def _write(
+        self,
+        writer: TableWriter,
+        pending: queue.Queue,
+        stop: threading.Event,
+        errors: List[BaseException],
+    ):
+        """
+        Writer thread: write the processed chunks in the order they were read.
+        """
+        stats = self.stats.write
+        while True:
+            start = time.perf_counter()
+            future = pending.get()
+            if future is None:
+                break
+            if stop.is_set():
+                continue  # drain the queue without writing
+            try:
+                result, seconds = future.result()
+                stats.waiting += time.perf_counter() - start
+                self.stats.compute.busy += seconds
+                self.stats.compute.chunks += 1
+                self.stats.compute.rows += len(result)
+
+                start = time.perf_counter()
+                writer.write(result)
+                stats.busy += time.perf_counter() - start
+                stats.chunks += 1
+                stats.rows += len(result)
+            except BaseException as error:  # pylint: disable=broad-except
+                errors.append(error)
+                stop.set()
+
+
+def _duplicate_filter(
+    drop_duplicates: Union[bool, DuplicateFilter], column: str
+) -> Optional[DuplicateFilter]:
+    """
+    Get the filter of duplicate reports for a run, if duplicates are dropped.
+    """
+    if isinstance(drop_duplicates, DuplicateFilter):
+        return drop_duplicates
+    return DuplicateFilter(column) if drop_duplicates else None
+
+
+def run_pipeline(
+    input_path: Union[str, Path],
+    output_path: Union[str, Path],
+    searches: Union[Dict, SearchSet],
+    column: str = "report",
+    chunksize: int = 10000,
+    workers: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    **kwargs,
+) -> PipelineStats:
+    """
+    Preprocess and search a file of reports chunk by chunk, appending the
+    results to the output file.
+
+    Args:
+        input_path (str, Path): The path to the input csv, Parquet or Arrow
+            file.
+        output_path (str, Path): The path to the output csv, Parquet or Arrow
+            file.
+        searches (dict, SearchSet): The searches, as for Radex.searches.
+        column (str, optional): The column of the reports. Defaults to
+            'report'.
+        chunksize (int, optional): The number of rows read at a time. Defaults
+            to 10000.
+        workers (int, optional): Number of worker processes. If set, reading,
+                                processing and writing overlap, see
+                                PipelineRunner. Defaults to None (process each
+                                chunk in turn in the current process).
+        queue_size (int, optional): The maximum number of chunks read but not
+                                    yet written, when using workers. Defaults
+                                    to twice the workers.
+        **kwargs: Keyword arguments of clean_dataframe.
+            drop_duplicates (bool, optional): Whether to drop duplicates across
+                the whole file. Defaults to False.
+
+    Raises:
+        ValueError: If chunksize or workers is less than 1
+
+    Returns:
+        PipelineStats: The counters of each stage, including the number of rows
+            written
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+
+    chunks, table_writer = open_files(
+        input_path, output_path, chunksize, column
+    )
+    return process_chunks(
+        chunks,
+        table_writer,
+        searches,
+        column=column,
+        workers=workers,
+        queue_size=queue_size,
+        **kwargs,
+    )
+
+
+def process_chunks(
+    chunks: Iterator[pd.DataFrame],
+    table_writer: TableWriter,
+    searches: Union[Dict, SearchSet],
+    column: str = "report",
+    workers: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    **kwargs,
+) -> PipelineStats:
+    """
+    Preprocess and search chunks of reports from any source, see run_pipeline.
+    The writer is closed at the end of the run.
+
+    Args:
+        chunks (iterator): The chunks of reports.
+        table_writer (TableWriter): The writer of the output file.
+        searches (dict, SearchSet): The searches, as for Radex.searches.
+        column (str, optional): The column of the reports. Defaults to
+            'report'.
+        workers (int, optional): Number of worker processes. Defaults to None.
+        queue_size (int, optional): The maximum number of chunks read but not
+                                    yet written, when using workers. Defaults
+                                    to twice the workers.
+        **kwargs: Keyword arguments of clean_dataframe.
+            drop_duplicates (bool or DuplicateFilter, optional): Whether to
+                drop duplicates across all the chunks. Pass a DuplicateFilter
+                to also drop the reports it has already seen. Defaults to
+                False.
+
+    Raises:
+        ValueError: If workers is less than 1
+
+    Returns:
+        PipelineStats: The counters of each stage, including the number of rows
+            written
+    """
+    if not isinstance(searches, SearchSet):
+        searches = compile_searches(searches)
+
+    if workers is not None:
+        runner = PipelineRunner(
+            column, searches, workers, queue_size=queue_size, **kwargs
+        )
+        return runner.run_chunks(chunks, table_writer)
+
+    stats = PipelineStats()
+    start_run = time.perf_counter()
+    chunks = iter(chunks)
+    duplicates = _duplicate_filter(
+        kwargs.pop("drop_duplicates", False), column
+    )
+
+    try:
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            if duplicates is not None:
+                chunk = duplicates.filter(chunk)
+            stats.read.busy += time.perf_counter() - start
+            stats.read.chunks += 1
+            stats.read.rows += len(chunk)
+
+            start = time.perf_counter()
+            result = process_chunk(chunk, column, searches, **kwargs)
+            stats.compute.busy += time.perf_counter() - start
+            stats.compute.chunks += 1
+            stats.compute.rows += len(result)
+
+            start = time.perf_counter()
+            table_writer.write(result)
+            stats.write.busy += time.perf_counter() - start
+            stats.write.chunks += 1
+            stats.write.rows += len(result)
+    finally:
+        table_writer.close()
+
+    stats.seconds = time.perf_counter() - start_run
+    return stats
@@ -1,19 +1,44 @@
 """
-Preprocessing functions for text data. 
+Preprocessing functions for text data.
 Includes functions to clean text, remove stopwords, and combine columns.
 """
 
+import hashlib
+import json
 import re
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Union
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
-from negex.negexPython.negex import negTagger, sortRules
+from radex.cache import PreprocessingCache, cache_key
+from radex.document import Document, DocumentColumn, as_document
+from radex.negation import (
+    NegationRules,
+    as_negation_rules,
+    load_negation_rules,
+)
+from radex.parallel import map_chunks
 
 RULES_FILE = Path(__file__).parent.parent / "data" / "negex_triggers.txt"
 STOPWORDS_FILE = Path(__file__).parent.parent / "data" / "stopwords.csv"
 
+# New lines, forward slashes and dashes are replaced with a space. All other
+# whitespace characters (those for which str.isspace() is true) are also made
+# a space here, as runs of whitespace become a single space anyway.
+_WHITESPACE = (
+    "\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680"
+    "\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a"
+    "\u2028\u2029\u202f\u205f\u3000"
+)
+_SPACE_TABLE = str.maketrans(dict.fromkeys("/-" + _WHITESPACE, " "))
+
+# Punctuation, once all whitespace is a space
+_PUNCTUATION = re.compile(r"[^\w .]+")
+_SPACES = re.compile(r" {2,}")
+
 
 def clean_dataframe(
     df_data: pd.DataFrame,
@@ -21,18 +46,37 @@ def clean_dataframe(
     **kwargs,
 ) -> pd.DataFrame:
     """
-    Clean dataframe by removing punctuation, new line characters, and trailing whitespace.
-    Make all text lowercase.
-    Optionally drop duplicates, nulls, and empty rows.
+    Clean dataframe by removing punctuation, new line characters, and trailing
+    whitespace. Make all text lowercase. Optionally drop duplicates, nulls, and
+    empty rows.
 
     Args:
         df_data (pd.DataFrame): The dataframe to clean.
         text_columns (Union[List[str], str]): The text columns to clean.
         **kwargs: Additional keyword arguments.
-            drop_duplicates (bool, optional): Whether to drop duplicates. Defaults to False.
-            drop_nulls (bool, optional): Whether to drop nulls. Defaults to False.
-            drop_negatives (list, optional): List of negation rules to remove. Defaults to None.
-            drop_stopwords (list, optional): List of stopwords to remove. Defaults to None.
+            drop_duplicates (bool, optional): Whether to drop duplicates.
+                Defaults to False.
+            drop_nulls (bool, optional): Whether to drop nulls. Defaults to
+                False.
+            drop_negatives (list, optional): List of negation rules to remove.
+                Defaults to None.
+            drop_stopwords (list, optional): List of stopwords to remove.
+                Defaults to None.
+            workers (int, optional): Number of worker processes to clean the
+                text with, each cleaning chunks of rows balanced by length.
+                Defaults to None (clean in the current process).
+            cache (str or PreprocessingCache, optional): A cache of cleaned
+                text, keyed by the raw text and the negation rules and
+                stopwords. Only the text not found in the cache is cleaned, and
+                then added to it. Defaults to None.
+            deduplicate (bool, optional): Clean each distinct text once and
+                copy the result to every row with that text. Unlike
+                drop_duplicates, every row is kept. Defaults to False.
+            sentence_cache_size (int, optional): The number of sentences
+                cleaned of negated phrases to keep in the sentence cache of the
+                negation rules, see radex.negation.NegationRules. Defaults to
+                None (100000, or the size of the cache of NegationRules given
+                as drop_negatives).
 
     Returns:
         pd.DataFrame: The cleaned dataframe.
@@ -41,13 +85,18 @@ def clean_dataframe(
     drop_nulls = kwargs.get("drop_nulls", False)
     drop_negatives = kwargs.get("drop_negatives", None)
     drop_stopwords = kwargs.get("drop_stopwords", None)
+    workers = kwargs.get("workers", None)
+    cache = kwargs.get("cache", None)
+    deduplicate = kwargs.get("deduplicate", False)
+    sentence_cache_size = kwargs.get("sentence_cache_size", None)
 
     if isinstance(text_columns, str):
         text_columns = [text_columns]
 
     if not all(isinstance(col, str) for col in text_columns):
         raise ValueError(
-            "text_columns must contains the column names as a string or list of strings"
+            "text_columns must contains the column names as a string or list "
+            "of strings"
         )
 
     for col in text_columns:
@@ -57,50 +106,276 @@ def clean_dataframe(
         if drop_nulls:
             df_data = df_data.dropna(subset=[col])  # drop nulls
 
-        # remove new line characters
-        df_data[col] = df_data[col].str.replace("\n", " ", regex=True)
-        # remove forward slash
-        df_data[col] = df_data[col].str.replace("/", " ", regex=True)
-        # remove dash
-        df_data[col] = df_data[col].str.replace("-", " ", regex=True)
-        # remove punctuation
-        df_data[col] = df_data[col].str.replace(r"[^\w\s.]", "", regex=True)
-        # remove extra whitespace
-        df_data[col] = df_data[col].str.replace(r"\s+", " ", regex=True)
-        # remove trailing period
-        df_data[col] = df_data[col].str.replace(r"\.$", "", regex=True)
-        # Convert to lowercase
-        df_data[col] = df_data[col].str.lower()
-
-        if drop_negatives:
-            if drop_negatives == "negex":  # load negex default rules
-                with open(RULES_FILE, encoding="utf-8") as rfile:
-                    drop_negatives = sortRules(rfile.readlines())
-
-            df_data[col] = df_data[col].apply(
-                lambda x: remove_negated_phrases(
-                    x,
-                    rules=drop_negatives,
-                )
-            )
+        drop_negatives = get_negation_rules(
+            drop_negatives, sentence_cache_size
+        )
 
-        if drop_stopwords:
-            if drop_stopwords == "nltk":  # load nltk default stopwords
-                drop_stopwords = pd.read_csv(STOPWORDS_FILE).T.values[0]
+        if isinstance(drop_stopwords, str) and drop_stopwords == "nltk":
+            # nltk default stopwords
+            drop_stopwords = load_stopwords(STOPWORDS_FILE)
 
-            df_data[col] = df_data[col].apply(
-                lambda x: remove_stopwords(
-                    x,
-                    stopwords=drop_stopwords,
-                )
+        column = df_data[col]
+        if deduplicate:
+            codes, uniques = pd.factorize(column, use_na_sentinel=False)
+            column = pd.Series(uniques, name=col)
+
+        if cache is None:
+            cleaned = _clean_column(
+                column, drop_negatives, drop_stopwords, workers
+            )
+        elif isinstance(cache, PreprocessingCache):
+            cleaned = _clean_column_cached(
+                column, drop_negatives, drop_stopwords, workers, cache
             )
+        else:
+            with PreprocessingCache(cache) as opened_cache:
+                cleaned = _clean_column_cached(
+                    column,
+                    drop_negatives,
+                    drop_stopwords,
+                    workers,
+                    opened_cache,
+                )
+
+        if deduplicate:
+            # Copy the cleaned text of each distinct text to its rows
+            cleaned = cleaned.take(codes)
+            cleaned.index = df_data.index
 
-        # Remove extra whitespace
-        df_data[col] = df_data[col].str.strip()
+        df_data[col] = cleaned
 
     return df_data
 
 
+def _clean_column(
+    column: pd.Series,
+    negation_rules: Optional[Union[List, NegationRules]],
+    stopwords: Optional[List],
+    workers: Optional[int],
+) -> pd.Series:
+    """
+    Clean a column in the current process or in worker processes.
+    """
+    if workers is None:
+        return clean_column(column, negation_rules, stopwords)
+
+    # The rules and stopwords are sent once to each worker process
+    chunks = map_chunks(
+        _clean_chunk,
+        column,
+        workers=workers,
+        initializer=_init_clean_worker,
+        initargs=(negation_rules, stopwords),
+    )
+    return pd.concat(chunks)
+
+
+def _clean_column_cached(
+    column: pd.Series,
+    negation_rules: Optional[Union[List, NegationRules]],
+    stopwords: Optional[List],
+    workers: Optional[int],
+    cache: PreprocessingCache,
+) -> pd.Series:
+    """
+    Clean a column, only cleaning each distinct text which is not in the cache.
+    Missing values are not cached.
+    """
+    settings = json.dumps(
+        cleaning_settings(negation_rules, stopwords), sort_keys=True
+    )
+    settings = settings.encode("utf-8")
+    keys = [
+        cache_key(settings, x) if isinstance(x, str) else None for x in column
+    ]
+    cleaned = cache.get_many(key for key in keys if key is not None)
+
+    # Clean the first row of each text not in the cache, and every missing
+    # value
+    to_clean = np.zeros(len(column), dtype=bool)
+    pending = set()
+    for i, key in enumerate(keys):
+        if key is None or (key not in cleaned and key not in pending):
+            to_clean[i] = True
+            pending.add(key)
+
+    if to_clean.any():
+        new = _clean_column(
+            column[to_clean], negation_rules, stopwords, workers
+        )
+        new_keys = [keys[i] for i in np.flatnonzero(to_clean)]
+        cache.put_many(
+            {
+                key: value
+                for key, value in zip(new_keys, new)
+                if key is not None
+            }
+        )
+        cleaned.update(zip(new_keys, new))
+
+    values = np.empty(len(column), dtype=object)
+    values[:] = [cleaned[key] for key in keys]
+    return pd.Series(values, index=column.index, name=column.name)
+
+
+def clean_column(
+    column: pd.Series,
+    negation_rules: Optional[Union[List, NegationRules]] = None,
+    stopwords: Optional[List] = None,
+) -> pd.Series:
+    """
+    Clean a column of text: remove new lines, slashes, dashes, punctuation and
+    extra whitespace, make lowercase, and optionally remove negated phrases and
+    stopwords.
+
+    Args:
+        column (pd.Series): The text to clean.
+        negation_rules (list, optional): Sorted negation rules, see
+                                        remove_negated_phrases. Defaults to
+                                        None.
+        stopwords (list, optional): List of stopwords to remove. Defaults to
+            None.
+
+    Returns:
+        pd.Series: The cleaned text.
+    """
+    column = normalise_column(column)
+    if not column.notna().any():
+        return column  # no text to clean, e.g. a chunk of missing values
+
+    if negation_rules:
+        # compile the rules once
+        negation_rules = as_negation_rules(negation_rules)
+        # find the sentences of every report at once, and remove the negated
+        # phrases sentence by sentence without splitting the reports again
+        documents = DocumentColumn.from_series(column)
+        values = column.to_numpy(dtype=object, copy=True)
+        for i in np.flatnonzero(~documents.missing):
+            values[i] = remove_negated_phrases(
+                documents.document(i), rules=negation_rules
+            )
+        column = pd.Series(values, index=column.index, name=column.name)
+
+    if stopwords is not None and len(stopwords) > 0:
+        column = get_stopword_remover(tuple(stopwords)).remove_column(column)
+
+    # Remove extra whitespace
+    column = column.str.strip()
+
+    return column
+
+
+def normalise_text(text: str) -> str:
+    """
+    Remove new lines, slashes, dashes, punctuation, extra whitespace and the
+    trailing period, and make lowercase, in a single pass over each string.
+    Gives the same result as:
+        text.replace("\\n", " ").replace("/", " ").replace("-", " ")
+        re.sub(r"[^\\w\\s.]", "", text)
+        re.sub(r"\\s+", " ", text)
+        re.sub(r"\\.$", "", text)
+        text.lower()
+
+    Args:
+        text (str): The input text. As with Series.str, missing values are
+                    returned unchanged and other non string values give NaN.
+
+    Returns:
+        str: The normalised text.
+    """
+    if not isinstance(text, str):
+        return text if pd.isna(text) else np.nan
+
+    text = _PUNCTUATION.sub("", text.translate(_SPACE_TABLE))
+    if "  " in text:
+        text = _SPACES.sub(" ", text)
+    if text.endswith("."):
+        text = text[:-1]
+    return text.lower()
+
+
+def normalise_column(column: pd.Series) -> pd.Series:
+    """
+    Apply normalise_text to a column of text, with a single pass over each
+    string.
+
+    Args:
+        column (pd.Series): The text to normalise.
+
+    Returns:
+        pd.Series: The normalised text.
+    """
+    result = column.map(normalise_text)
+    if column.dtype == object or isinstance(column.dtype, pd.StringDtype):
+        # keep the dtype as with Series.str, also when every value is missing
+        result = result.astype(column.dtype)
+    return result
+
+
+def cleaning_settings(
+    negation_rules: Optional[Union[List, NegationRules]] = None,
+    stopwords: Optional[List] = None,
+) -> Dict[str, Any]:
+    """
+    Describe the negation rules and stopwords passed to clean_column, by the
+    number and a hash of the rules or stopwords, so that any change to them
+    changes the description.
+
+    Args:
+        negation_rules (list, NegationRules, optional): Sorted negation rules.
+            Defaults to None.
+        stopwords (list, optional): List of stopwords. Defaults to None.
+
+    Returns:
+        dict: The description, which can be saved as JSON
+    """
+    if isinstance(negation_rules, NegationRules):
+        negation_rules = negation_rules.rules
+
+    negation = None
+    if negation_rules:
+        negation = {
+            "rules": len(negation_rules),
+            "hash": _digest(repr(list(negation_rules))),
+        }
+
+    stopword_settings = None
+    if stopwords is not None and len(stopwords) > 0:
+        stopword_settings = {
+            "stopwords": len(stopwords),
+            "hash": _digest(repr(tuple(stopwords))),
+        }
+
+    return {"drop_negatives": negation, "drop_stopwords": stopword_settings}
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# Settings of the clean_column calls in a worker process, set once by
+# _init_clean_worker
+_worker_settings = {}
+
+
+def _init_clean_worker(
+    negation_rules: Optional[Union[List, NegationRules]],
+    stopwords: Optional[List],
+):
+    """
+    Store the negation rules and stopwords in a worker process.
+    """
+    _worker_settings["negation_rules"] = negation_rules
+    _worker_settings["stopwords"] = stopwords
+
+
+def _clean_chunk(chunk: pd.Series) -> pd.Series:
+    """
+    Clean a chunk of a column in a worker process.
+    """
+    return clean_column(chunk, **_worker_settings)
+
+
 def remove_stopwords(
     text: str,
     stopwords: List,
@@ -115,11 +390,121 @@ def remove_stopwords(
     Returns:
         str: The text with stopwords removed.
     """
-    # remove punctuation from stopwords
-    stopwords = list(re.sub(r"[^\w\s]", "", s) for s in stopwords)
+    return get_stopword_remover(tuple(stopwords)).remove(text)
+
+
+class StopwordRemover:
+    """
+    Remove a fixed list of stopwords from text, compiled once.
+
+    Stopwords are stripped of punctuation as in remove_stopwords. When every
+    stopword is then a single word, the text is walked word by word and the
+    words in the stopword set are dropped along with the whitespace following
+    them. Otherwise the stopwords are removed with a regex alternation.
+
+    e.g. remover = StopwordRemover(["the", "was"])
+         remover.remove("the dog was fast")
+         => 'dog fast'
+    """
+
+    def __init__(self, stopwords: Iterable[str]):
+        # remove punctuation from stopwords
+        self.stopwords = tuple(re.sub(r"[^\w\s]", "", s) for s in stopwords)
+
+        if all(re.fullmatch(r"\w+", s) for s in self.stopwords):
+            self._stopword_set = frozenset(self.stopwords)
+            self.pattern = re.compile(r"(\w+)(\s*)")
+            self._replace = self._drop_stopword
+        else:
+            self.pattern = re.compile(
+                r"\b(" + r"|".join(self.stopwords) + r")\b\s*"
+            )
+            self._replace = ""
+
+    def _drop_stopword(self, match: re.Match) -> str:
+        return "" if match.group(1) in self._stopword_set else match.group(0)
+
+    def remove(self, text: str) -> str:
+        """
+        Remove the stopwords from a text.
+
+        Args:
+            text (str): The input text
+
+        Returns:
+            str: The text with stopwords removed
+        """
+        return self.pattern.sub(self._replace, text)
+
+    def remove_column(self, column: pd.Series) -> pd.Series:
+        """
+        Remove the stopwords from a column of text.
+
+        Args:
+            column (pd.Series): The input text
+
+        Returns:
+            pd.Series: The text with stopwords removed
+        """
+        return column.str.replace(self.pattern, self._replace, regex=True)
+
+
+@lru_cache(maxsize=32)
+def get_stopword_remover(stopwords: Tuple[str, ...]) -> StopwordRemover:
+    """
+    Get the StopwordRemover for a list of stopwords, compiled once per list.
+
+    Args:
+        stopwords (tuple): The stopwords
+
+    Returns:
+        StopwordRemover: The compiled remover
+    """
+    return StopwordRemover(stopwords)
 
-    data = re.sub(r"\b(" + r"|".join(stopwords) + r")\b\s*", "", text)
-    return data
+
+@lru_cache(maxsize=None)
+def load_stopwords(file_path: Union[str, Path]) -> Tuple[str, ...]:
+    """
+    Read a stopwords csv file with one stopword per row. The file is only read
+    once.
+
+    Args:
+        file_path (str, Path): The stopwords file e.g. data/stopwords.csv
+
+    Returns:
+        tuple: The stopwords
+    """
+    return tuple(pd.read_csv(file_path).T.values[0])
+
+
+def get_negation_rules(
+    drop_negatives: Optional[Union[str, List, NegationRules]],
+    sentence_cache_size: Optional[int] = None,
+) -> Optional[NegationRules]:
+    """
+    Get the compiled negation rules to remove negated phrases with, see
+    clean_dataframe.
+
+    Args:
+        drop_negatives (str, list, NegationRules, optional): 'negex' for the
+            default rules, or sorted negation rules.
+        sentence_cache_size (int, optional): The number of sentences in the
+            sentence cache of the rules. Defaults to None (100000, or the size
+            of the cache of NegationRules given as drop_negatives).
+
+    Returns:
+        NegationRules: The compiled rules, or None if no negated phrases are
+            removed
+    """
+    if isinstance(drop_negatives, str) and drop_negatives == "negex":
+        # negex default rules
+        if sentence_cache_size is None:
+            return load_negation_rules(RULES_FILE)
+        return load_negation_rules(RULES_FILE, sentence_cache_size)
+    if drop_negatives:
+        return as_negation_rules(drop_negatives, sentence_cache_size)
+    return None
 
 
 def merge_columns(
@@ -134,8 +519,10 @@ def merge_columns(
     Args:
         df (pd.DataFrame): The dataframe to combine columns in.
         cols (list): The columns to combine.
-        new_col_name (str, optional): The name of the new column. Defaults to 'combined'.
-        delimiter (str, optional): The delimiter to use between columns. Defaults to ' '.
+        new_col_name (str, optional): The name of the new column. Defaults to
+            'combined'.
+        delimiter (str, optional): The delimiter to use between columns.
+            Defaults to ' '.
 
     Returns:
         pd.DataFrame: The dataframe with the columns combined.
@@ -151,17 +538,24 @@ def merge_columns(
 
 
 def remove_negated_phrases(
-    text: str,
-    rules: List,
+    text: Union[str, Document],
+    rules: Union[List, NegationRules],
     verbose: bool = False,
 ) -> str:
     """
-    Use negex to remove negated phrases from text.
+    Use negex to remove negated phrases from text. The triggers of each
+    sentence are tagged in one pass with the compiled rules, see
+    radex.negation.NegationRules, and sentences already cleaned with the same
+    rules are taken from the rules' sentence cache.
 
     Args:
-        text (str): The input text from which negated phrases will be removed.
-        rules (list): List of negation rules.
-        verbose (bool, optional): Whether to print the tagged sentence. Defaults to False.
+        text (str, Document): The input text from which negated phrases will be
+            removed.
+        rules (list, NegationRules): List of negation rules sorted by
+                                    negex.sortRules, or the rules compiled by
+                                    NegationRules.
+        verbose (bool, optional): Whether to print the tagged sentence.
+            Defaults to False.
 
     Returns:
         str: The text with negated phrases removed.
@@ -173,35 +567,20 @@ def remove_negated_phrases(
     # with open(rules_file, encoding="utf-8") as rfile:
     #     rules = sortRules(rfile.readlines())
 
-    output = ""
-    for sentence in text.split("."):
-        tagger = negTagger(
-            sentence=sentence, phrases=[], rules=rules, negP=False
-        )
-        negated_phrases = tagger.getScopes()
-        tagged_sentence = tagger.getNegTaggedSentence()
+    rules = as_negation_rules(rules)
+    cache = rules.sentence_cache
 
+    output = ""
+    for sentence in as_document(text).sentences:
         if verbose:
-            print("Tagged sentence:", tagged_sentence)
-            print("Negated phrases to be removed:", negated_phrases)
-
-        # remove negated phrases
-        for phrase in negated_phrases:
-            # if verbose:
-            #     print(phrase, "[PREN] " + phrase in tagged_sentence)
-            # if phrase is before or afte [PREN] or [POST], remove it
-            tagged_sentence = tagged_sentence.replace(
-                "[PREN] " + phrase, " XXXXX"
-            )
-            tagged_sentence = tagged_sentence.replace(
-                phrase + " [POST]", "XXXXX "
+            tagged_sentence = _remove_negated_sentence(
+                sentence, rules, verbose=True
             )
-
-        # Remove all the tags i.e. [PREN], [POST], [CONJ]
-        tagged_sentence = re.sub(r"\[.*?\]", "", tagged_sentence)
-
-        if verbose:
-            print("Sentence with negated phrases removed:", tagged_sentence)
+        else:
+            tagged_sentence = cache.get(sentence)
+            if tagged_sentence is None:
+                tagged_sentence = _remove_negated_sentence(sentence, rules)
+                cache.put(sentence, tagged_sentence)
 
         output += tagged_sentence + ". "
 
@@ -213,3 +592,33 @@ def remove_negated_phrases(
     output = re.sub(r"\.$", "", output)  # remove trailing full stop
 
     return output
+
+
+def _remove_negated_sentence(
+    sentence: str, rules: NegationRules, verbose: bool = False
+) -> str:
+    """
+    Remove the negated phrases from a single sentence, see
+    remove_negated_phrases.
+    """
+    tagged_sentence, negated_phrases = rules.tag(sentence)
+
+    if verbose:
+        print("Tagged sentence:", tagged_sentence)
+        print("Negated phrases to be removed:", negated_phrases)
+
+    # remove negated phrases
+    for phrase in negated_phrases:
+        # if verbose:
+        #     print(phrase, "[PREN] " + phrase in tagged_sentence)
+        # if phrase is before or afte [PREN] or [POST], remove it
+        tagged_sentence = tagged_sentence.replace("[PREN] " + phrase, " XXXXX")
+        tagged_sentence = tagged_sentence.replace(phrase + " [POST]", "XXXXX ")
+
+    # Remove all the tags i.e. [PREN], [POST], [CONJ]
+    tagged_sentence = re.sub(r"\[.*?\]", "", tagged_sentence)
+
+    if verbose:
+        print("Sentence with negated phrases removed:", tagged_sentence)
+
+    return tagged_sentence
@@ -4,30 +4,32 @@ Evaluate regular expressions.
 """
 
 import re
-from math import e
-from typing import List
+from typing import List, Sequence, Tuple, Union
 
+from radex.document import Document, as_document
 
-def evaluate_regex(candidate: str, regex: str) -> List:
+
+def evaluate_regex(candidate: Union[str, Document], regex: str) -> List:
     """
-    Performs a regex search on a candidate string, returning all matches and start/ end indices.
+    Performs a regex search on a candidate string, returning all matches and
+    start/ end indices.
 
     Args:
-        candidate (str): String to match against
+        candidate (str, Document): String to match against, or its Document to
+                                    reuse its sentences
         regex (str): Regex pattern to match
 
     Returns:
-        list: A list of tuples. Each tuple contains the matched substring and start/ end indices.
+        list: A list of tuples. Each tuple contains the matched substring and
+            start/ end indices.
     """
-    # Split candidate into sentences which are searched individually
-    candidates = [
-        sentence for sentence in candidate.split(".") if sentence.strip() != ""
-    ]
+    # Sentences of the candidate are searched individually
+    document = as_document(candidate)
     result = []
-    for c in candidates:
+    for start, end in document.spans:
         result += [
             (match.group(), match.start(), match.end())
-            for match in re.finditer(regex, c.strip())
+            for match in re.finditer(regex, document.text[start:end])
         ]
 
     return result
@@ -37,8 +39,10 @@ def get_regex_wildcards(expression: str) -> str:
     """
     Converts a regular expression with wildcards to a regex pattern.
     Allowed wildcards are:
-    - '*' for a multiple character wildcard e.g. 'colou*' will match 'colour' and 'colours'
-    - '?' for a single/none character wildcard e.g. 'colo?r' will match 'colour' and 'color'
+    - '*' for a multiple character wildcard e.g. 'colou*' will match 'colour'
+      and 'colours'
+    - '?' for a single/none character wildcard e.g. 'colo?r' will match
+      'colour' and 'color'
 
     Args:
         expression (str): The regular expression with wildcards.
@@ -47,12 +51,10 @@ def get_regex_wildcards(expression: str) -> str:
         str: The regex pattern
     """
     regex = re.escape(expression.strip())
-    regex = regex.replace(
-        r"\*", r"\w*"
-    )  # replace * with multiple character wildcard
-    regex = regex.replace(
-        r"\?", r".?"
-    )  # replace ? with single character wildcard
+    # replace * with multiple character wildcard
+    regex = regex.replace(r"\*", r"\w*")
+    # replace ? with single character wildcard
+    regex = regex.replace(r"\?", r".?")
 
     # add word boundary to start and end of regex
     regex = r"\b" + regex + r"\b"
@@ -63,13 +65,15 @@ def get_regex_proximity(
     word1: str, word2: str, max_distance: int, direction: str = "centre"
 ) -> str:
     """
-    Creates a regex pattern that matches two words within a specified distance of each other.
+    Creates a regex pattern that matches two words within a specified distance
+    of each other.
 
     Args:
         word1 (str): The first word to match.
         word2 (str): The second word to match.
         max_distance (int): The maximum distance between the two words.
-                            e.g. if max_distance=1, words can be separated by a single word.
+                            e.g. if max_distance=1, words can be separated by
+                            a single word.
         direction (str): The direction to match:
                         - 'centre' means word2 can appear before or after word1
                         - 'right' means word2 must appear after word1
@@ -92,7 +96,10 @@ def get_regex_proximity(
     max_dist = max_distance
 
     if direction in ["centre", "center"]:
-        regex = rf"\b{word1}\b\W+(?:\w+\W+){{0,{max_dist}}}?\b{word2}\b|\b{word2}\b\W+(?:\w+\W+){{0,{max_dist}}}?\b{word1}\b"
+        regex = (
+            rf"\b{word1}\b\W+(?:\w+\W+){{0,{max_dist}}}?\b{word2}\b"
+            rf"|\b{word2}\b\W+(?:\w+\W+){{0,{max_dist}}}?\b{word1}\b"
+        )
     elif direction == "right":
         regex = rf"\b{word1}\b\W+(?:\w+\W+){{0,{max_dist}}}?\b{word2}\b"
     elif direction == "left":
@@ -105,12 +112,152 @@ def get_regex_proximity(
     return regex
 
 
+def parse_proximity(expression: str) -> Tuple[str, str, int, str]:
+    """
+    Split a proximity search into its words, distance and direction.
+    e.g. 'thyroid ~~2 cyst*' => ('thyroid', 'cyst*', 2, 'centre')
+         'quick~1fox' => ('quick', 'fox', 1, 'right')
+
+    Args:
+        expression (str): Proximity search of the form 'wordA ~X wordB' or
+            'wordA ~~X wordB'
+
+    Raises:
+        ValueError: If the expression is invalid.
+
+    Returns:
+        tuple: The two words, the maximum distance and the direction
+    """
+    # split on proximity string e.g. '~2' or '~~2'
+    parts = re.split(r"(~{1,2}\d+)", expression)
+
+    if len(parts) != 3:
+        raise ValueError(f"Invalid proximity search: {expression}")
+
+    word1 = parts[0].strip()
+    word2 = parts[2].strip()
+
+    # Get max distance from proximity string e.g. '~2'
+    max_distance = int(parts[1].replace("~", ""))
+
+    # Decide whether to do a center search or right search
+    if parts[1].count("~") == 2:
+        direction = "centre"
+    else:
+        direction = "right"
+
+    return word1, word2, max_distance, direction
+
+
+def proximity_match(
+    positions1: Sequence[int],
+    positions2: Sequence[int],
+    max_distance: int,
+    direction: str = "centre",
+) -> bool:
+    """
+    Check whether two words are within a specified distance of each other,
+    given the sorted token positions of each word. Equivalent to the regex of
+    get_regex_proximity for words which each match a whole token.
+    e.g. positions1=[0, 7], positions2=[3], max_distance=2
+         => True (2 words in between)
+
+    Args:
+        positions1 (list): Sorted token positions of the first word.
+        positions2 (list): Sorted token positions of the second word.
+        max_distance (int): The maximum number of words between the two words.
+        direction (str): The direction to match, as for get_regex_proximity.
+
+    Returns:
+        bool: True if the words are found within max_distance words of each
+            other
+    """
+    if direction in ["centre", "center"]:
+        return _follows_within(
+            positions1, positions2, max_distance + 1
+        ) or _follows_within(positions2, positions1, max_distance + 1)
+    if direction == "right":
+        return _follows_within(positions1, positions2, max_distance + 1)
+    if direction == "left":
+        return _follows_within(positions2, positions1, max_distance + 1)
+    raise ValueError("direction must be 'centre', 'right', or 'left'")
+
+
+def _follows_within(
+    before: Sequence[int], after: Sequence[int], max_gap: int
+) -> bool:
+    """
+    Linear merge of two sorted lists of positions, checking whether any
+    position in after is 1 to max_gap positions after a position in before.
+    """
+    i = 0
+    for position in after:
+        while i + 1 < len(before) and before[i + 1] < position:
+            i += 1
+        if i < len(before) and 0 < position - before[i] <= max_gap:
+            return True
+    return False
+
+
+def get_regex(expression: str) -> str:
+    """
+    Converts a single search term containing wildcards */?/_ or proximity
+    matching ~X into the regex pattern used to evaluate it.
+
+    Args:
+        expression (str): Search term containing wildcards or a proximity
+            operator.
+
+    Raises:
+        ValueError: If the expression is invalid.
+
+    Returns:
+        str: The regex pattern
+    """
+
+    # Proximity search
+    if "~" in expression:
+        word1, word2, max_distance, direction = parse_proximity(expression)
+        regex = get_regex_proximity(
+            word1, word2, max_distance, direction=direction
+        )
+
+    # Normal wildcard regex
+    else:
+        regex = get_regex_wildcards(expression)
+
+    return regex
+
+
+def get_required_literals(expression: str) -> List[str]:
+    """
+    Get the literal fragments which must appear in a candidate for a search
+    term to match, longest first. Fragments are split on wildcards, word
+    boundaries and whitespace.
+    e.g. 'goit?r?' => ['goit', 'r']
+         'thyroid~~2cyst*' => ['thyroid', 'cyst']
+
+    Args:
+        expression (str): Search term containing wildcards or a proximity
+            operator.
+
+    Returns:
+        list: The required literal fragments, longest first
+    """
+    # Remove the proximity operator e.g. '~2' or '~~2', both words are required
+    expression = re.sub(r"~{1,2}\d+", " ", expression)
+
+    fragments = set(re.split(r"[*?_\s]+", expression)) - {""}
+    return sorted(fragments, key=lambda fragment: (-len(fragment), fragment))
+
+
 def string_search(
-    candidate: str,
+    candidate: Union[str, Document],
     expression: str,
 ) -> tuple:
     """
-    Evaluates a logical expression containing wildcards */?/_ or proximity matching ~X.
+    Evaluates a logical expression containing wildcards */?/_ or proximity
+    matching ~X.
     e.g.
         candidate="The quick brown fox jumps over the lazy dog",
         expression="quick~2fo*"
@@ -118,48 +265,23 @@ def string_search(
 
     For the proximity search
         wordA ~2 wordB => wordB must be a maximum of 2 words after wordA
-        wordA ~~2 wordB => wordB must be a maximum of 2 words before OR after wordA
+        wordA ~~2 wordB => wordB must be a maximum of 2 words before OR after
+                           wordA
 
     Args:
-        candidate (str): String to match against
-        expression (str): Logical expression containing wildcards */?/_ or proximity matching ~X.
+        candidate (str, Document): String to match against
+        expression (str): Logical expression containing wildcards */?/_ or
+            proximity matching ~X.
 
     Raises:
         ValueError: If the expression is invalid.
 
     Returns:
-        tuple: A tuple containing a boolean indicating if the expression was found in the candidate and a list of matches.
+        tuple: A tuple containing a boolean indicating if the expression was
+            found in the candidate and a list of matches.
     """
 
-    # Proximity search
-    if "~" in expression:
-        parts = re.split(
-            r"(~{1,2}\d+)", expression
-        )  # split on proximity string e.g. '~2' or '~~2'
-
-        if len(parts) == 3:
-            word1 = parts[0].strip()
-            word2 = parts[2].strip()
-
-            # Get max distance from proximity string e.g. '~2'
-            max_distance = int(parts[1].replace("~", ""))
-
-            # Decide whether to do a center search or right search
-            if parts[1].count("~") == 2:
-                direction = "centre"
-            else:
-                direction = "right"
-
-            regex = get_regex_proximity(
-                word1, word2, max_distance, direction=direction
-            )
-
-        else:
-            raise ValueError(f"Invalid proximity search: {expression}")
-
-    # Normal wildcard regex
-    else:
-        regex = get_regex_wildcards(expression)
+    regex = get_regex(expression)
 
     result = evaluate_regex(candidate, regex)
 
@@ -167,22 +289,22 @@ def string_search(
 
 
 def wildcard_search(string: str, pattern: str) -> List:
-    """Searches for the specified pattern in the string using Linux-style wildcards.
+    """Searches for the specified pattern in the string using Linux-style
+    wildcards.
 
     Args:
         string (str): The string to search in.
         pattern (str): The wildcard pattern to match.
 
     Returns:
-        list: A list of tuples, where each tuple contains matches and start/ end indices.
+        list: A list of tuples, where each tuple contains matches and start/
+            end indices.
     """
     regex = re.escape(pattern)
-    regex = regex.replace(
-        r"\*", r"\w*"
-    )  # replace * with multiple character wildcard
-    regex = regex.replace(
-        r"\?", r".?"
-    )  # replace ? with single character wildcard
+    # replace * with multiple character wildcard
+    regex = regex.replace(r"\*", r"\w*")
+    # replace ? with single character wildcard
+    regex = regex.replace(r"\?", r".?")
     regex = regex.replace(r"_", r"\b")  # replace _ with word boundary
 
     matches = [
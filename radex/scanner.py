@@ -0,0 +1,209 @@
+"""
+Scan a candidate string for many search terms at once.
+
+The regexes built by radexpressions.get_regex all start at a word boundary and
+most begin with a literal prefix, e.g. r"\\bthyroid\\b" or r"\\bnodul\\w*\\b".
+The literal prefixes of all terms are combined into a trie, so each sentence is
+walked once: at every word boundary the trie gives the few terms which can
+start there, and only those are matched. The result is the set of terms found
+in the candidate, with the position of their first match.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from radex.document import Document, as_document
+
+# Characters which end the literal prefix of a regex
+_SPECIAL_CHARS = set(".^$()[]|")
+_QUANTIFIERS = set("*+?{")
+
+
+def split_branches(regex: str) -> List[str]:
+    """
+    Split a regex into its top level branches i.e. on '|' outside of any group.
+
+    Args:
+        regex (str): The regex pattern
+
+    Returns:
+        list: The top level branches of the regex
+    """
+    branches = []
+    depth = 0
+    branch_start = 0
+    escaped = False
+    for i, c in enumerate(regex):
+        if escaped:
+            escaped = False
+        elif c == "\\":
+            escaped = True
+        elif c in "([":
+            depth += 1
+        elif c in ")]":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            branches.append(regex[branch_start:i])
+            branch_start = i + 1
+    branches.append(regex[branch_start:])
+
+    return branches
+
+
+def literal_prefix(branch: str) -> str:
+    """
+    Get the literal characters at the start of a regex branch which begins with
+    a word boundary.
+    e.g. r"\\bnodul\\w*\\b" => 'nodul'
+         r"\\bheterogen\\w*\\ echotexture\\b" => 'heterogen'
+
+    Args:
+        branch (str): A regex without top level alternation, starting with
+            r"\\b"
+
+    Returns:
+        str: The literal prefix, which is empty if the branch starts with a
+            wildcard
+    """
+    prefix = ""
+    i = 2  # skip the word boundary
+    while i < len(branch):
+        c = branch[i]
+        if c == "\\":
+            if i + 1 >= len(branch) or branch[i + 1].isalnum():
+                break  # character class e.g. \w or a word boundary
+            c = branch[i + 1]
+            i += 1
+        elif c in _QUANTIFIERS:
+            prefix = prefix[:-1]  # the previous character is optional
+            break
+        elif c in _SPECIAL_CHARS:
+            break
+        prefix += c
+        i += 1
+
+    return prefix
+
+
+class MultiPatternScanner:
+    """
+    Find which of a set of regexes match a candidate string, walking each
+    sentence once.
+
+    Regexes whose every branch starts with a word boundary and a literal prefix
+    are indexed in a trie of their prefixes. Each sentence is walked from word
+    boundary to word boundary (skipping those which cannot start any prefix),
+    and a regex is only matched at the positions where one of its prefixes is
+    found. Any other regex is searched for directly.
+
+    Optionally, the literal fragments required by each regex (see
+    radexpressions.get_required_literals) are checked with a substring test
+    before the regex is run.
+
+    e.g. thyroid = r"\\bthyroid\\b"
+         cyst = r"\\bthyroid\\b\\W+(?:\\w+\\W+){0,2}?\\bcyst\\w*\\b"
+         scanner = MultiPatternScanner([thyroid, cyst])
+         scanner.scan("normal thyroid. thyroid with cysts")
+         => {thyroid: (7, 14), cyst: (16, 34)}
+    """
+
+    def __init__(
+        self,
+        regexes: Iterable[str],
+        literals: Optional[Dict[str, Tuple[str, ...]]] = None,
+    ):
+        # Remove duplicates, keeping the order
+        self.regexes = tuple(dict.fromkeys(regexes))
+        self.patterns = tuple(re.compile(regex) for regex in self.regexes)
+
+        literals = literals or {}
+        self.literals = tuple(
+            literals.get(regex, ()) for regex in self.regexes
+        )
+
+        # Trie of literal prefixes, the key None holds the regexes ending at a
+        # node
+        self._trie = {}
+        self._unprefixed = []
+        all_prefixes = set()
+        for i, regex in enumerate(self.regexes):
+            branches = split_branches(regex)
+            prefixes = {
+                literal_prefix(branch) if branch.startswith(r"\b") else ""
+                for branch in branches
+            }
+            if "" in prefixes:
+                self._unprefixed.append(i)
+                continue
+
+            all_prefixes.update(prefixes)
+            for prefix in prefixes:
+                node = self._trie
+                for c in prefix:
+                    node = node.setdefault(c, {})
+                node.setdefault(None, []).append(i)
+
+        # Word boundaries followed by the first characters of any prefix
+        starts = sorted(
+            {prefix[:2] for prefix in all_prefixes}, key=len, reverse=True
+        )
+        self._starts = re.compile(
+            r"\b(?=" + "|".join(re.escape(start) for start in starts) + ")"
+        )
+
+    def scan(
+        self, candidate: Union[str, Document]
+    ) -> Dict[str, Tuple[int, int]]:
+        """
+        Scan a candidate string for all regexes. As in
+        radexpressions.evaluate_regex, each sentence is searched individually.
+
+        Args:
+            candidate (str, Document): The candidate string to match against
+
+        Returns:
+            dict: The regexes found in the candidate, mapped to the start/ end
+                    indices of their first match in the candidate.
+        """
+        document = as_document(candidate)
+        found = {}
+        for start, end in document.spans:
+            self._scan_sentence(document.text[start:end], start, found)
+
+        return {self.regexes[i]: span for i, span in sorted(found.items())}
+
+    def _scan_sentence(self, sentence: str, start: int, found: dict):
+        """
+        Scan a single sentence, adding the index and span of new matches to
+        found.
+        """
+        literals = self.literals
+        for i in self._unprefixed:
+            if i not in found and all(
+                literal in sentence for literal in literals[i]
+            ):
+                match = self.patterns[i].search(sentence)
+                if match:
+                    found[i] = (start + match.start(), start + match.end())
+
+        trie = self._trie
+        length = len(sentence)
+        for boundary in self._starts.finditer(sentence):
+            position = boundary.start()
+            node = trie
+            j = position
+            while j < length:
+                node = node.get(sentence[j])
+                if node is None:
+                    break
+                j += 1
+                for i in node.get(None, ()):
+                    if i not in found and all(
+                        literal in sentence for literal in literals[i]
+                    ):
+                        match = self.patterns[i].match(sentence, position)
+                        if match:
+                            found[i] = (
+                                start + match.start(),
+                                start + match.end(),
+                            )
@@ -0,0 +1,313 @@
+"""
+Record where the terms of a set of searches match in each report, in the same
+pass which evaluates the searches, e.g. to highlight the matches when reviewing
+the results.
+
+The matches of a column are kept in flat arrays rather than in a dictionary per
+row:
+    offsets     the position of the first match of each row in the arrays
+                below, plus the end of the last row, i.e. the matches of row i
+                are offsets[i]:offsets[i + 1]
+    term_ids    the term matched, indexing terms
+    starts      the start of each match in the text of the row
+    ends        the end of each match in the text of the row
+
+Every match of every term is recorded, as found by
+radexpressions.evaluate_regex in each sentence. MatchSpans.matches gives the
+dictionary returned by dfsearch.check_all_matches for a single row.
+
+e.g. searches = compile_searches({"Nodule": "nodul*"})
+     results, spans = record_matches(df["report"], searches)
+     spans.matches(0, df["report"].iat[0])
+     => {'nodul*': (True, [('nodules', 3, 10)])}
+"""
+
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from radex.compiler import SearchSet, TermNode
+from radex.document import Document, DocumentColumn, as_document
+from radex.formats import import_pyarrow
+from radex.radexpressions import get_regex
+
+
+class MatchSpans:
+    """
+    The matches of the terms of a SearchSet in each row of a column, see the
+    module docstring for the layout of the arrays.
+    """
+
+    def __init__(
+        self,
+        terms: List[TermNode],
+        offsets: np.ndarray,
+        term_ids: np.ndarray,
+        starts: np.ndarray,
+        ends: np.ndarray,
+    ):
+        self.terms = terms
+        self.offsets = offsets
+        self.term_ids = term_ids
+        self.starts = starts
+        self.ends = ends
+        self._term_ids = {term.regex: i for i, term in enumerate(terms)}
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def spans(self, i: int) -> List[Tuple[str, int, int]]:
+        """
+        Get the matches in a row, in order of term then position.
+
+        Args:
+            i (int): The position of the row
+
+        Returns:
+            list: The expression of the term and the start/ end indices of each
+                match
+        """
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return [
+            (self.terms[term_id].expression, int(first), int(last))
+            for term_id, first, last in zip(
+                self.term_ids[start:end],
+                self.starts[start:end],
+                self.ends[start:end],
+            )
+        ]
+
+    def matches(
+        self,
+        i: int,
+        text: Union[str, Document],
+        parts: Optional[Sequence[str]] = None,
+    ) -> Dict[str, Tuple[bool, List[Tuple[str, int, int]]]]:
+        """
+        Get the matches in a row in the form returned by
+        dfsearch.check_all_matches, with the start/ end indices relative to the
+        sentence of each match.
+
+        Args:
+            i (int): The position of the row
+            text (str, Document): The text of the row
+            parts (list, optional): The search terms to use as keys, e.g. the
+                                    terms of the expression as written.
+                                    Defaults to None (the expression of every
+                                    term).
+
+        Raises:
+            ValueError: If a part is not a term of the searches
+
+        Returns:
+            dict: Each term mapped to whether it was found and a list of its
+                matches
+        """
+        if parts is None:
+            parts = [term.expression for term in self.terms]
+
+        document = as_document(text)
+        sentence_starts = [span[0] for span in document.spans]
+
+        found = {term_id: [] for term_id in range(len(self.terms))}
+        start, end = self.offsets[i], self.offsets[i + 1]
+        for term_id, first, last in zip(
+            self.term_ids[start:end],
+            self.starts[start:end],
+            self.ends[start:end],
+        ):
+            sentence_start = sentence_starts[
+                bisect_right(sentence_starts, first) - 1
+            ]
+            found[term_id].append(
+                (
+                    document.text[first:last],
+                    first - sentence_start,
+                    last - sentence_start,
+                )
+            )
+
+        result = {}
+        for part in parts:
+            part = part.strip()
+            term_id = self._term_ids.get(get_regex(part))
+            if term_id is None:
+                raise ValueError(f"{part} is not a term of the searches")
+            result[part] = (len(found[term_id]) > 0, found[term_id])
+        return result
+
+    def take(self, positions: np.ndarray) -> "MatchSpans":
+        """
+        Select rows, e.g. to copy the matches of each distinct text to its
+        rows.
+
+        Args:
+            positions (np.ndarray): The position of each selected row
+
+        Returns:
+            MatchSpans: The matches of the selected rows
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        counts = (self.offsets[1:] - self.offsets[:-1])[positions]
+        offsets = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        # Position of each selected match in the arrays of this object
+        rows = np.repeat(np.arange(len(positions)), counts)
+        index = (
+            self.offsets[positions][rows]
+            + np.arange(offsets[-1])
+            - offsets[rows]
+        )
+        return MatchSpans(
+            self.terms,
+            offsets,
+            self.term_ids[index],
+            self.starts[index],
+            self.ends[index],
+        )
+
+    @classmethod
+    def concat(cls, parts: List["MatchSpans"]) -> "MatchSpans":
+        """
+        Join the matches of consecutive chunks of a column.
+
+        Args:
+            parts (list): The matches of each chunk, with the same terms
+
+        Returns:
+            MatchSpans: The matches of the whole column
+        """
+        offsets = [np.zeros(1, dtype=np.int64)]
+        total = 0
+        for part in parts:
+            offsets.append(part.offsets[1:] + total)
+            total += part.offsets[-1]
+        return cls(
+            parts[0].terms,
+            np.concatenate(offsets),
+            np.concatenate([part.term_ids for part in parts]),
+            np.concatenate([part.starts for part in parts]),
+            np.concatenate([part.ends for part in parts]),
+        )
+
+    def to_arrow(self):
+        """
+        Convert to an Arrow list column, e.g. to save with the results in a
+        Parquet file. Requires pyarrow.
+
+        Returns:
+            pyarrow.ListArray: For each row, a list of the term, start and end
+                of each match
+        """
+        pa = import_pyarrow()
+        terms = pa.array(
+            [term.expression for term in self.terms], type=pa.string()
+        )
+        values = pa.StructArray.from_arrays(
+            [
+                pa.DictionaryArray.from_arrays(pa.array(self.term_ids), terms),
+                pa.array(self.starts),
+                pa.array(self.ends),
+            ],
+            names=["term", "start", "end"],
+        )
+        return pa.ListArray.from_arrays(
+            pa.array(self.offsets, type=pa.int32()), values
+        )
+
+
+def record_matches(
+    candidates: Union[pd.Series, DocumentColumn],
+    searches: SearchSet,
+    sentencizer: bool = False,
+) -> Tuple[Dict[str, np.ndarray], MatchSpans]:
+    """
+    Evaluate a set of compiled searches against a column of candidate strings,
+    recording every match of their terms. The results are the same as
+    search_dataframe_multiple.
+
+    Args:
+        candidates (pd.Series, DocumentColumn): The candidate strings, or the
+                                                reports with their sentences
+        searches (SearchSet): The compiled searches
+        sentencizer (bool, optional): If True, evaluate each sentence
+                                        independently. Defaults to False.
+
+    Returns:
+        tuple: The result of each search as a boolean array, and the matches
+    """
+    terms = searches.terms
+    regexes = [term.regex for term in terms]
+    results = {
+        name: np.zeros(len(candidates), dtype=bool) for name in searches.plans
+    }
+
+    offsets, term_ids, starts, ends = [0], [], [], []
+    for i, candidate in enumerate(candidates):
+        document = as_document(candidate)
+        text = document.text
+        present = [
+            term_id
+            for term_id, term in enumerate(terms)
+            if term.may_match(text)
+        ]
+
+        # The regexes of the terms found in each non-empty sentence
+        found = []
+        for span in document.spans if present else ():
+            sentence_start, sentence_end = span
+            sentence = text[sentence_start:sentence_end]
+            sentence_found = set()
+            for term_id in present:
+                term = terms[term_id]
+                if not term.may_match(sentence):
+                    continue
+                # Proximity terms are found from token positions, as by
+                # TermNode.search
+                if term.proximity is not None and not term.match_tokens(
+                    document.tokens(span)
+                ):
+                    continue
+                for match in term.pattern.finditer(sentence):
+                    term_ids.append(term_id)
+                    starts.append(sentence_start + match.start())
+                    ends.append(sentence_start + match.end())
+                    sentence_found.add(term.regex)
+                if term.proximity is not None:
+                    sentence_found.add(term.regex)
+            found.append(sentence_found)
+        offsets.append(len(term_ids))
+
+        if sentencizer:
+            # Sentences which are empty or only whitespace contain no terms
+            if len(document.sentences) > len(found):
+                found.append(set())
+            memos = [
+                _memo(regexes, sentence_found) for sentence_found in found
+            ]
+            for name, plan in searches.plans.items():
+                results[name][i] = any(
+                    plan.evaluate(text, memo) for memo in memos
+                )
+        else:
+            memo = _memo(regexes, set().union(*found))
+            for name, plan in searches.plans.items():
+                results[name][i] = plan.evaluate(text, memo)
+
+    spans = MatchSpans(
+        terms,
+        np.array(offsets, dtype=np.int64),
+        np.array(term_ids, dtype=np.int32),
+        np.array(starts, dtype=np.int64),
+        np.array(ends, dtype=np.int64),
+    )
+    return results, spans
+
+
+def _memo(regexes: List[str], found: set) -> Dict[str, bool]:
+    memo = dict.fromkeys(regexes, False)
+    memo.update(dict.fromkeys(found, True))
+    return memo
@@ -0,0 +1,391 @@
+"""
+Save preprocessed reports to disk, so the slow cleaning steps (negex in
+particular) only run once for the same reports and preprocessing settings.
+
+Each entry of a CorpusStore is a directory named by a fingerprint of the raw
+data and the preprocessing settings, containing:
+    meta.json           the settings, the column order and the layout of the
+                        files below
+    frame.pkl           the index and the columns which were not cleaned
+    text_<i>.npy        the cleaned reports of a text column as concatenated
+                        UTF-8 bytes
+    offsets_<i>.npy     the byte offset of each report in the text, plus the
+                        end offset
+    missing_<i>.npy     whether each report is missing e.g. NaN
+    stops_<i>.npy       the byte offset of every full stop in the text, i.e.
+                        the end of each sentence as split by the sentencizer
+
+The .npy files are memory-mapped when loaded, so a single report or its
+sentences can be read without reading the whole column, and a column stored
+by pyarrow is loaded without decoding the reports.
+
+e.g. store = CorpusStore("corpus_store")
+     options = {"drop_negatives": "negex", "drop_stopwords": "nltk"}
+     settings = preprocessing_settings(**options)
+     fingerprint = corpus_fingerprint(df, ["report"], settings)
+     if fingerprint in store:
+         df_clean = store.load(fingerprint)
+     else:
+         df_clean = clean_dataframe(df, ["report"], **options)
+         store.save(fingerprint, df_clean, ["report"], settings)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from radex.document import DocumentColumn
+from radex.formats import import_pyarrow
+from radex.negation import NegationRules
+from radex.preprocessing import (
+    RULES_FILE,
+    STOPWORDS_FILE,
+    cleaning_settings,
+    load_negation_rules,
+    load_stopwords,
+)
+
+# Increase when the cleaning steps or the layout of the files change, so old
+# entries are no longer used
+STORE_VERSION = 1
+
+
+def _digest(*parts: bytes) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        hasher.update(part)
+    return hasher.hexdigest()
+
+
+def preprocessing_settings(
+    drop_duplicates: bool = False,
+    drop_nulls: bool = False,
+    drop_negatives: Optional[Union[str, List, NegationRules]] = None,
+    drop_stopwords: Optional[Union[str, List]] = None,
+) -> Dict[str, Any]:
+    """
+    Describe the preprocessing settings, as passed to clean_dataframe, in a
+    form which can be saved as JSON. The negation rules and stopwords are
+    recorded by a hash of their contents, so editing the triggers or stopwords
+    files changes the settings.
+
+    Args:
+        drop_duplicates (bool, optional): Whether to drop duplicates. Defaults
+            to False.
+        drop_nulls (bool, optional): Whether to drop nulls. Defaults to False.
+        drop_negatives (str, list, NegationRules, optional): 'negex' or the
+                                                            negation rules.
+                                                            Defaults to None.
+        drop_stopwords (str, list, optional): 'nltk' or the stopwords. Defaults
+            to None.
+
+    Returns:
+        dict: The settings
+    """
+    if isinstance(drop_negatives, str) and drop_negatives == "negex":
+        drop_negatives = load_negation_rules(RULES_FILE)
+    if isinstance(drop_stopwords, str) and drop_stopwords == "nltk":
+        drop_stopwords = load_stopwords(STOPWORDS_FILE)
+
+    return {
+        "version": STORE_VERSION,
+        "drop_duplicates": bool(drop_duplicates),
+        "drop_nulls": bool(drop_nulls),
+        **cleaning_settings(drop_negatives, drop_stopwords),
+    }
+
+
+def corpus_fingerprint(
+    df_data: pd.DataFrame,
+    text_columns: Union[List[str], str],
+    settings: Dict[str, Any],
+) -> str:
+    """
+    Fingerprint the raw data and preprocessing settings. The fingerprint
+    changes if any value, the index, the columns or the settings change.
+
+    Args:
+        df_data (pd.DataFrame): The data before preprocessing
+        text_columns (list, str): The text columns to clean
+        settings (dict): The settings from preprocessing_settings
+
+    Returns:
+        str: The fingerprint, as a hex string
+    """
+    if isinstance(text_columns, str):
+        text_columns = [text_columns]
+
+    description = {
+        "settings": settings,
+        "text_columns": list(text_columns),
+        "columns": [str(col) for col in df_data.columns],
+        "dtypes": [str(dtype) for dtype in df_data.dtypes],
+    }
+    return _digest(
+        json.dumps(description, sort_keys=True).encode("utf-8"),
+        pd.util.hash_pandas_object(df_data, index=True).to_numpy().tobytes(),
+    )
+
+
+class StoredColumn(DocumentColumn):
+    """
+    A memory-mapped text column of a CorpusStore entry. Reports and their
+    sentences are decoded when accessed, see radex.document.DocumentColumn.
+
+    e.g. column = store.open_column(fingerprint, "report")
+         column[0]            => 'normal thyroid. no nodules'
+         column.sentences(0)  => ['normal thyroid', ' no nodules']
+         column.document(0)   => Document('normal thyroid. no nodules')
+    """
+
+    def __init__(self, directory: Union[str, Path], prefix: str):
+        directory = Path(directory)
+        super().__init__(
+            np.load(directory / f"text_{prefix}.npy", mmap_mode="r"),
+            np.load(directory / f"offsets_{prefix}.npy", mmap_mode="r"),
+            np.load(directory / f"missing_{prefix}.npy", mmap_mode="r"),
+            np.load(directory / f"stops_{prefix}.npy", mmap_mode="r"),
+        )
+
+    def to_series(
+        self, index: Optional[pd.Index] = None, dtype: Optional[Any] = None
+    ) -> pd.Series:
+        """
+        Get the whole column as a series. With a string dtype stored by
+        pyarrow, e.g. the default str dtype of pandas 3 when pyarrow is
+        installed, the series is backed by the memory-mapped text and each
+        report is only decoded when accessed. Otherwise every report is
+        decoded.
+
+        Args:
+            index (pd.Index, optional): The index of the series. Defaults to
+                None.
+            dtype (optional): The dtype of the series. Defaults to None
+                (object).
+
+        Returns:
+            pd.Series: The reports, with NaN for missing reports
+        """
+        if dtype is not None:
+            dtype = pd.api.types.pandas_dtype(dtype)
+        if isinstance(dtype, pd.StringDtype) and dtype.storage.startswith(
+            "pyarrow"
+        ):
+            pyarrow = import_pyarrow()
+            valid = np.packbits(~np.asarray(self.missing), bitorder="little")
+            array = pyarrow.LargeStringArray.from_buffers(
+                len(self),
+                pyarrow.py_buffer(self.offsets),
+                pyarrow.py_buffer(self.text),
+                pyarrow.py_buffer(valid),
+                int(np.count_nonzero(self.missing)),
+            )
+            return pd.Series(pd.array(array, dtype=dtype), index=index)
+
+        series = super().to_series(index)
+        return series if dtype is None else series.astype(dtype)
+
+
+def _save_column(directory: Path, prefix: str, documents: DocumentColumn):
+    """
+    Save a text column as concatenated UTF-8 bytes with report offsets and full
+    stops.
+    """
+    np.save(directory / f"text_{prefix}.npy", documents.text)
+    np.save(directory / f"offsets_{prefix}.npy", documents.offsets)
+    np.save(directory / f"missing_{prefix}.npy", documents.missing)
+    np.save(directory / f"stops_{prefix}.npy", documents.stops)
+
+
+class CorpusStore:
+    """
+    A directory of preprocessed reports, one entry per fingerprint of the raw
+    data and the preprocessing settings. See the module docstring for the
+    layout of an entry.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+
+    def path(self, fingerprint: str) -> Path:
+        """
+        Get the directory of an entry.
+
+        Args:
+            fingerprint (str): The fingerprint from corpus_fingerprint
+
+        Returns:
+            Path: The directory of the entry
+        """
+        return self.directory / fingerprint
+
+    def __contains__(self, fingerprint: str) -> bool:
+        return (self.path(fingerprint) / "meta.json").exists()
+
+    def save(
+        self,
+        fingerprint: str,
+        df_clean: pd.DataFrame,
+        text_columns: Union[List[str], str],
+        settings: Dict[str, Any],
+        documents: Optional[Dict[str, DocumentColumn]] = None,
+    ) -> Path:
+        """
+        Save preprocessed data. The entry is written to a temporary directory
+        and then renamed, so an interrupted save never leaves a partial entry.
+
+        Args:
+            fingerprint (str): The fingerprint from corpus_fingerprint
+            df_clean (pd.DataFrame): The preprocessed data
+            text_columns (list, str): The cleaned text columns
+            settings (dict): The settings from preprocessing_settings
+            documents (dict, optional): The cleaned text columns with their
+                                        sentences, keyed by column, if already
+                                        found, e.g. Radex.documents. Defaults
+                                        to None.
+
+        Raises:
+            ValueError: If a column of documents does not have a report for
+                each row
+
+        Returns:
+            Path: The directory of the entry
+        """
+        if isinstance(text_columns, str):
+            text_columns = [text_columns]
+
+        documents = dict(documents or {})
+        for col in text_columns:
+            if col not in documents:
+                documents[col] = DocumentColumn.from_series(df_clean[col])
+            elif len(documents[col]) != len(df_clean):
+                raise ValueError(
+                    f"documents of {col} must have a report for each row"
+                )
+
+        target = self.path(fingerprint)
+        temporary = self.directory / f".{fingerprint}.{os.getpid()}.tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        temporary.mkdir(parents=True)
+
+        prefixes = {}
+        for i, col in enumerate(text_columns):
+            prefixes[col] = str(i)
+            _save_column(temporary, prefixes[col], documents[col])
+        df_clean.drop(columns=text_columns).to_pickle(temporary / "frame.pkl")
+
+        meta = {
+            "version": STORE_VERSION,
+            "fingerprint": fingerprint,
+            "settings": settings,
+            "rows": len(df_clean),
+            "columns": list(df_clean.columns),
+            "text_columns": prefixes,
+            "text_dtypes": {
+                col: str(df_clean[col].dtype) for col in text_columns
+            },
+        }
+        with open(temporary / "meta.json", "w", encoding="utf-8") as wfile:
+            json.dump(meta, wfile, indent=2)
+
+        if fingerprint in self:
+            # saved by another process in the meantime
+            shutil.rmtree(temporary)
+        else:
+            shutil.rmtree(target, ignore_errors=True)
+            os.replace(temporary, target)
+        return target
+
+    def meta(self, fingerprint: str) -> Dict[str, Any]:
+        """
+        Read the description of an entry.
+
+        Args:
+            fingerprint (str): The fingerprint from corpus_fingerprint
+
+        Raises:
+            ValueError: If there is no entry for the fingerprint
+
+        Returns:
+            dict: The contents of meta.json
+        """
+        if fingerprint not in self:
+            raise ValueError(
+                f"No preprocessed data in {self.directory} for {fingerprint}"
+            )
+        with open(
+            self.path(fingerprint) / "meta.json", encoding="utf-8"
+        ) as rfile:
+            return json.load(rfile)
+
+    def open_column(self, fingerprint: str, column: str) -> StoredColumn:
+        """
+        Memory-map a text column of an entry, without decoding it.
+
+        Args:
+            fingerprint (str): The fingerprint from corpus_fingerprint
+            column (str): The text column
+
+        Raises:
+            ValueError: If there is no entry for the fingerprint, or the column
+                was not cleaned
+
+        Returns:
+            StoredColumn: The column
+        """
+        prefixes = self.meta(fingerprint)["text_columns"]
+        if column not in prefixes:
+            raise ValueError(f"{column} is not a text column of {fingerprint}")
+        return StoredColumn(self.path(fingerprint), prefixes[column])
+
+    def load(self, fingerprint: str) -> pd.DataFrame:
+        """
+        Load preprocessed data. The text columns are backed by the
+        memory-mapped files where their dtype allows, see
+        StoredColumn.to_series, so the reports are not all decoded at once.
+
+        Args:
+            fingerprint (str): The fingerprint from corpus_fingerprint
+
+        Raises:
+            ValueError: If there is no entry for the fingerprint
+
+        Returns:
+            pd.DataFrame: The preprocessed data, as saved
+        """
+        meta = self.meta(fingerprint)
+
+        df_clean = pd.read_pickle(self.path(fingerprint) / "frame.pkl")
+        for col, column in self.documents(fingerprint).items():
+            df_clean[col] = column.to_series(
+                df_clean.index, meta["text_dtypes"][col]
+            )
+
+        return df_clean[meta["columns"]]
+
+    def documents(self, fingerprint: str) -> Dict[str, StoredColumn]:
+        """
+        Memory-map every text column of an entry. The reports and their
+        sentences are read from the files when accessed, e.g. by
+        StoredColumn.document.
+
+        Args:
+            fingerprint (str): The fingerprint from corpus_fingerprint
+
+        Raises:
+            ValueError: If there is no entry for the fingerprint
+
+        Returns:
+            dict: The text columns, keyed by column name
+        """
+        directory = self.path(fingerprint)
+        return {
+            col: StoredColumn(directory, prefix)
+            for col, prefix in self.meta(fingerprint)["text_columns"].items()
+        }
@@ -0,0 +1,108 @@
+# fmt: off
+# pylint: disable=redefined-outer-name
+# pylint: disable=line-too-long
+
+"""Tests for radex.cache"""
+
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from radex.cache import PreprocessingCache, SentenceCache, cache_key
+from radex.preprocessing import clean_dataframe
+
+DATA_FILE = Path(__file__).parent.parent.parent / "data" / "synthetic_ultrasound_reports" / "ex_usreports_validation.csv"
+
+@pytest.fixture
+def cache(tmp_path):
+    """Open an empty cache"""
+    with PreprocessingCache(tmp_path / 'cache.sqlite') as opened:
+        yield opened
+
+def test_get_and_put(cache):
+    """Entries are found by key, and lookups are counted"""
+    key_a, key_b = cache_key(b'settings', 'Report A'), cache_key(b'settings', 'Report B')
+    assert key_a != cache_key(b'other settings', 'Report A')
+
+    assert not cache.get_many([key_a, key_b])
+    cache.put_many({key_a: 'report a'})
+    assert cache.get_many([key_a, key_b, key_a]) == {key_a: 'report a'}
+    assert len(cache) == 1
+    assert cache.size == 16 + len('report a')
+    assert (cache.stats.hits, cache.stats.misses) == (1, 3)
+    assert cache.stats.hit_rate == 0.25
+
+def test_eviction(tmp_path):
+    """The least recently used entries are evicted when the cache is too large"""
+    keys = [cache_key(b'', str(i)) for i in range(4)]
+    with PreprocessingCache(tmp_path / 'cache.sqlite', max_bytes=3 * 20) as cache:
+        cache.put_many({keys[0]: 'zero', keys[1]: 'four'})
+        cache.put_many({keys[2]: 'four'})
+        cache.get_many([keys[0]])  # keys[1] is now the least recently used
+        cache.put_many({keys[3]: 'four'})
+        assert set(cache.get_many(keys)) == {keys[0], keys[2], keys[3]}
+        assert cache.stats.evictions == 1
+
+    with PreprocessingCache(tmp_path / 'cache.sqlite') as cache:
+        assert len(cache) == 3  # entries persist between sessions
+
+    with pytest.raises(ValueError):
+        PreprocessingCache(tmp_path / 'cache.sqlite', max_bytes=-1)
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_clean_dataframe_with_cache(cache, workers):
+    """Cleaning with the cache gives the same result, and only cleans new reports"""
+    df = pd.read_csv(DATA_FILE)
+    df = pd.concat([df, df.iloc[:3], pd.DataFrame({'report': [np.nan]})], ignore_index=True)
+    settings = {'drop_nulls': True, 'drop_negatives': 'negex', 'drop_stopwords': 'nltk'}
+    expected = clean_dataframe(df.copy(), 'report', **settings)
+
+    first = clean_dataframe(df.iloc[:30].copy(), 'report', cache=cache, workers=workers, **settings)
+    assert first.equals(expected.iloc[:30])
+    assert (cache.stats.hits, cache.stats.misses) == (0, 30)
+
+    result = clean_dataframe(df.copy(), 'report', cache=cache, workers=workers, **settings)
+    assert result.equals(expected)
+    assert cache.stats.hits == 30
+    assert len(cache) == df['report'].nunique()  # missing reports are not cached
+
+    # Different settings are cached separately
+    clean_dataframe(df.iloc[:30].copy(), 'report', cache=cache, drop_negatives='negex')
+    assert cache.stats.hits == 30
+
+def test_clean_dataframe_with_cache_missing(tmp_path):
+    """Missing reports are cleaned as without the cache, and not cached"""
+    df = pd.DataFrame({'report': ['Hello  World!', np.nan, 'Hello  World!', None]}, index=[3, 1, 2, 0])
+    expected = clean_dataframe(df.copy(), 'report', drop_stopwords=['hello'])
+    result = clean_dataframe(df.copy(), 'report', drop_stopwords=['hello'], cache=tmp_path / 'cache.sqlite')
+    assert result.equals(expected)
+    with PreprocessingCache(tmp_path / 'cache.sqlite') as cache:
+        assert len(cache) == 1
+
+def test_sentence_cache():
+    """Sentences are evicted least recently used first, and lookups are counted"""
+    cache = SentenceCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now least recently used
+    cache.put('c', 3)
+    assert cache.get('b') is None and cache.get('c') == 3 and len(cache) == 2
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (2, 1, 1)
+
+    disabled = SentenceCache(maxsize=0)
+    disabled.put('a', 1)
+    assert disabled.get('a', 'missing') == 'missing' and len(disabled) == 0
+    with pytest.raises(ValueError):
+        SentenceCache(maxsize=-1)
+
+def test_sentence_cache_pickle():
+    """A pickled copy, e.g. sent to a worker process, starts empty"""
+    cache = SentenceCache(maxsize=5)
+    cache.put('a', 1)
+    cache.get('a')
+    copied = pickle.loads(pickle.dumps(cache))
+    assert copied.maxsize == 5 and len(copied) == 0 and copied.stats.hits == 0
+    assert cache.get('a') == 1
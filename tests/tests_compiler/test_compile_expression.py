@@ -0,0 +1,148 @@
+# fmt: off
+# pylint: disable=line-too-long
+
+"""Test the compile_expression function from radex.compiler"""
+
+import pandas as pd
+import pytest
+
+from radex.compiler import AndNode, NotNode, OrNode, TermNode, compile_expression
+from radex.dfsearch import evaluate_logical_statement
+from radex.expression import Expression
+from radex.radexpressions import string_search
+
+CANDIDATES = [
+    "the quick brown fox jumps over the lazy dog",
+    "the quick brown dog. the slow pink cat",
+    "normal thyroid. no nodules",
+    "multinodular goitre with thyroid cysts",
+    "",
+]
+
+EXPRESSIONS = [
+    "quick",
+    "quick brown",
+    "qui*",
+    "colo?r",
+    "quick ~2 fox",
+    "fox ~~2 quick",
+    "quick & dog",
+    "quick | badger",
+    "¬badger",
+    "¬(quick | cat)",
+    "quick & ¬(dog | cat) | slow",
+    "(¬a | pink) & cat",
+    "thyroid & (nodul* | thyroid~~4node)",
+    "multi?nodul* | mng | nodules | thyroid~~2cysts | thyroid ~~2 nodes",
+    "goit?r? | mng | enlarge*~~3thyroid",
+    "¬¬quick",
+]
+
+@pytest.fixture
+def _expression():
+    """Create an instance of the Expression class"""
+    return Expression()
+
+@pytest.mark.parametrize("expression", EXPRESSIONS)
+def test_compile_expression_matches_evaluate_logical_statement(_expression, expression):
+    """The compiled plan gives the same result as evaluate_logical_statement"""
+    parsed = _expression.parse_string(expression)
+    plan = compile_expression(parsed)
+    for candidate in CANDIDATES:
+        assert plan.evaluate(candidate) == evaluate_logical_statement(candidate, parsed)
+
+@pytest.mark.parametrize("expression", EXPRESSIONS)
+def test_compile_expression_evaluate_column(_expression, expression):
+    """Evaluating a whole column gives the same result as evaluating each candidate"""
+    plan = compile_expression(_expression.parse_string(expression))
+    result = plan.evaluate_column(pd.Series(CANDIDATES), memo={})
+    assert result.tolist() == [plan.evaluate(candidate) for candidate in CANDIDATES]
+
+def test_compile_expression_sentence_safe():
+    """Terms which cannot match across sentences are searched in the whole candidate"""
+    assert compile_expression("quick brown").sentence_safe
+    assert compile_expression("qui*").sentence_safe
+    assert not compile_expression("colo?r").sentence_safe
+    assert not compile_expression("quick ~2 fox").sentence_safe
+
+def test_compile_expression_structure(_expression):
+    """The parsed list is converted to a tree of nodes"""
+    plan = compile_expression(_expression.parse_string("a & ¬b | c"))
+    assert isinstance(plan, OrNode)
+    assert isinstance(plan.operands[1], AndNode)
+    assert isinstance(plan.operands[1].operands[1], NotNode)
+    assert [term.expression for term in plan.terms()] == ["c", "a", "b"]
+
+def test_compile_expression_cost_order(_expression):
+    """Operands are ordered literal < wildcard < proximity, keeping the order of ties"""
+    plan = compile_expression(_expression.parse_string("thyroid~~4node | nodul* | thyroid | mng"))
+    assert [term.kind for term in plan.terms()] == ["literal", "literal", "wildcard", "proximity"]
+    assert [term.expression for term in plan.terms()] == ["thyroid", "mng", "nodul*", "thyroid~~4node"]
+
+class _CountingNode(TermNode):
+    """Term which records how many times it was evaluated"""
+    calls = 0
+
+    def search(self, candidate):
+        _CountingNode.calls += 1
+        return super().search(candidate)
+
+def test_compile_expression_short_circuit():
+    """AND stops at the first False operand and OR at the first True operand"""
+    term = TermNode.from_expression("thyroid~~4node")
+    counting = _CountingNode(regex=term.regex, expression=term.expression, pattern=term.pattern)
+    absent = compile_expression("thyroid")
+    present = compile_expression("nodule")
+
+    _CountingNode.calls = 0
+    assert AndNode((absent, counting)).evaluate("nodule") is False
+    assert OrNode((present, counting)).evaluate("nodule") is True
+    assert _CountingNode.calls == 0
+
+    assert AndNode((present, counting)).evaluate("nodule") is False
+    assert _CountingNode.calls == 1
+
+def test_compile_expression_term():
+    """A single term holds the compiled regex"""
+    term = compile_expression("colo?r ")
+    assert isinstance(term, TermNode)
+    assert term.regex == r"\bcolo.?r\b"
+    assert term.pattern.pattern == term.regex
+    assert term == compile_expression(" colo?r")
+
+def test_compile_expression_invalid():
+    """Invalid expressions raise a ValueError"""
+    with pytest.raises(ValueError):
+        compile_expression(54)
+    with pytest.raises(ValueError):
+        compile_expression(["quick", "&"])
+    with pytest.raises(ValueError):
+        compile_expression(["quick", "brown"])
+    with pytest.raises(ValueError):
+        compile_expression("&")
+
+def test_compile_expression_prefilter():
+    """Terms are only searched for in candidates containing their literal fragments"""
+    term = compile_expression("thyroid~~2cyst*")
+    assert term.literals == ("thyroid", "cyst")
+    assert term.may_match("thyroid with cysts")
+    assert not term.may_match("thyroid with nodules")
+    candidates = pd.Series(["thyroid with cysts", "cyst", "cystic thyroid", "thyroid nodule"])
+    assert term.prefilter(candidates).tolist() == [True, False, True, False]
+    assert compile_expression("*").prefilter(candidates).tolist() == [True, True, True, True]
+
+@pytest.mark.parametrize("expression", [
+    "quick ~2 fox", "fox ~~2 quick", "fox ~2 quick", "the ~~20 dog", "qui* ~~1 bro*",
+    "*ck ~3 *x", "_quick_ ~1 brown", "the ~~0 the", "dog ~~1 the",
+])
+def test_compile_expression_proximity_positions(expression):
+    """Proximity searches between single words are evaluated from token positions"""
+    term = compile_expression(expression)
+    assert term.proximity is not None
+    for candidate in CANDIDATES + ["the the quick quick brown fox fox. dog, the", "quick-brown fox's dog the"]:
+        assert term.search(candidate) == string_search(candidate, expression)[0]
+
+def test_compile_expression_proximity_regex():
+    """Proximity searches with other wildcards fall back to the regex"""
+    assert compile_expression("qui?k ~2 fox").proximity is None
+    assert compile_expression("quick brown ~2 fox").proximity is None
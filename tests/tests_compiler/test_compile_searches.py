@@ -0,0 +1,47 @@
+# fmt: off
+# pylint: disable=line-too-long
+
+"""Test the compile_searches function from radex.compiler"""
+
+from radex import Radex
+from radex.compiler import SearchSet, compile_expression, compile_searches
+from radex.expression import Expression
+
+CANDIDATES = [
+    "normal thyroid. no nodules",
+    "multinodular goitre with thyroid cysts",
+    "heterogeneous echotexture in keeping with thyroiditis",
+    "post op appearances following lobectomy",
+    "",
+]
+
+def test_compile_searches_shared_terms():
+    """Identical terms are shared between searches, ignoring spacing"""
+    search_set = compile_searches({
+        "Nodule": "nodul* | thyroid~~2cyst*",
+        "Cyst": "thyroid ~~2 cyst*",
+        "Goitre": "goit?r? | mng",
+        "MNG": "mng",
+    })
+    assert isinstance(search_set, SearchSet)
+    assert [term.expression for term in search_set.terms] == ["nodul*", "thyroid~~2cyst*", "mng", "goit?r?"]
+
+def test_compile_searches_memo():
+    """Each distinct term is searched at most once per candidate"""
+    search_set = compile_searches({"A": "thyroid & cyst*", "B": "thyroid | nodul*", "C": "¬thyroid"})
+    memo = {}
+    for plan in search_set.plans.values():
+        plan.evaluate("thyroid cysts", memo)
+    # 'nodul*' is never searched as 'thyroid' is found first
+    assert memo == {r"\bthyroid\b": True, r"\bcyst\w*\b": True}
+
+def test_compile_searches_matches_individual_searches():
+    """The search set gives the same results as compiling each search on its own"""
+    searches = Radex().example_searches
+    search_set = compile_searches(searches)
+    for candidate in CANDIDATES:
+        expected = {
+            name: compile_expression(Expression().parse_string(search)).evaluate(candidate)
+            for name, search in searches.items()
+        }
+        assert search_set.evaluate(candidate) == expected
@@ -4,9 +4,12 @@
 
 """Test the search_dataframe function from df_search"""
 
+import numpy as np
 import pandas as pd
 import pytest
+from radex import document
 from radex.dfsearch import search_dataframe
+from radex.document import DocumentColumn
 
 @pytest.fixture
 def sample_dataframe():
@@ -69,3 +72,88 @@ def test_search_dataframe_debug_column_option(sample_dataframe):
         {'quick': (False, [])},
         {'quick': (True, [('quick', 4, 9)])}
     ]
+
+def test_search_dataframe_negation_without_matches(sample_dataframe):
+    """Rows without any term still evaluate the expression"""
+    result = search_dataframe(sample_dataframe, 'text', [['¬', 'badger']])
+    assert result['text_matches'].tolist() == [True, True, True]
+    result = search_dataframe(sample_dataframe, 'text', [['cat', '|', ['¬', 'quick']]], sentencizer=True)
+    assert result['text_matches'].tolist() == [False, True, True]
+
+@pytest.mark.parametrize('expression', [
+    ['quick'],
+    ['the quick *'],
+    ['qu?ck'],
+    ['the ~2 quick'],
+    [['¬', 'badger']],
+    [['quick', '&', ['¬', 'cat']]],
+    [['dog', '|', ['pink', '&', 'c?t']]],
+    ['brown ~~1 d*'],
+])
+def test_search_dataframe_bitmap_engine(sample_dataframe, expression):
+    """The bitmap engine gives the same results as the row-wise engine"""
+    expected = search_dataframe(sample_dataframe.copy(), 'text', expression)
+    result = search_dataframe(sample_dataframe.copy(), 'text', expression, engine='bitmap')
+    assert result['text_matches'].tolist() == expected['text_matches'].tolist()
+
+@pytest.mark.parametrize('expression', [
+    ['quick ~10 dog'],
+    ['quick ~10 cat'],
+    [['¬', 'fox']],
+    [['cat', '|', ['¬', 'quick']]],
+    [['quick', '&', ['pink', '|', 'lazy']]],
+])
+def test_search_dataframe_bitmap_engine_sentencizer(sample_dataframe, expression):
+    """The bitmap engine evaluates the sentences of all rows together, with the same results"""
+    expected = search_dataframe(sample_dataframe.copy(), 'text', expression, sentencizer=True)
+    result = search_dataframe(sample_dataframe.copy(), 'text', expression, sentencizer=True, engine='bitmap')
+    assert result['text_matches'].tolist() == expected['text_matches'].tolist()
+
+def test_search_dataframe_bitmap_engine_sentence(sample_dataframe):
+    """Terms are not matched across sentences by the bitmap engine"""
+    result = search_dataframe(sample_dataframe, 'text', ['dog ~1 the'], engine='bitmap')
+    assert result['text_matches'].tolist() == [False, False, False]
+
+def test_search_dataframe_invalid_engine(sample_dataframe):
+    """Test an invalid engine"""
+    with pytest.raises(ValueError):
+        search_dataframe(sample_dataframe, 'text', ['quick'], engine='gpu')
+
+@pytest.mark.parametrize('engine', ['rowwise', 'bitmap'])
+def test_search_dataframe_workers(sample_dataframe, engine):
+    """Searching in worker processes gives the same results"""
+    result = search_dataframe(sample_dataframe, 'text', [['quick', '&', ['¬', 'cat']]], engine=engine, workers=2)
+    assert result['text_matches'].tolist() == [True, False, False]
+
+@pytest.mark.parametrize('engine', ['rowwise', 'bitmap'])
+@pytest.mark.parametrize('sentencizer', [False, True])
+@pytest.mark.parametrize('workers', [None, 2])
+@pytest.mark.parametrize('deduplicate', [False, True])
+def test_search_dataframe_documents(sample_dataframe, engine, sentencizer, workers, deduplicate):
+    """Searching the reports with their sentences gives the same results"""
+    df = pd.concat([sample_dataframe, sample_dataframe], ignore_index=True)
+    documents = DocumentColumn.from_series(df['text'])
+    for expression in [['quick ~10 dog'], ['quick ~10 cat'], [['dog', '|', ['pink', '&', 'c?t']]], ['brown ~~1 d*']]:
+        expected = search_dataframe(df.copy(), 'text', expression, sentencizer=sentencizer, engine=engine)
+        result = search_dataframe(df.copy(), 'text', expression, sentencizer=sentencizer, engine=engine, workers=workers, deduplicate=deduplicate, documents=documents)
+        assert result['text_matches'].tolist() == expected['text_matches'].tolist()
+
+@pytest.mark.parametrize('engine', ['rowwise', 'bitmap'])
+def test_search_dataframe_documents_not_split(sample_dataframe, engine, monkeypatch):
+    """The sentences are taken from the documents rather than splitting the reports again"""
+    documents = DocumentColumn.from_series(sample_dataframe['text'])
+    monkeypatch.setattr(document, 'SENTENCE_END', ' ')
+    result = search_dataframe(sample_dataframe.copy(), 'text', ['quick ~10 dog'], engine=engine, documents=documents)
+    assert result['text_matches'].tolist() == [False, False, True]
+    result = search_dataframe(sample_dataframe.copy(), 'text', ['quick ~10 dog'], engine=engine)
+    assert result['text_matches'].tolist() == [False, False, False]
+
+def test_search_dataframe_documents_missing(sample_dataframe):
+    """A missing report is searched as empty text, and every row needs a report"""
+    sample_dataframe.loc[1, 'text'] = np.nan
+    documents = DocumentColumn.from_series(sample_dataframe['text'])
+    result = search_dataframe(sample_dataframe.copy(), 'text', [['¬', 'nan']], documents=documents)
+    assert result['text_matches'].tolist() == [True, True, True]
+
+    with pytest.raises(ValueError):
+        search_dataframe(sample_dataframe.copy(), 'text', ['quick'], documents=documents[:2])
@@ -0,0 +1,119 @@
+# pylint: disable=redefined-outer-name
+# pylint: disable=line-too-long
+# fmt: off
+
+"""Test the search_dataframe_multiple function from df_search"""
+
+import pandas as pd
+import pytest
+from radex.cache import SentenceCache
+from radex.compiler import compile_searches
+from radex.dfsearch import search_dataframe, search_dataframe_multiple
+from radex.expression import Expression
+
+@pytest.fixture
+def sample_dataframe():
+    """Create a sample dataframe"""
+    df = pd.DataFrame({
+        'text': ['the quick brown fox',
+                 'jumps over the lazy dog',
+                 'the quick brown dog. the slow pink cat'
+                ],
+        'number': [1, 2, 3]
+    }, index=[10, 20, 30])
+    return df
+
+SEARCHES = {
+    'quick': 'quick',
+    'quick_dog': 'quick ~10 dog',
+    'quick_cat': 'quick ~10 cat',
+    'not_fox': '¬fox & (quick | lazy)',
+}
+
+def test_search_dataframe_multiple(sample_dataframe):
+    """One column is created per search"""
+    result = search_dataframe_multiple(sample_dataframe, 'text', SEARCHES)
+    assert result['quick'].tolist() == [True, False, True]
+    assert result['quick_dog'].tolist() == [False, False, True]
+    assert result['not_fox'].tolist() == [False, True, True]
+    assert result['not_fox'].tolist() == [False, True, True]
+    assert result.index.tolist() == [10, 20, 30]
+
+def test_search_dataframe_multiple_sentencizer(sample_dataframe):
+    """Searching each sentence independently"""
+    result = search_dataframe_multiple(sample_dataframe, 'text', compile_searches(SEARCHES), sentencizer=True)
+    assert result['quick_dog'].tolist() == [False, False, True]
+    assert result['not_fox'].tolist() == [False, True, True]
+
+@pytest.mark.parametrize("sentencizer", [False, True])
+def test_search_dataframe_multiple_matches_search_dataframe(sample_dataframe, sentencizer):
+    """Results match searching each expression individually"""
+    result = search_dataframe_multiple(sample_dataframe.copy(), 'text', SEARCHES, sentencizer=sentencizer)
+    for name, search in SEARCHES.items():
+        expected = search_dataframe(sample_dataframe.copy(), 'text', Expression().parse_string(search), sentencizer=sentencizer)
+        assert result[name].tolist() == expected['text_matches'].tolist()
+
+@pytest.mark.parametrize("sentencizer", [False, True])
+def test_search_dataframe_multiple_workers(sample_dataframe, sentencizer):
+    """Searching in worker processes gives the same results, with the original index"""
+    expected = search_dataframe_multiple(sample_dataframe.copy(), 'text', SEARCHES, sentencizer=sentencizer)
+    result = search_dataframe_multiple(sample_dataframe.copy(), 'text', SEARCHES, sentencizer=sentencizer, workers=2)
+    assert result.equals(expected)
+
+@pytest.mark.parametrize("sentencizer", [False, True])
+def test_search_dataframe_multiple_deduplicate(sample_dataframe, sentencizer):
+    """Searching each distinct text once gives the same results for every row"""
+    df = pd.concat([sample_dataframe, sample_dataframe.iloc[::-1], pd.DataFrame({'text': [None, float('nan')]})])
+    expected = search_dataframe_multiple(df.copy(), 'text', SEARCHES, sentencizer=sentencizer)
+    result = search_dataframe_multiple(df.copy(), 'text', SEARCHES, sentencizer=sentencizer, deduplicate=True)
+    assert result.equals(expected)
+
+@pytest.mark.parametrize("engine", ["rowwise", "bitmap"])
+def test_search_dataframe_deduplicate(sample_dataframe, engine):
+    """search_dataframe can also search each distinct text once"""
+    df = pd.concat([sample_dataframe, sample_dataframe.iloc[::-1]])
+    expression = Expression().parse_string('quick ~10 dog | lazy')
+    expected = search_dataframe(df.copy(), 'text', expression, engine=engine)
+    result = search_dataframe(df.copy(), 'text', expression, engine=engine, deduplicate=True)
+    assert result.equals(expected)
+
+def test_search_dataframe_sentence_cache(sample_dataframe):
+    """A sentence cache shared between calls gives the same results, searching each distinct sentence once"""
+    df = pd.concat([sample_dataframe, sample_dataframe], ignore_index=True)
+    expected = search_dataframe_multiple(df.copy(), 'text', SEARCHES, sentencizer=True)
+    cache = SentenceCache()
+    result = search_dataframe_multiple(df.copy(), 'text', SEARCHES, sentencizer=True, sentence_cache=cache)
+    assert result.equals(expected)
+    assert len(cache) == 4 and cache.stats.misses == 4
+
+    # The terms found are shared with search_dataframe, keyed by regex
+    result = search_dataframe(df.copy(), 'text', Expression().parse_string('quick ~10 cat'), sentencizer=True, sentence_cache=cache)
+    assert result['text_matches'].tolist() == expected['quick_cat'].tolist()
+    assert cache.stats.misses == 4
+
+def test_search_dataframe_report_cache(sample_dataframe):
+    """Without the sentencizer, the terms found are cached for each distinct report"""
+    df = pd.concat([sample_dataframe, sample_dataframe], ignore_index=True)
+    expected = search_dataframe_multiple(df.copy(), 'text', SEARCHES, sentence_cache=SentenceCache(0))
+    cache = SentenceCache()
+    result = search_dataframe_multiple(df.copy(), 'text', SEARCHES, sentence_cache=cache)
+    assert result.equals(expected)
+    assert len(cache) == 3 and cache.stats.misses == 3 and cache.stats.hits == 3
+
+    result = search_dataframe(df.copy(), 'text', Expression().parse_string('quick ~10 cat'), sentence_cache=cache)
+    assert result['text_matches'].tolist() == expected['quick_cat'].tolist()
+    assert cache.stats.misses == 3
+
+@pytest.mark.parametrize("sentencizer", [False, True])
+@pytest.mark.parametrize("workers", [None, 2])
+def test_search_dataframe_multiple_bitmap_engine(sample_dataframe, sentencizer, workers):
+    """The bitmap engine gives the same results as the row-wise engine"""
+    df = pd.concat([sample_dataframe, pd.DataFrame({'text': ['', '. quick cat.', None]})])
+    expected = search_dataframe_multiple(df.copy(), 'text', SEARCHES, sentencizer=sentencizer)
+    result = search_dataframe_multiple(df.copy(), 'text', SEARCHES, sentencizer=sentencizer, engine='bitmap', workers=workers)
+    assert result.equals(expected)
+
+def test_search_dataframe_multiple_invalid_engine(sample_dataframe):
+    """Test an invalid engine"""
+    with pytest.raises(ValueError):
+        search_dataframe_multiple(sample_dataframe, 'text', SEARCHES, engine='gpu')
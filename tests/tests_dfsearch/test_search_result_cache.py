@@ -0,0 +1,88 @@
+# fmt: off
+# pylint: disable=line-too-long
+
+"""Test the SearchResultCache class from radex.dfsearch"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from radex import Radex
+from radex.dfsearch import SearchResultCache, search_dataframe_multiple
+
+DATA_FILE = Path(__file__).parent.parent.parent / "data" / "synthetic_ultrasound_reports" / "ex_usreports_validation.csv"
+
+SEARCHES = {
+    "Nodule": "nodul* | thyroid~~4node",
+    "Goitre": "goit?r? | mng | enlarge*~~3thyroid",
+    "Normal": "normal~2thyroid",
+}
+
+def test_only_changed_searches_are_evaluated():
+    """Edited, added and renamed searches give the same results as searching from scratch"""
+    df = pd.DataFrame({"report": ["normal thyroid", "thyroid nodule. mng", "enlarged thyroid", np.nan]}, index=[4, 3, 2, 1])
+    cache = SearchResultCache()
+
+    cache.search(df, "report", SEARCHES)
+    assert cache.evaluated == ["Nodule", "Goitre", "Normal"]
+
+    edited = {**SEARCHES, "Goitre": "goit?r? | mng", "Renamed": SEARCHES["Normal"], "Cyst": "thyroid~~4node & ¬normal"}
+    del edited["Normal"]
+    result = cache.search(df, "report", edited)
+    assert cache.evaluated == ["Goitre", "Cyst"]
+
+    expected = search_dataframe_multiple(df[["report"]].copy(), "report", edited)
+    assert result.equals(expected)
+
+    cache.search(df, "report", edited)
+    assert not cache.evaluated
+
+def test_terms_are_reused():
+    """Terms evaluated for an earlier changed search are not searched for again"""
+    df = pd.DataFrame({"report": ["thyroid nodule", "normal thyroid"]})
+    cache = SearchResultCache()
+    cache.search(df, "report", {"A": "thyroid"})
+    cache.search(df, "report", {"A": "thyroid", "B": "nodul* & thyroid"})
+    terms = dict(cache.terms)
+    cache.search(df, "report", {"A": "thyroid", "B": "nodul* & thyroid", "C": "nodul* | normal"})
+    assert all(cache.terms[regex] is values for regex, values in terms.items())
+    assert cache.search(df, "report", {"C": "nodul* | normal"})["C"].tolist() == [True, True]
+
+def test_new_dataframe_clears_cache():
+    """Searching a different dataframe evaluates every search again"""
+    cache = SearchResultCache()
+    cache.search(pd.DataFrame({"report": ["thyroid"]}), "report", SEARCHES)
+    result = cache.search(pd.DataFrame({"report": ["goitre"]}), "report", SEARCHES)
+    assert cache.evaluated == list(SEARCHES)
+    assert result["Goitre"].tolist() == [True]
+
+def test_radex_run_searches_incremental():
+    """Rerunning after editing one search only evaluates that search"""
+    radex = Radex()
+    radex.read_data(DATA_FILE)
+    radex.preprocess_data()
+    radex.searches = dict(radex.example_searches)
+    radex.run_searches()
+
+    radex.searches["Goitre"] = "goit?r? | mng"
+    output = radex.run_searches().copy()
+    assert radex.search_cache.evaluated == ["Goitre"]
+
+    radex.preprocess_data()
+    expected = radex.run_searches()
+    assert radex.search_cache.evaluated == list(radex.searches)
+    assert output.equals(expected)
+
+def test_deduplicate():
+    """Searching distinct texts gives the same results, also when switching modes"""
+    df = pd.DataFrame({"report": ["thyroid nodule", "normal thyroid", "thyroid nodule", np.nan]})
+    expected = search_dataframe_multiple(df[["report"]].copy(), "report", {**SEARCHES, "Thyroid": "thyroid & ¬normal"})
+    cache = SearchResultCache()
+    cache.search(df, "report", SEARCHES, deduplicate=True)
+    result = cache.search(df, "report", {**SEARCHES, "Thyroid": "thyroid & ¬normal"}, deduplicate=True)
+    assert all(len(values) == 3 for values in cache.terms.values())
+    assert result.equals(expected)
+
+    cache.search(df, "report", {"Other": "nodul*"})
+    assert all(len(values) == 4 for values in cache.terms.values())
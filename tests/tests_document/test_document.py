@@ -0,0 +1,110 @@
+# fmt: off
+# pylint: disable=line-too-long
+
+"""Tests for radex.document"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from radex.compiler import compile_searches
+from radex.document import Document, DocumentColumn, SentenceTable, as_document
+from radex.radexpressions import evaluate_regex, get_regex
+
+TEXTS = [
+    "normal thyroid.  no nodules. ",
+    "left lobe 1.4 cm. thyroid cyst",
+    "...",
+    "",
+    "  single sentence  ",
+]
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_document(text):
+    """Sentences are split as by str.split, and spans exclude whitespace and empty sentences"""
+    document = Document(text)
+    assert document.sentences == text.split(".")
+    assert [text[start:end] for start, end in document.spans] == [s.strip() for s in text.split(".") if s.strip()]
+    assert str(document) == text and len(document) == len(text)
+
+def test_document_tokens():
+    """The tokens of each sentence are found once"""
+    document = Document("normal thyroid.  no nodules. ")
+    assert document.spans == [(0, 14), (17, 27)]
+    tokens = document.tokens((17, 27))
+    assert tokens == ['no', 'nodules']
+    assert document.tokens((17, 27)) is tokens
+
+def test_as_document():
+    """A document is not wrapped again"""
+    document = as_document("normal thyroid")
+    assert isinstance(document, Document) and as_document(document) is document
+    assert Document("a. b", ["a", " b"]).sentences == ["a", " b"]
+
+def test_sentence_table():
+    """Every sentence of every report is a row of the table, and is reduced back to its report"""
+    table = SentenceTable(pd.Series(TEXTS, index=[5, 4, 3, 2, 1]))
+    assert table.sentences.tolist() == [sentence for text in TEXTS for sentence in text.split('.')]
+    assert table.report_ids.tolist() == [0, 0, 0, 1, 1, 1, 2, 2, 2, 2, 3, 4]
+    assert table.sentence_ids.tolist() == [0, 1, 2, 0, 1, 2, 0, 1, 2, 3, 0, 0]
+    assert table.any(table.sentences.str.contains('thyroid').to_numpy()).tolist() == [True, True, False, False, False]
+    assert len(SentenceTable(pd.Series([], dtype=object))) == 0
+    assert SentenceTable(pd.Series([], dtype=object)).any(np.zeros(0, dtype=bool)).tolist() == []
+
+def test_document_column():
+    """The sentences of each report are the same as from str.split, also for non ASCII reports"""
+    reports = pd.Series(TEXTS + ["écho: nodule. stable.", np.nan, 5], index=range(10, 18))
+    documents = DocumentColumn.from_series(reports)
+    assert len(documents) == 8
+    assert documents.lengths().tolist() == [len(text.encode()) for text in TEXTS] + [22, 0, 0]
+    for i, report in enumerate(reports):
+        if isinstance(report, str):
+            assert documents[i] == report
+            assert documents.sentences(i) == report.split('.')
+            assert documents.document(i).sentences == report.split('.')
+            assert documents.document(i).spans == Document(report).spans
+        else:
+            assert np.isnan(documents[i]) and documents.sentences(i) == []
+            assert documents.document(i).text == '' and documents.document(i).sentences == ['']
+    assert [document.text for document in documents] == documents.texts().tolist()
+    assert documents.to_series().iloc[:6].tolist() == reports.iloc[:6].tolist()
+
+    decoded = DocumentColumn(documents.text, documents.offsets, documents.missing, documents.stops)
+    assert [decoded.sentences(i) for i in range(8)] == [documents.sentences(i) for i in range(8)]
+    assert decoded.to_series().iloc[:6].tolist() == reports.iloc[:6].tolist()
+
+@pytest.mark.parametrize('positions', [slice(1, 6), slice(4, 8), slice(3, 3), slice(0, 8, 3)])
+def test_document_column_slice_and_take(positions):
+    """Slices and taken rows keep the sentences of their reports"""
+    reports = pd.Series(TEXTS + ["écho: nodule. stable.", np.nan, "cyst. cm"])
+    documents = DocumentColumn.from_series(reports)
+    rows = list(range(8))[positions]
+    for part in [documents[positions], documents.take(np.array(rows[::-1], dtype=int))[::-1]]:
+        assert len(part) == len(rows)
+        assert [part.sentences(i) for i in range(len(part))] == [documents.sentences(i) for i in rows]
+        assert part.missing.tolist() == [documents.missing[i] for i in rows]
+
+def test_sentence_table_document_column():
+    """The sentences of a DocumentColumn are taken as found"""
+    expected = SentenceTable(pd.Series(TEXTS))
+    table = SentenceTable(DocumentColumn.from_series(pd.Series(TEXTS)))
+    assert table.sentences.tolist() == expected.sentences.tolist()
+    assert table.report_ids.tolist() == expected.report_ids.tolist()
+    assert table.sentence_ids.tolist() == expected.sentence_ids.tolist()
+
+SEARCHES = {
+    'nodule': 'nodul* | thyroid~~2cyst*',
+    'cyst': 'thyroid~~2cyst* & ¬lobe',
+    'size': 'lobe ~3 cm',
+    'not_nodule': 'cm & ¬nodul?',
+}
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_searches_with_document(text):
+    """Searching a document gives the same results as searching its text"""
+    search_set = compile_searches(SEARCHES)
+    assert search_set.evaluate(Document(text)) == search_set.evaluate(text)
+    assert search_set.scan(Document(text)) == search_set.scan(text)
+    for term in search_set.terms:
+        assert term.search(Document(text)) == term.search(text)
+        assert evaluate_regex(Document(text), get_regex(term.expression)) == evaluate_regex(text, get_regex(term.expression))
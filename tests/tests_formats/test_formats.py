@@ -0,0 +1,132 @@
+# fmt: off
+# pylint: disable=redefined-outer-name
+# pylint: disable=line-too-long
+
+"""Tests for radex.formats"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from radex.formats import TableWriter, file_format, iter_table_chunks, read_schema, read_table, write_table
+
+@pytest.fixture
+def sample_dataframe():
+    """Create a sample dataframe"""
+    return pd.DataFrame({
+        'report': ['normal thyroid', 'thyroid nodule', np.nan, 'goitre', 'mng'],
+        'label': [1, 2, 3, 4, 5],
+        'Thyroid_mention': [True, True, False, False, False],
+    })
+
+def test_file_format():
+    """The format is chosen from the file extension"""
+    assert file_format('reports.csv') == 'csv'
+    assert file_format('reports.PARQUET') == 'parquet'
+    assert file_format('reports.feather') == 'arrow'
+    with pytest.raises(ValueError):
+        file_format('reports.xlsx')
+
+def test_csv(sample_dataframe, tmp_path):
+    """Read and write csv files, with column projection and chunks"""
+    write_table(sample_dataframe, tmp_path / 'reports.csv')
+    assert read_table(tmp_path / 'reports.csv').equals(pd.read_csv(tmp_path / 'reports.csv'))
+    assert read_table(tmp_path / 'reports.csv', columns=['label']).columns.tolist() == ['label']
+    chunks = list(iter_table_chunks(tmp_path / 'reports.csv', 2))
+    assert [chunk.index.tolist() for chunk in chunks] == [[0, 1], [2, 3], [4]]
+
+@pytest.mark.parametrize('suffix', ['.parquet', '.arrow'])
+def test_parquet_and_arrow(sample_dataframe, tmp_path, suffix):
+    """Parquet and Arrow files keep dtypes, and can be read by column and in chunks"""
+    pytest.importorskip('pyarrow')
+    file_path = tmp_path / ('reports' + suffix)
+    write_table(sample_dataframe, file_path)
+
+    result = read_table(file_path)
+    assert result['Thyroid_mention'].dtype == bool
+    assert result['label'].tolist() == [1, 2, 3, 4, 5]
+    assert result['report'].isna().tolist() == [False, False, True, False, False]
+    assert read_table(file_path, columns=['report']).columns.tolist() == ['report']
+
+    chunks = list(iter_table_chunks(file_path, 2, columns=['report', 'label']))
+    assert [chunk.index.tolist() for chunk in chunks] == [[0, 1], [2, 3], [4]]
+    assert pd.concat(chunks)['label'].tolist() == [1, 2, 3, 4, 5]
+
+@pytest.mark.parametrize('suffix', ['.csv', '.parquet', '.arrow'])
+def test_table_writer(sample_dataframe, tmp_path, suffix):
+    """Chunks are appended to the file, as row groups for Parquet files"""
+    if suffix != '.csv':
+        pytest.importorskip('pyarrow')
+    file_path = tmp_path / ('reports' + suffix)
+    writer = TableWriter(file_path)
+    writer.write(sample_dataframe.iloc[:2])
+    writer.write(sample_dataframe.iloc[2:])
+    writer.close()
+
+    assert writer.rows == 5
+    result = read_table(file_path)
+    assert result['label'].tolist() == [1, 2, 3, 4, 5]
+    assert result['Thyroid_mention'].tolist() == [True, True, False, False, False]
+
+@pytest.mark.parametrize('suffix', ['.csv', '.parquet', '.arrow'])
+def test_iter_table_chunks_start(sample_dataframe, tmp_path, suffix):
+    """Rows before the start are skipped, and the index counts from the start of the file"""
+    if suffix != '.csv':
+        pytest.importorskip('pyarrow')
+    file_path = tmp_path / ('reports' + suffix)
+    writer = TableWriter(file_path)
+    writer.write(sample_dataframe.iloc[:2])
+    writer.write(sample_dataframe.iloc[2:])
+    writer.close()
+
+    chunks = list(iter_table_chunks(file_path, 2, start=3))
+    assert pd.concat(chunks)['label'].tolist() == [4, 5]
+    assert pd.concat(chunks).index.tolist() == [3, 4]
+
+def test_table_writer_append(sample_dataframe, tmp_path):
+    """Appending to a csv file does not repeat the header"""
+    write_table(sample_dataframe.iloc[:2], tmp_path / 'reports.csv')
+    writer = TableWriter(tmp_path / 'reports.csv', append=True)
+    writer.write(sample_dataframe.iloc[2:])
+    writer.close()
+    assert read_table(tmp_path / 'reports.csv')['label'].tolist() == [1, 2, 3, 4, 5]
+
+    with pytest.raises(ValueError):
+        TableWriter(tmp_path / 'reports.parquet', append=True)
+
+@pytest.mark.parametrize('suffix', ['.csv', '.parquet', '.arrow'])
+def test_read_schema(sample_dataframe, tmp_path, suffix):
+    """Parquet and Arrow files keep their types, csv columns take the types of the first chunk"""
+    pyarrow = pytest.importorskip('pyarrow')
+    file_path = tmp_path / ('reports' + suffix)
+    write_table(sample_dataframe, file_path)
+
+    schema = read_schema(file_path, columns=['report', 'label'])
+    assert schema.names == ['report', 'label']
+    assert pyarrow.types.is_string(schema.field('report').type) or pyarrow.types.is_large_string(schema.field('report').type)
+    assert schema.field('label').type == pyarrow.int64()
+
+def test_read_schema_csv_chunks(tmp_path):
+    """Every chunk of a csv file is read with the types of the first chunk"""
+    pyarrow = pytest.importorskip('pyarrow')
+    (tmp_path / 'reports.csv').write_text('count,size,flag,note\n1,1.5,True,\n2,2.0,False,\n,3.0,,seen\n4,,True,7\n')
+
+    schema = read_schema(tmp_path / 'reports.csv', chunksize=2)
+    assert schema.types == [pyarrow.int64(), pyarrow.float64(), pyarrow.bool_(), pyarrow.string()]
+
+    chunks = list(iter_table_chunks(tmp_path / 'reports.csv', 2, schema=schema))
+    assert [str(dtype) for dtype in chunks[1].dtypes] == ['Int64', 'float64', 'boolean', 'str']
+    assert chunks[1]['count'].isna().tolist() == [True, False]
+    assert chunks[1]['note'].tolist() == ['seen', '7']
+
+def test_table_writer_schema(tmp_path):
+    """The given types are used for columns which are missing in the first chunk"""
+    pyarrow = pytest.importorskip('pyarrow')
+    writer = TableWriter(tmp_path / 'notes.parquet', schema=pyarrow.schema([('note', pyarrow.string())]))
+    writer.write(pd.DataFrame({'note': [np.nan, np.nan], 'label': [1, 2]}))
+    writer.write(pd.DataFrame({'note': ['seen', 'ok'], 'label': [3, 4]}))
+    writer.close()
+
+    result = read_table(tmp_path / 'notes.parquet')
+    assert result['note'].fillna('').tolist() == ['', '', 'seen', 'ok']
+    assert result['label'].tolist() == [1, 2, 3, 4]
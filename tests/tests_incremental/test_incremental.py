@@ -0,0 +1,121 @@
+# fmt: off
+# pylint: disable=redefined-outer-name
+# pylint: disable=line-too-long
+
+"""Tests for radex.incremental"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from radex import Radex
+from radex.incremental import IncrementalState, run_incremental
+from radex.pipeline import run_pipeline
+
+DATA_FILE = Path(__file__).parent.parent.parent / "data" / "synthetic_ultrasound_reports" / "ex_usreports_validation.csv"
+
+@pytest.fixture
+def reports():
+    """The validation reports with repeated and missing reports"""
+    df = pd.read_csv(DATA_FILE)
+    return pd.concat([df, df.iloc[:5], pd.DataFrame({'report': [np.nan, np.nan]}), df.iloc[10:12]], ignore_index=True)
+
+def append_rows(df, file_path):
+    """Append rows to a csv file, writing the header if the file is new"""
+    df.to_csv(file_path, mode='a', header=not file_path.exists(), index=False)
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_process_new_reports(reports, tmp_path, workers):
+    """Processing a feed in several runs gives the same output as processing it at once"""
+    radex = Radex()
+    radex.searches = radex.example_searches
+    reports.to_csv(tmp_path / 'all.csv', index=False)
+    radex.process_file(tmp_path / 'all.csv', tmp_path / 'expected.csv')
+
+    feed = tmp_path / 'feed.csv'
+    rows_written = 0
+    for start, end in [(0, 20), (20, 20), (20, 50), (50, 59)]:
+        append_rows(reports.iloc[start:end], feed)
+        stats = radex.process_new_reports(feed, tmp_path / 'output.csv', tmp_path / 'state', chunksize=7, workers=workers)
+        rows_written += stats.rows
+        assert IncrementalState(tmp_path / 'state').watermark.rows == end
+
+    expected = pd.read_csv(tmp_path / 'expected.csv')
+    output = pd.read_csv(tmp_path / 'output.csv')
+    assert rows_written == len(expected)
+    assert output.equals(expected)
+
+def test_incomplete_row_and_interrupted_run(reports, tmp_path):
+    """Rows without a new line are left for the next run, and output from an interrupted run is dropped"""
+    searches = {'Thyroid': 'thyroid'}
+    feed = tmp_path / 'feed.csv'
+    append_rows(reports.iloc[:10], feed)
+    with open(feed, 'a', encoding='utf-8') as wfile:
+        wfile.write('"partial report')
+
+    run_incremental(feed, tmp_path / 'output.csv', tmp_path / 'state', searches)
+    assert len(pd.read_csv(tmp_path / 'output.csv')) == 10
+
+    with open(tmp_path / 'output.csv', 'a', encoding='utf-8') as wfile:
+        wfile.write('left over from an interrupted run,True\n')
+    with open(feed, 'a', encoding='utf-8') as wfile:
+        wfile.write(' on thyroid"\n')
+
+    stats = run_incremental(feed, tmp_path / 'output.csv', tmp_path / 'state', searches)
+    assert stats.rows == 1
+    output = pd.read_csv(tmp_path / 'output.csv')
+    assert output['report'].tolist()[-1] == 'partial report on thyroid'
+    assert output.index.tolist() == list(range(11))
+
+def test_incomplete_multiline_row(reports, tmp_path):
+    """A quoted report with a new line is left for the next run until its row is complete"""
+    searches = {'Goitre': 'goitre'}
+    feed = tmp_path / 'feed.csv'
+    append_rows(reports.iloc[:10], feed)
+    with open(feed, 'a', encoding='utf-8') as wfile:
+        wfile.write('"goitre present\nstill being wri')
+
+    stats = run_incremental(feed, tmp_path / 'output.csv', tmp_path / 'state', searches)
+    assert stats.rows == 10
+
+    with open(feed, 'a', encoding='utf-8') as wfile:
+        wfile.write('tten ""today""."\n"next report\nalso')
+
+    stats = run_incremental(feed, tmp_path / 'output.csv', tmp_path / 'state', searches)
+    assert stats.rows == 1
+    output = pd.read_csv(tmp_path / 'output.csv')
+    assert output['report'].tolist()[-1] == 'goitre present still being written today'
+    assert output['Goitre'].tolist()[-1]
+    assert len(output) == 11
+
+def test_changes_are_rejected(reports, tmp_path):
+    """Changing the searches or rewriting the input file raises a ValueError"""
+    feed = tmp_path / 'feed.csv'
+    append_rows(reports.iloc[:10], feed)
+    run_incremental(feed, tmp_path / 'output.csv', tmp_path / 'state', {'Thyroid': 'thyroid'})
+
+    with pytest.raises(ValueError):
+        run_incremental(feed, tmp_path / 'output.csv', tmp_path / 'state', {'Thyroid': 'thyr*'})
+
+    reports.iloc[1:12].to_csv(feed, index=False)
+    with pytest.raises(ValueError):
+        run_incremental(feed, tmp_path / 'output.csv', tmp_path / 'state', {'Thyroid': 'thyroid'})
+
+    with pytest.raises(ValueError):
+        run_incremental(feed, tmp_path / 'output.parquet', tmp_path / 'other_state', {'Thyroid': 'thyroid'})
+
+def test_parquet_feed(reports, tmp_path):
+    """Parquet inputs are read from the first new row"""
+    pytest.importorskip('pyarrow')
+    searches = {'Thyroid': 'thyroid'}
+    reports.iloc[:20].to_parquet(tmp_path / 'feed.parquet', index=False)
+    run_incremental(tmp_path / 'feed.parquet', tmp_path / 'output.csv', tmp_path / 'state', searches)
+
+    reports.iloc[:30].to_parquet(tmp_path / 'feed.parquet', index=False, row_group_size=8)
+    stats = run_incremental(tmp_path / 'feed.parquet', tmp_path / 'output.csv', tmp_path / 'state', searches)
+    assert stats.rows == 10
+
+    run_pipeline(tmp_path / 'feed.parquet', tmp_path / 'expected.csv', searches)
+    assert pd.read_csv(tmp_path / 'output.csv').equals(pd.read_csv(tmp_path / 'expected.csv'))
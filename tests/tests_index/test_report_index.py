@@ -0,0 +1,55 @@
+# pylint: disable=redefined-outer-name
+# pylint: disable=line-too-long
+# fmt: off
+
+"""Test the ReportIndex from radex.index"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from radex.compiler import compile_expression
+from radex.dfsearch import search_dataframe
+from radex.expression import Expression
+from radex.index import SENTENCE_GAP, ReportIndex
+
+@pytest.fixture
+def sample_reports():
+    """Create a sample column of reports"""
+    return pd.Series([
+        'the quick brown fox jumps over the lazy dog',
+        'normal thyroid. no nodules',
+        'multinodular goitre with thyroid cysts. post op',
+        'heterogeneous echotexture in keeping with thyroiditis',
+        'post-op appearances following hemithyroidectomy',
+        np.nan,
+    ], index=[5, 4, 3, 2, 1, 0])
+
+EXPRESSIONS = [
+    'thyroid',
+    'thyr*',
+    '*thyroidectomy',
+    'nodul* | thyroid~~4node | thyroid~~2cyst*',
+    'multi?nodul* | mng | nodules | thyroid~~2cysts',
+    'thyroiditis | grav?s | heterogen* echotexture',
+    'post?op & ¬goitre',
+    '¬thyroid',
+    'quick brown & ¬(cat | dog)',
+    'nan',
+]
+
+@pytest.mark.parametrize("expression", EXPRESSIONS)
+def test_report_index_matches_search_dataframe(sample_reports, expression):
+    """The index gives the same results as scanning the text"""
+    index = ReportIndex(sample_reports)
+    expected = search_dataframe(pd.DataFrame({'report': sample_reports}), 'report', Expression().parse_string(expression))
+    pd.testing.assert_series_equal(index.search(expression), expected['report_matches'], check_names=False)
+
+def test_report_index_postings(sample_reports):
+    """Posting lists hold the token positions of each report"""
+    index = ReportIndex(sample_reports)
+    assert index.postings['thyroid'] == {1: [1], 2: [3]}
+    assert index.postings['nodules'] == {1: [SENTENCE_GAP + 1]}
+    assert index.postings['the'] == {0: [0, 6]}
+    assert index.vocabulary == sorted(index.vocabulary)
+    assert index.tokens_matching(compile_expression('thyroid*')) == ['thyroid', 'thyroiditis']
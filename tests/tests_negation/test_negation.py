@@ -0,0 +1,98 @@
+# fmt: off
+# pylint: disable=line-too-long
+
+"""Tests for radex.negation"""
+
+import random
+from pathlib import Path
+
+import pytest
+
+from negex.negexPython.negex import negTagger, sortRules
+from radex.negation import NegationRules, as_negation_rules, load_negation_rules
+from radex.preprocessing import remove_negated_phrases
+
+RULES_FILE = Path(__file__).parent.parent.parent / "data" / "negex_triggers.txt"
+
+SENTENCES = [
+    "the dog was brown",
+    "the dog was not brown but the cat was brown",
+    "no evidence of thyroid nodules",
+    "No Significant Change in the left lobe",
+    "nodule was ruled out",
+    "r/o malignancy",
+    "possible cyst, not certain if benign",
+    "thyroid not enlarged. no cysts",
+    "",
+]
+
+@pytest.fixture
+def _rules():
+    """Create the indexed default negation rules"""
+    return load_negation_rules(RULES_FILE)
+
+def _tag(sentence, rules):
+    tagger = negTagger(sentence=sentence, phrases=[], rules=rules, negP=False)
+    return tagger.getNegTaggedSentence(), tagger.getScopes()
+
+def _random_sentences(rules, count, seed):
+    """Sentences of trigger words, other words and punctuation, in random order"""
+    rng = random.Random(seed)
+    words = sorted({word for rule in rules.rules for word in rule[0].split()})
+    words += ["thyroid", "nodule", "Lobe", "NO", "Not", "r", "o", "_", "[PREN]"]
+    separators = [" ", "  ", ", ", ". ", "\t", "-", "/", "'", "(", ")"]
+    return [
+        "".join(rng.choice(words) + rng.choice(separators) for _ in range(rng.randint(0, 15)))
+        for _ in range(count)
+    ]
+
+@pytest.mark.parametrize("sentence", SENTENCES)
+def test_tag(_rules, sentence):
+    """The trie tags a sentence and finds its scopes as negTagger does"""
+    assert _rules.tag(sentence) == _tag(sentence, _rules.rules)
+
+def test_tag_random_sentences(_rules):
+    """Random sentences are tagged as negTagger tags them with the full triggers file"""
+    for sentence in _random_sentences(_rules, 2000, seed=0):
+        assert _rules.tag(sentence) == _tag(sentence, _rules.rules), sentence
+
+def test_tag_example(_rules):
+    """The words of a trigger are joined, and the negated phrase is found"""
+    assert _rules.tag("No evidence of thyroid nodules. ") == ("[PREN]no evidence[PREN] of thyroid nodules.", ["of thyroid nodules."])
+
+@pytest.mark.parametrize("sentence", ["no no no evidence", "the post op cyst", "no post x", "no café x", "r/o no x", "no x ruled out"])
+def test_tag_repeated_triggers(sentence):
+    """Triggers tagged again by later rules, and triggers with the words of a tag, are tagged as by negTagger"""
+    rules = NegationRules(sortRules([
+        "no\t\t[PREN]", "no\t\t[POST]", "No\t\t[PSEU]", "no evidence\t\t[PREN]", "evidence of\t\t[CONJ]",
+        "no evidence of\t\t[POST]", "post\t\t[PSEU]", "r/o\t\t[PREN]", "ruled out\t\t[POST]",
+    ]))
+    assert rules.tag(sentence) == _tag(sentence, rules.rules)
+
+def test_load_negation_rules(_rules):
+    """The rules file is read once"""
+    assert load_negation_rules(RULES_FILE) is _rules
+    assert as_negation_rules(_rules) is _rules
+    rules = sortRules(["not\t\t[PREN]", "but\t\t[CONJ]"])
+    assert isinstance(as_negation_rules(rules), NegationRules)
+    assert as_negation_rules(rules).rules == rules
+
+def test_negation_rules_cache_size(_rules):
+    """Rules are compiled again for a different size of sentence cache"""
+    assert as_negation_rules(_rules, _rules.sentence_cache.maxsize) is _rules
+    resized = as_negation_rules(_rules, 10)
+    assert resized.rules == _rules.rules and resized.sentence_cache.maxsize == 10
+    assert load_negation_rules(RULES_FILE, 10) is load_negation_rules(RULES_FILE, 10)
+    assert load_negation_rules(RULES_FILE, 10).sentence_cache.maxsize == 10
+
+def test_sentence_cache():
+    """Sentences already cleaned are taken from the cache, with the same result"""
+    with open(RULES_FILE, encoding="utf-8") as rfile:
+        rules = NegationRules(sortRules(rfile.readlines()))
+    text = ". ".join(SENTENCES)
+    expected = remove_negated_phrases(text, NegationRules(rules.rules, cache_size=0))
+
+    assert remove_negated_phrases(text, rules) == expected
+    assert rules.sentence_cache.stats.hits == 0
+    assert remove_negated_phrases(text, rules) == expected
+    assert rules.sentence_cache.stats.hits == rules.sentence_cache.stats.misses == len(text.split("."))
@@ -0,0 +1,54 @@
+# fmt: off
+# pylint: disable=line-too-long
+
+"""Test the chunking and process pool helpers from radex.parallel"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from radex.document import DocumentColumn
+from radex.parallel import balanced_chunks, map_chunks
+
+def _lengths(chunk):
+    """Top level function which can be sent to a worker process"""
+    return chunk.map(len).to_numpy()
+
+def _sentences(chunk):
+    """Top level function which can be sent to a worker process"""
+    return [chunk.sentences(i) for i in range(len(chunk))]
+
+def test_balanced_chunks():
+    """Chunks are contiguous and balanced by total length rather than row count"""
+    assert balanced_chunks(np.array([10, 10, 100, 10, 10, 60]), 2) == [(0, 3), (3, 6)]
+    assert balanced_chunks(np.array([1, 1, 1, 1]), 4) == [(0, 1), (1, 2), (2, 3), (3, 4)]
+    assert balanced_chunks(np.array([1000, 1, 1]), 3) == [(0, 1), (1, 3)]
+    assert balanced_chunks(np.array([], dtype=int), 4) == []
+
+def test_balanced_chunks_cover_all_rows():
+    """Every row is in exactly one chunk"""
+    lengths = np.random.default_rng(0).integers(1, 1000, size=257)
+    chunks = balanced_chunks(lengths, 16)
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(lengths)
+    assert all(end == start for (_, end), (start, _) in zip(chunks[:-1], chunks[1:]))
+
+def test_map_chunks_order():
+    """Results are returned in the order of the column"""
+    candidates = pd.Series(["a" * (i % 7 + 1) for i in range(50)], index=range(100, 150))
+    chunks = map_chunks(_lengths, candidates, workers=2)
+    assert len(chunks) > 1
+    assert np.concatenate(chunks).tolist() == [i % 7 + 1 for i in range(50)]
+    assert len(map_chunks(_lengths, candidates)) == 1
+
+def test_map_chunks_document_column():
+    """Chunks of a DocumentColumn keep the sentences of their reports"""
+    reports = pd.Series(["a. " * (i % 7 + 1) for i in range(50)])
+    documents = DocumentColumn.from_series(reports)
+    chunks = map_chunks(_sentences, documents, workers=2)
+    assert len(chunks) > 1
+    assert [sentences for chunk in chunks for sentences in chunk] == [report.split('.') for report in reports]
+
+def test_map_chunks_invalid_workers():
+    """Test an invalid number of workers"""
+    with pytest.raises(ValueError):
+        map_chunks(_lengths, pd.Series(["a"]), workers=0)
@@ -0,0 +1,148 @@
+# fmt: off
+# pylint: disable=line-too-long
+
+"""Tests for radex.pipeline"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from radex import Radex
+from radex.formats import TableWriter
+from radex.pipeline import DuplicateFilter, PipelineStats, read_chunks, run_pipeline
+
+DATA_FILE = Path(__file__).parent.parent.parent / "data" / "synthetic_ultrasound_reports" / "ex_usreports_validation.csv"
+
+@pytest.fixture
+def input_file(tmp_path):
+    """Write the validation reports with repeated and missing reports"""
+    df = pd.read_csv(DATA_FILE)
+    df = pd.concat([df, df.iloc[:5], pd.DataFrame({'report': [np.nan, np.nan]}), df.iloc[10:12]], ignore_index=True)
+    file_path = tmp_path / "input.csv"
+    df.to_csv(file_path, index=False)
+    return file_path
+
+@pytest.mark.parametrize("chunksize", [1, 7, 1000])
+def test_process_file(input_file, tmp_path, chunksize):
+    """Streaming gives the same output as processing the whole file at once"""
+    radex = Radex()
+    radex.read_data(str(input_file))
+    radex.preprocess_data()
+    radex.searches = radex.example_searches
+    radex.run_searches()
+    radex.save_output(tmp_path / "expected.csv")
+
+    radex = Radex()
+    radex.searches = radex.example_searches
+    stats = radex.process_file(input_file, tmp_path / "output.csv", chunksize=chunksize)
+
+    assert stats.rows == 50
+    assert (tmp_path / "output.csv").read_text() == (tmp_path / "expected.csv").read_text()
+
+    stats = radex.process_file(input_file, tmp_path / "overlapped.csv", chunksize=chunksize, workers=2, queue_size=3)
+
+    assert stats.rows == 50
+    assert stats.read.rows == 51 and stats.compute.chunks == stats.read.chunks  # one missing report is dropped when cleaned
+    assert 0 < stats.max_queue_depth <= 3
+    assert (tmp_path / "overlapped.csv").read_text() == (tmp_path / "expected.csv").read_text()
+
+def test_run_pipeline_invalid_chunksize(input_file, tmp_path):
+    """Test an invalid chunk size or number of workers"""
+    with pytest.raises(ValueError):
+        run_pipeline(input_file, tmp_path / "output.csv", {'a': 'a'}, chunksize=0)
+    with pytest.raises(ValueError):
+        run_pipeline(input_file, tmp_path / "output.csv", {'a': 'a'}, workers=0)
+
+def test_run_pipeline_error(tmp_path):
+    """Errors in a worker are raised once the pipeline has stopped"""
+    file_path = tmp_path / "input.csv"
+    pd.DataFrame({'text': ['a'] * 10}).to_csv(file_path, index=False)
+    with pytest.raises(KeyError):
+        run_pipeline(file_path, tmp_path / "output.csv", {'a': 'a'}, column='report', chunksize=2, workers=2)
+
+def test_pipeline_stats():
+    """Stage counters are summarised per stage"""
+    stats = PipelineStats()
+    stats.compute.rows, stats.compute.busy = 100, 2.0
+    stats.queue_depths.extend([1, 3, 2])
+    assert stats.compute.throughput == 50
+    assert stats.read.throughput == 0
+    assert stats.max_queue_depth == 3
+    assert stats.summary().loc['compute', 'throughput'] == 50
+
+def test_duplicate_filter():
+    """Duplicates are dropped within and across chunks, keeping the first"""
+    duplicates = DuplicateFilter('text')
+    first = duplicates.filter(pd.DataFrame({'text': ['a', 'b', 'a', np.nan]}, index=[0, 1, 2, 3]))
+    second = duplicates.filter(pd.DataFrame({'text': ['b', 'c', np.nan, 'c']}, index=[4, 5, 6, 7]))
+    assert first.index.tolist() == [0, 1, 3]
+    assert second.index.tolist() == [5]
+
+def test_read_chunks_and_writer(input_file, tmp_path):
+    """Chunks keep the index of the whole file and are written with a single header"""
+    chunks = list(read_chunks(input_file, 20, column='report'))
+    assert [len(chunk) for chunk in chunks] == [20, 20, 19]
+    assert chunks[1].index[0] == 20
+
+    writer = TableWriter(tmp_path / "output.csv")
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.close()
+    assert writer.rows == 59
+    assert pd.read_csv(tmp_path / "output.csv").shape == pd.read_csv(input_file).shape
+
+def test_process_file_parquet(input_file, tmp_path):
+    """Parquet files are streamed by row group and give the same results as csv files"""
+    pytest.importorskip("pyarrow")
+    pd.read_csv(input_file).to_parquet(tmp_path / "input.parquet", index=False)
+
+    radex = Radex()
+    radex.searches = radex.example_searches
+    radex.process_file(input_file, tmp_path / "expected.csv", chunksize=7)
+    stats = radex.process_file(tmp_path / "input.parquet", tmp_path / "output.parquet", chunksize=7)
+
+    expected = pd.read_csv(tmp_path / "expected.csv")
+    output = pd.read_parquet(tmp_path / "output.parquet")
+    assert stats.rows == len(expected)
+    assert output[list(radex.searches)].equals(expected[list(radex.searches)])
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_process_file_column_empty_in_first_chunk(tmp_path, suffix):
+    """A column which is empty in the first chunk is written with the type of the later chunks"""
+    pytest.importorskip("pyarrow")
+    df = pd.DataFrame({
+        'report': ['normal thyroid', 'thyroid nodule', 'goitre', 'normal'],
+        'note': [np.nan, np.nan, 'seen', 'ok'],
+    })
+    input_path = tmp_path / ("input" + suffix)
+    if suffix == ".csv":
+        df.to_csv(input_path, index=False)
+    else:
+        df.to_parquet(input_path, index=False, row_group_size=2)
+
+    radex = Radex()
+    radex.searches = {'Thyroid': 'thyroid'}
+    radex.process_file(input_path, tmp_path / "output.parquet", chunksize=2)
+
+    output = pd.read_parquet(tmp_path / "output.parquet")
+    assert output['note'].fillna('').tolist() == ['', '', 'seen', 'ok']
+    assert output['Thyroid'].tolist() == [True, True, False, False]
+
+def test_process_file_csv_keeps_types(tmp_path):
+    """Numeric columns of a csv file keep their types in a Parquet file, also in chunks with missing values"""
+    pyarrow = pytest.importorskip("pyarrow")
+    input_path = tmp_path / "input.csv"
+    input_path.write_text("report,age,size\nnormal thyroid,40,1.5\nthyroid nodule,52,2.0\ngoitre,,3.0\nnormal,61,\n")
+
+    radex = Radex()
+    radex.searches = {'Thyroid': 'thyroid'}
+    radex.process_file(input_path, tmp_path / "output.parquet", chunksize=2)
+
+    schema = pyarrow.parquet.read_schema(tmp_path / "output.parquet")
+    assert schema.field('age').type == pyarrow.int64()
+    assert schema.field('size').type == pyarrow.float64()
+    output = pd.read_parquet(tmp_path / "output.parquet")
+    assert output['age'].fillna(0).tolist() == [40, 52, 0, 61]
+    assert output['Thyroid'].tolist() == [True, True, False, False]
@@ -7,7 +7,21 @@ import pytest
 import pandas as pd
 import numpy as np
 
-from radex.preprocessing import clean_dataframe, remove_negated_phrases, merge_columns
+from radex.negation import NegationRules, load_negation_rules
+from radex.preprocessing import (
+    RULES_FILE,
+    STOPWORDS_FILE,
+    StopwordRemover,
+    clean_dataframe,
+    get_negation_rules,
+    get_stopword_remover,
+    load_stopwords,
+    merge_columns,
+    normalise_column,
+    normalise_text,
+    remove_negated_phrases,
+    remove_stopwords,
+)
 from negex.negexPython.negex import sortRules
 
 @pytest.fixture
@@ -78,6 +92,55 @@ def test_clean_dataframe_valueerror(_sample_dataframe):
                         drop_stopwords=None,
                         )
 
+def test_clean_dataframe_workers(_sample_dataframe, _sample_stopwords, _sample_negation_rules):
+    """Cleaning in worker processes gives the same result, with the original index"""
+    kwargs = {'drop_duplicates': True, 'drop_nulls': True,
+              'drop_negatives': _sample_negation_rules, 'drop_stopwords': _sample_stopwords}
+    expected = clean_dataframe(_sample_dataframe.copy(), text_columns='text', **kwargs)
+    cleaned_df = clean_dataframe(_sample_dataframe.copy(), text_columns='text', workers=2, **kwargs)
+    assert cleaned_df.equals(expected)
+    assert cleaned_df.index.tolist() == [0, 1, 2]
+
+def test_clean_dataframe_workers_default_rules(_sample_dataframe):
+    """The default negex rules and stopwords are loaded once and sent to the workers"""
+    kwargs = {'drop_nulls': True, 'drop_negatives': 'negex', 'drop_stopwords': 'nltk'}
+    expected = clean_dataframe(_sample_dataframe.copy(), text_columns='text', **kwargs)
+    cleaned_df = clean_dataframe(_sample_dataframe.copy(), text_columns='text', workers=2, **kwargs)
+    assert cleaned_df.equals(expected)
+
+def test_clean_dataframe_sentence_cache_size(_sample_dataframe, _sample_negation_rules):
+    """The sentence cache of the negation rules has the requested size"""
+    expected = clean_dataframe(_sample_dataframe.copy(), text_columns='text', drop_negatives='negex')
+    cleaned_df = clean_dataframe(_sample_dataframe.copy(), text_columns='text', drop_negatives='negex', sentence_cache_size=7)
+    assert cleaned_df.equals(expected)
+    rules = load_negation_rules(RULES_FILE, 7)
+    assert rules.sentence_cache.maxsize == 7
+    assert rules.sentence_cache.stats.misses > 0
+
+    rules = NegationRules(_sample_negation_rules, cache_size=0)
+    clean_dataframe(_sample_dataframe.copy(), text_columns='text', drop_negatives=rules, sentence_cache_size=0)
+    assert rules.sentence_cache.stats.misses > 0
+
+def test_get_negation_rules(_sample_negation_rules):
+    """The default rules are loaded once for each cache size, and other rules are compiled"""
+    assert get_negation_rules('negex') is load_negation_rules(RULES_FILE)
+    assert get_negation_rules('negex', 5) is load_negation_rules(RULES_FILE, 5)
+    assert get_negation_rules(None) is None
+    rules = get_negation_rules(_sample_negation_rules, 5)
+    assert rules.rules == _sample_negation_rules and rules.sentence_cache.maxsize == 5
+    assert get_negation_rules(rules) is rules
+    assert get_negation_rules(rules, 6).sentence_cache.maxsize == 6
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_clean_dataframe_deduplicate(_sample_dataframe, _sample_stopwords, workers):
+    """Cleaning each distinct text once keeps every row, with the original index"""
+    df = pd.concat([_sample_dataframe, _sample_dataframe.iloc[::-1]]).set_axis([9, 8, 7, 6, 5, 4, 3, 2, 1, 0])
+    kwargs = {'drop_negatives': None, 'drop_stopwords': _sample_stopwords, 'workers': workers}
+    expected = clean_dataframe(df.copy(), text_columns='text', **kwargs)
+    cleaned_df = clean_dataframe(df.copy(), text_columns='text', deduplicate=True, **kwargs)
+    assert cleaned_df.equals(expected)
+    assert cleaned_df.index.tolist() == [9, 8, 7, 6, 5, 4, 3, 2, 1, 0]
+
 def test_remove_negated_phrases(_sample_negation_rules):
     """Test the remove_negated_phrases function"""
     assert remove_negated_phrases('The dog was brown',
@@ -96,6 +159,55 @@ def test_remove_negated_phrases(_sample_negation_rules):
                                     _sample_negation_rules, verbose=True) == 'The dog was not XXXXX. It was white'
 
 
+@pytest.mark.parametrize('text', [
+    'Hello World!',
+    'The dog was fast, but the fox was not fast. The rabbit was fastest.',
+    'Left-sided\n\nnodule 1.4 cm / 2 cm ( stable ) .',
+    '  ...Trailing period..',
+    'tabs\tand\u00a0spaces , - / end.  ',
+    'ÉCHO; İNTACT',
+    'every' + ''.join(c for c in map(chr, range(0x3001)) if c.isspace()) + 'space',
+    '',
+])
+def test_normalise_text(text):
+    """The fused normaliser gives the same result as the separate cleaning steps"""
+    expected = pd.Series([text], dtype=object).str.replace("\n", " ").str.replace("/", " ").str.replace("-", " ")
+    expected = expected.str.replace(r"[^\w\s.]", "", regex=True).str.replace(r"\s+", " ", regex=True)
+    expected = expected.str.replace(r"\.$", "", regex=True).str.lower()
+    assert normalise_text(text) == expected[0]
+
+def test_normalise_column():
+    """Missing and non string values are handled as with Series.str"""
+    column = pd.Series(['Hello  World!', np.nan, 5], index=[2, 4, 6], dtype=object)
+    result = normalise_column(column)
+    assert result.index.tolist() == [2, 4, 6]
+    assert result.dtype == object
+    assert result[2] == 'hello world' and np.isnan(result[4]) and np.isnan(result[6])
+
+def test_remove_stopwords(_sample_stopwords):
+    """Test the remove_stopwords function"""
+    assert remove_stopwords('the dog was fast but the fox was not', _sample_stopwords) == 'dog fast fox not'
+    assert remove_stopwords('they theme them. to', _sample_stopwords) == 'theme . '
+    assert remove_stopwords("dont stop", ["don't"]) == 'stop'
+    assert remove_stopwords('the quick brown fox', ['the quick', 'fox']) == 'brown '
+
+def test_stopword_remover(_sample_stopwords):
+    """The remover is compiled once per list of stopwords"""
+    remover = get_stopword_remover(tuple(_sample_stopwords))
+    assert remover is get_stopword_remover(tuple(_sample_stopwords))
+    assert remover.pattern.pattern == r"(\w+)(\s*)"
+    assert StopwordRemover(['the quick']).pattern.pattern == r"\b(the quick)\b\s*"
+    column = pd.Series(['the dog was fast', np.nan, 'it was'], index=[3, 5, 7])
+    result = remover.remove_column(column)
+    assert result.index.tolist() == [3, 5, 7]
+    assert result[3] == 'dog fast' and np.isnan(result[5]) and result[7] == ''
+
+def test_load_stopwords():
+    """The stopwords file is read once"""
+    stopwords = load_stopwords(STOPWORDS_FILE)
+    assert load_stopwords(STOPWORDS_FILE) is stopwords
+    assert 'the' in stopwords
+
 def test_merge_columns(_sample_dataframe):
     """Test the merge_columns function"""
     # Merge columns
@@ -77,3 +77,21 @@ def test_value_error(data_file_path):
     # assert save_output before run_searches returns a value error still
     with pytest.raises(ValueError):
         radex.save_output('output.csv')
+
+def test_cache_stats(data_file_path):
+    """The sentence caches have the requested sizes, and their stats are exposed"""
+    radex = Radex()
+    radex.read_data(str(data_file_path))
+    radex.preprocess_data(sentence_cache_size=50)
+    radex.searches = {'thyroid': 'thyr*', 'nodule': 'nodul*'}
+    radex.run_searches(sentence_cache_size=20)
+
+    assert radex.negation_rules.sentence_cache.maxsize == 50
+    assert radex.search_cache.sentence_cache.maxsize == 20
+    stats = radex.cache_stats
+    assert stats['negation'] is radex.negation_rules.sentence_cache.stats
+    assert stats['negation'].misses > 0
+    assert stats['search'].misses > 0 and stats['search'].evictions > 0
+
+    radex.preprocess_data(drop_negatives=None)
+    assert list(radex.cache_stats) == ['search']
@@ -4,7 +4,7 @@
 """Test the Expression method from radex.expression"""
 
 import pytest
-from radex.radexpressions import evaluate_regex, get_regex_wildcards, get_regex_proximity, string_search, wildcard_search
+from radex.radexpressions import evaluate_regex, get_regex_wildcards, get_regex_proximity, get_required_literals, parse_proximity, proximity_match, string_search, wildcard_search
 
 def test_evaluate_regex():
     """Evaluate a regular expression"""
@@ -152,3 +152,33 @@ def test_wildcard_search():
     pattern = "nonexistent"
     expected_result = []
     assert wildcard_search(string, pattern) == expected_result
+
+def test_get_required_literals():
+    """Test the get_required_literals function"""
+    assert get_required_literals("thyroid") == ["thyroid"]
+    assert get_required_literals("thyr*") == ["thyr"]
+    assert get_required_literals("goit?r?") == ["goit", "r"]
+    assert get_required_literals("heterogen* echotexture") == ["echotexture", "heterogen"]
+    assert get_required_literals("thyroid~~2cyst*") == ["thyroid", "cyst"]
+    assert get_required_literals("inflamed* ~~2 thyroid") == ["inflamed", "thyroid"]
+    assert get_required_literals("*") == []
+
+def test_parse_proximity():
+    """Test the parse_proximity function"""
+    assert parse_proximity("thyroid ~~2 cyst*") == ("thyroid", "cyst*", 2, "centre")
+    assert parse_proximity("quick~1fox") == ("quick", "fox", 1, "right")
+    with pytest.raises(ValueError):
+        parse_proximity("quick~1fox~2dog")
+
+def test_proximity_match():
+    """Test the proximity_match function"""
+    assert proximity_match([0, 7], [3], 2, "centre")
+    assert not proximity_match([0, 7], [3], 1, "centre")
+    assert proximity_match([1], [2], 0, "right")
+    assert not proximity_match([2], [1], 0, "right")
+    assert proximity_match([2], [1], 0, "left")
+    assert proximity_match([2], [1], 0, "centre")
+    assert not proximity_match([1], [1], 5, "centre")
+    assert not proximity_match([], [1], 5, "centre")
+    with pytest.raises(ValueError):
+        proximity_match([1], [2], 1, "up")
@@ -0,0 +1,66 @@
+# fmt: off
+# pylint: disable=line-too-long
+
+"""Test the MultiPatternScanner from radex.scanner"""
+
+import re
+
+import pytest
+
+from radex.radexpressions import get_regex
+from radex.scanner import MultiPatternScanner, literal_prefix, split_branches
+
+TERMS = [
+    "thyroid", "thyr*", "*thyroidectomy", "goit?r?", "heterogen* echotexture",
+    "thyroid~~2cyst*", "cyst ~1 thyroid", "post?op", "mng", "nodul*", "the quick brown",
+    "quick ~2 fox", "fo?x", "lazy ~~1 dog",
+]
+
+CANDIDATES = [
+    "the quick brown fox jumps over the lazy dog",
+    "normal thyroid. thyroid with cysts. cyst in the thyroid",
+    "post op appearances following hemithyroidectomy. post-op",
+    "multinodular goitre. mng. heterogeneous echotexture",
+    "   leading whitespace thyroid.  . trailing dog lazy.",
+    "",
+]
+
+def test_split_branches():
+    """Split a regex on top level alternation"""
+    assert split_branches(r"\ba\b|\bb(?:c|d)") == [r"\ba\b", r"\bb(?:c|d)"]
+    assert split_branches(r"\ba\|b") == [r"\ba\|b"]
+
+@pytest.mark.parametrize("regex, expected", [
+    (r"\bthyroid\b", "thyroid"),
+    (r"\bnodul\w*\b", "nodul"),
+    (r"\b\w*thyroidectomy\b", ""),
+    (r"\bgoit.?r.?\b", "goit"),
+    (r"\bheterogen\w*\ echotexture\b", "heterogen"),
+    (r"\bab?c", "a"),
+])
+def test_literal_prefix(regex, expected):
+    """Literal prefix of a regex branch"""
+    assert literal_prefix(regex) == expected
+
+@pytest.mark.parametrize("candidate", CANDIDATES)
+def test_scanner_matches_individual_search(candidate):
+    """The scanner finds the same terms, at the same first position, as searching each sentence for each term"""
+    regexes = [get_regex(term) for term in TERMS]
+    scanner = MultiPatternScanner(regexes)
+
+    expected = {}
+    offset = 0
+    for sentence in candidate.split("."):
+        start = offset + len(sentence) - len(sentence.lstrip())
+        offset += len(sentence) + 1
+        for regex in regexes:
+            match = re.search(regex, sentence.strip())
+            if sentence.strip() and match and regex not in expected:
+                expected[regex] = (start + match.start(), start + match.end())
+
+    assert scanner.scan(candidate) == {regex: expected[regex] for regex in regexes if regex in expected}
+
+def test_scanner_overlapping_terms():
+    """Terms starting at the same position are all found"""
+    scanner = MultiPatternScanner([r"\bthyr\w*\b", r"\bthyroid\b", r"\bthyroid\b\W+(?:\w+\W+){0,2}?\bcyst\w*\b"])
+    assert list(scanner.scan("thyroid cyst")) == [r"\bthyr\w*\b", r"\bthyroid\b", r"\bthyroid\b\W+(?:\w+\W+){0,2}?\bcyst\w*\b"]
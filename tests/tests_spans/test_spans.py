@@ -0,0 +1,109 @@
+# fmt: off
+# pylint: disable=line-too-long
+
+"""Tests for radex.spans"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from radex import Radex
+from radex.compiler import compile_searches
+from radex.dfsearch import check_all_matches, search_dataframe, search_dataframe_multiple
+from radex.expression import Expression
+from radex.spans import MatchSpans, record_matches
+
+DATA_FILE = Path(__file__).parent.parent.parent / "data" / "synthetic_ultrasound_reports" / "ex_usreports_validation.csv"
+
+CANDIDATES = pd.Series([
+    'the quick brown fox. jumps over the quick dog',
+    ' the slow pink cat. ',
+    '',
+    'quick quick. cat',
+])
+
+SEARCHES = {
+    'quick': 'qui* | lazy',
+    'quick_dog': 'quick ~10 dog',
+    'not_fox': '¬fox & (quick | cat)',
+}
+
+@pytest.mark.parametrize('sentencizer', [False, True])
+def test_record_matches(sentencizer):
+    """The results are the same as searching, and every match of every term is recorded"""
+    search_set = compile_searches(SEARCHES)
+    results, spans = record_matches(CANDIDATES, search_set, sentencizer=sentencizer)
+    expected = search_dataframe_multiple(pd.DataFrame({'text': CANDIDATES}), 'text', search_set, sentencizer=sentencizer)
+    for name in SEARCHES:
+        assert results[name].tolist() == expected[name].tolist()
+
+    assert len(spans) == 4
+    assert spans.offsets.tolist() == [0, 6, 7, 7, 12]
+    assert sorted(spans.spans(0)) == [('fox', 16, 19), ('qui*', 4, 9), ('qui*', 36, 41), ('quick', 4, 9), ('quick', 36, 41), ('quick ~10 dog', 36, 45)]
+    assert spans.spans(1) == [('cat', 15, 18)]
+    assert spans.spans(2) == []
+
+def test_matches():
+    """The matches of a row are given as by check_all_matches"""
+    _, spans = record_matches(CANDIDATES, compile_searches(SEARCHES))
+    for search in SEARCHES.values():
+        expression = Expression().parse_string(search)
+        parts = [term.expression for term in compile_searches({'search': search}).terms]
+        for i, candidate in enumerate(CANDIDATES):
+            assert spans.matches(i, candidate, parts) == check_all_matches(candidate, parts)
+            assert spans.matches(i, candidate, parts) == {part: value for part, value in check_all_matches(candidate, expression).items() if part in parts}
+
+    assert spans.matches(3, CANDIDATES[3]) == {
+        'lazy': (False, []), 'qui*': (True, [('quick', 0, 5), ('quick', 6, 11)]), 'quick ~10 dog': (False, []),
+        'fox': (False, []), 'quick': (True, [('quick', 0, 5), ('quick', 6, 11)]), 'cat': (True, [('cat', 0, 3)]),
+    }
+    with pytest.raises(ValueError):
+        spans.matches(0, CANDIDATES[0], ['badger'])
+
+def test_take_and_concat():
+    """Rows can be selected, and chunks joined"""
+    _, spans = record_matches(CANDIDATES, compile_searches(SEARCHES))
+    taken = spans.take(np.array([3, 0, 2, 3]))
+    assert [taken.spans(i) for i in range(4)] == [spans.spans(3), spans.spans(0), [], spans.spans(3)]
+
+    _, first = record_matches(CANDIDATES[:2], compile_searches(SEARCHES))
+    _, second = record_matches(CANDIDATES[2:], compile_searches(SEARCHES))
+    joined = MatchSpans.concat([first, second])
+    assert joined.offsets.tolist() == spans.offsets.tolist()
+    assert [joined.spans(i) for i in range(4)] == [spans.spans(i) for i in range(4)]
+
+def test_to_arrow():
+    """The matches convert to an Arrow list column"""
+    pytest.importorskip('pyarrow')
+    _, spans = record_matches(CANDIDATES, compile_searches(SEARCHES))
+    column = spans.to_arrow().to_pylist()
+    assert len(column) == 4 and column[2] == []
+    assert column[1] == [{'term': 'cat', 'start': 15, 'end': 18}]
+
+@pytest.mark.parametrize('workers', [None, 2])
+@pytest.mark.parametrize('sentencizer', [False, True])
+def test_search_dataframe_debug_column(workers, sentencizer):
+    """The debug column is built from the matches recorded while searching, as check_all_matches"""
+    df = pd.read_csv(DATA_FILE).head(20)
+    df = pd.concat([df, df.iloc[:5]], ignore_index=True)
+    expression = Expression().parse_string('thyroid & (nodul* | cyst*) | normal~2thyroid')
+    expected = search_dataframe(df.copy(), 'report', expression, sentencizer=sentencizer)
+    result = search_dataframe(df.copy(), 'report', expression, sentencizer=sentencizer, debug_column=True, workers=workers, deduplicate=True)
+    assert result['report_matches'].tolist() == expected['report_matches'].tolist()
+    assert result['report_matches_matches'].tolist() == [check_all_matches(str(x), expression) for x in df['report']]
+
+def test_radex_run_searches_spans():
+    """Radex records the matches of every search when asked"""
+    radex = Radex(pd.read_csv(DATA_FILE).head(20))
+    radex.preprocess_data(drop_negatives=None, drop_stopwords=None)
+    radex.searches = SEARCHES
+    expected = radex.run_searches().copy()
+    assert radex.match_spans is None
+
+    result = radex.run_searches(spans=True)
+    assert result.equals(expected)
+    assert len(radex.match_spans) == len(result)
+    report = radex.preprocessed_data['report'].iat[0]
+    assert radex.match_spans.matches(0, report, ['fox']) == check_all_matches(report, ['fox'])
@@ -0,0 +1,113 @@
+# fmt: off
+# pylint: disable=redefined-outer-name
+# pylint: disable=line-too-long
+
+"""Tests for radex.store"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from radex import Radex
+from radex.document import Document
+from radex.preprocessing import clean_dataframe
+from radex.store import CorpusStore, corpus_fingerprint, preprocessing_settings
+
+DATA_FILE = Path(__file__).parent.parent.parent / "data" / "synthetic_ultrasound_reports" / "ex_usreports_validation.csv"
+
+@pytest.fixture
+def sample_dataframe():
+    """Create a sample dataframe with missing, empty and non ASCII reports"""
+    return pd.DataFrame({
+        'report': ['Normal thyroid. No nodules.', np.nan, '', 'Écho: nodule. Stable. ', 'goitre'],
+        'label': [1, 2, 3, 4, 5],
+    }, index=[10, 11, 12, 13, 14])
+
+def test_save_and_load(sample_dataframe, tmp_path):
+    """Loading an entry gives the same dataframe as was saved"""
+    df_clean = clean_dataframe(sample_dataframe.copy(), 'report')
+    settings = preprocessing_settings()
+    fingerprint = corpus_fingerprint(sample_dataframe, 'report', settings)
+
+    store = CorpusStore(tmp_path / 'store')
+    assert fingerprint not in store
+    store.save(fingerprint, df_clean, 'report', settings)
+    assert fingerprint in store
+    assert store.meta(fingerprint)['settings'] == settings
+
+    df_loaded = store.load(fingerprint)
+    assert df_loaded.equals(df_clean)
+    assert df_loaded['report'].dtype == df_clean['report'].dtype
+    assert df_loaded.index.tolist() == [10, 11, 12, 13, 14]
+
+def test_load_memory_mapped(tmp_path):
+    """A column of strings stored by pyarrow is loaded from the memory-mapped text, not decoded"""
+    pyarrow = pytest.importorskip('pyarrow')
+    df = pd.DataFrame({
+        'report': pd.Series(['normal thyroid. no nodules', np.nan, 'écho'] * 1000, dtype=pd.StringDtype('pyarrow')),
+    })
+    store = CorpusStore(tmp_path)
+    store.save('entry', df, 'report', preprocessing_settings())
+
+    allocated = pyarrow.total_allocated_bytes()
+    df_loaded = store.load('entry')
+    assert pyarrow.total_allocated_bytes() - allocated < 1000
+    assert df_loaded['report'].dtype == df['report'].dtype
+    assert df_loaded.equals(df)
+
+def test_stored_column(sample_dataframe, tmp_path):
+    """Reports and their sentences are read from the memory-mapped column"""
+    store = CorpusStore(tmp_path)
+    store.save('entry', sample_dataframe, 'report', preprocessing_settings())
+    column = store.open_column('entry', 'report')
+
+    assert len(column) == 5
+    for i, report in enumerate(sample_dataframe['report']):
+        if isinstance(report, str):
+            assert column[i] == report
+            assert column.sentences(i) == report.split('.')
+            assert column.document(i).text == report
+            assert column.document(i).spans == Document(report).spans
+        else:
+            assert np.isnan(column[i])
+            assert column.sentences(i) == []
+
+    with pytest.raises(ValueError):
+        store.open_column('entry', 'label')
+    with pytest.raises(ValueError):
+        store.load('missing')
+
+def test_fingerprint(sample_dataframe):
+    """The fingerprint changes with the data and the settings"""
+    settings = preprocessing_settings(drop_negatives='negex', drop_stopwords='nltk')
+    fingerprint = corpus_fingerprint(sample_dataframe, ['report'], settings)
+    assert fingerprint == corpus_fingerprint(sample_dataframe.copy(), 'report', settings)
+
+    changed = sample_dataframe.copy()
+    changed.loc[14, 'report'] = 'goiter'
+    assert corpus_fingerprint(changed, 'report', settings) != fingerprint
+    assert corpus_fingerprint(sample_dataframe.reset_index(drop=True), 'report', settings) != fingerprint
+    assert corpus_fingerprint(sample_dataframe, 'report', preprocessing_settings(drop_stopwords='nltk')) != fingerprint
+    assert corpus_fingerprint(sample_dataframe, 'report', preprocessing_settings(drop_negatives='negex', drop_stopwords=['the'])) != fingerprint
+
+def test_radex_preprocess_with_store(tmp_path, monkeypatch):
+    """The second session loads the preprocessed data instead of cleaning it again"""
+    radex = Radex()
+    radex.read_data(DATA_FILE)
+    radex.preprocess_data(store=tmp_path / 'store')
+    expected = radex.preprocessed_data
+
+    def fail(*args, **kwargs):
+        raise AssertionError('clean_dataframe should not be called')
+    monkeypatch.setattr(sys.modules['radex.Radex'], 'clean_dataframe', fail)
+
+    radex = Radex()
+    radex.read_data(DATA_FILE)
+    radex.preprocess_data(store=tmp_path / 'store')
+    assert radex.preprocessed_data.equals(expected)
+
+    radex.run_example_searches()
+    assert len(radex.output_data) == len(expected)